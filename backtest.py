@@ -0,0 +1,301 @@
+"""
+Rolling-origin backtest of the forecaster on the historical data.
+
+Cases in the test_data.json schema are cut from the hourly PM10 data
+(data/processed/air_quality_2019_2023.csv) and, if given, the raw ISD weather
+reports (e.g. data/processed/weather_all_years.csv, as read by notebook 02):
+for every station, one prediction origin every --step hours between --start
+and --end, with the last --history-hours of PM10 as history and the weather
+reports of the --weather-hours before the origin. With --future-weather, the
+reports of the forecast horizon are added as well: this simulates a perfect
+weather forecast, so its scores are optimistic compared with what
+production can achieve, and the report says so.
+The cases are forecast in batches (in --workers processes, see
+main.forecast_parallel) and scored against the observed PM10; failing cases
+are counted and left out of the scores.
+
+Reports MAE/RMSE per station and per horizon hour, cases/second, the time
+of every stage and the forecaster's own stage timers and counters (see
+instrumentation.py); --report also writes them as JSON.
+
+Usage:
+    python backtest.py [--pm10 data/processed/air_quality_2019_2023.csv]
+                       [--weather data/processed/weather_all_years.csv]
+                       [--start 2023-01-01] [--end 2024-01-01] [--step 24] [--workers 4] [--future-weather]
+                       [--model-path models/catboost_best_model.cbm] [--report backtest.json]
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from feature_store import read_pm10_sources
+from main import forecast_isolated, forecast_parallel, iter_batches
+from model_registry import DEFAULT_STATION_MEMORY_MB, load_models
+from spatial import STATIONS_PATH, load_stations
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+PM10_PATH = os.path.join(DATA_DIR, "processed", "air_quality_2019_2023.csv")
+
+# ISD groups read by weather_preprocessing.preprocess_weather
+WEATHER_GROUPS = ["WND", "CIG", "VIS", "TMP", "DEW", "SLP", "MA1", "GA1", "MD1"]
+
+
+def load_pm10(path=PM10_PATH):
+    """Hourly PM10 frame: one column per station, indexed by every hour of the data (NaN if missing)."""
+    wide = read_pm10_sources([path])
+    wide["DateTime"] = wide["DateTime"].dt.round("h")
+    wide = wide.dropna(subset=["DateTime"]).drop_duplicates("DateTime").set_index("DateTime")
+    hours = pd.date_range(wide.index.min(), wide.index.max(), freq="h")
+    return wide.reindex(hours).apply(pd.to_numeric, errors="coerce")
+
+
+class WeatherReports:
+    """Raw ISD reports sorted by time, sliced into the case schema's weather records."""
+
+    def __init__(self, weather_df):
+        weather_df = weather_df.copy()
+        weather_df["DATE"] = pd.to_datetime(weather_df["DATE"], errors="coerce")
+        weather_df = weather_df.dropna(subset=["DATE"]).sort_values("DATE", kind="stable")
+        self.dates = weather_df["DATE"].to_numpy()
+        groups = [group for group in WEATHER_GROUPS if group in weather_df.columns]
+        values = weather_df[groups].to_numpy(dtype=object)
+        names = [group.lower() for group in groups]
+        dates = weather_df["DATE"].dt.strftime("%Y-%m-%dT%H:%M:%S").to_numpy()
+        # Records are built once and shared by all cases overlapping them
+        self.records = [
+            {"date": date, **{name: value for name, value in zip(names, row) if isinstance(value, str)}}
+            for date, row in zip(dates, values)
+        ]
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls(pd.read_csv(path, dtype=str))
+
+    def between(self, start, end):
+        """Records with start <= DATE < end."""
+        lo, hi = np.searchsorted(self.dates, [np.datetime64(start), np.datetime64(end)])
+        return self.records[lo:hi]
+
+
+def make_cases(pm10, stations=None, weather=None, start=None, end=None, step=24, history_hours=24,
+               weather_hours=24, horizon=24, all_stations=False, future_weather=False):
+    """
+    Rolling-origin cases and their observed PM10.
+    For every station, an origin every `step` hours in [start, end) (default:
+    the whole data) becomes a case if at least two of the `history_hours`
+    before it have PM10 and at least one hour of the horizon is observed.
+    With all_stations, the other stations' history follows the forecast
+    station in every case (for neighbor features, see spatial.py).
+    Cases get the weather reports of the weather_hours before the origin,
+    and with future_weather also those of the horizon (observed weather as
+    a perfect weather forecast).
+    Returns (cases, actuals) with actuals of shape (len(cases), horizon), NaN
+    where nothing was observed.
+    """
+    stations = stations or {}
+    hours = pm10.index
+    first = max(hours.searchsorted(pd.Timestamp(start)) if start else 0, history_hours)
+    last = min(hours.searchsorted(pd.Timestamp(end)) if end else len(hours), len(hours) - horizon + 1)
+    origins = np.arange(first, last, step)
+    timestamps = hours.strftime("%Y-%m-%dT%H:%M:%S").to_numpy()
+    values = {station: pm10[station].to_numpy(dtype=float) for station in pm10.columns}
+
+    def station_entry(station, history_idx):
+        longitude, latitude = stations.get(station, (None, None))
+        return {
+            "station_code": station,
+            "longitude": longitude,
+            "latitude": latitude,
+            "history": [{"timestamp": timestamps[i], "pm10": float(values[station][i])} for i in history_idx],
+        }
+
+    def observed(station, origin):
+        history_idx = np.arange(origin - history_hours, origin)
+        return history_idx[~np.isnan(values[station][history_idx])]
+
+    cases, actuals = [], []
+    for station in pm10.columns:
+        longitude, latitude = stations.get(station, (None, None))
+        for origin in origins:
+            history_idx = observed(station, origin)
+            actual = values[station][origin:origin + horizon]
+            if len(history_idx) < 2 or np.isnan(actual).all():
+                continue
+            start_time = hours[origin]
+            weather_end = start_time + pd.Timedelta(hours=horizon) if future_weather else start_time
+            others = []
+            if all_stations:
+                others = [station_entry(other, idx) for other in pm10.columns if other != station
+                          for idx in [observed(other, origin)] if len(idx)]
+            cases.append({
+                "case_id": f"{station}_{timestamps[origin]}",
+                "stations": [station_entry(station, history_idx)] + others,
+                "target": {
+                    "longitude": longitude,
+                    "latitude": latitude,
+                    "prediction_start_time": timestamps[origin],
+                },
+                "weather": weather.between(start_time - pd.Timedelta(hours=weather_hours),
+                                           weather_end) if weather else [],
+            })
+            actuals.append(actual)
+    return cases, np.array(actuals).reshape(len(actuals), horizon)
+
+
+def score(cases, predictions, actuals):
+    """MAE/RMSE over all forecasts, per station and per horizon hour (observed hours only)."""
+    predicted = np.array([[step["pm10_pred"] for step in prediction["forecast"]] for prediction in predictions])
+    predicted = predicted.reshape(actuals.shape)
+    errors = predicted - actuals
+
+    def metrics(err):
+        err = err[~np.isnan(err)]
+        if not len(err):
+            return {"n": 0, "mae": None, "rmse": None}
+        return {"n": int(len(err)), "mae": float(np.mean(np.abs(err))), "rmse": float(np.sqrt(np.mean(err ** 2)))}
+
+    station_codes = np.array([case["stations"][0]["station_code"] for case in cases])
+    return {
+        "overall": metrics(errors),
+        "stations": {station: metrics(errors[station_codes == station]) for station in sorted(set(station_codes))},
+        "horizons": {h + 1: metrics(errors[:, h]) for h in range(errors.shape[1])},
+    }
+
+
+def forecast_cases(cases, workers=1, batch_size=None, model_path=None, stations_dir=None,
+                   station_memory_mb=DEFAULT_STATION_MEMORY_MB, forecast_hours=24):
+    """
+    Predictions for the cases in their order, batch_size cases per model call;
+    a failing case gets {"case_id", "forecast": [], "error"} (counted as
+    case_errors, see instrumentation.py) instead of stopping the backtest.
+    """
+    if workers > 1:
+        batch_size = batch_size or max(math.ceil(len(cases) / (workers * 4)), 1)
+        return list(forecast_parallel(cases, forecast_hours, batch_size, workers, model_path, stations_dir,
+                                      station_memory_mb))
+
+    model = load_models(model_path, stations_dir, station_memory_mb)
+    predictions = []
+    for batch in iter_batches(cases, batch_size or max(len(cases), 1)):
+        for result in forecast_isolated(batch, model, forecast_hours):
+            if "error" in result:
+                instrumentation.count("case_errors")
+                print(f"[ERROR] Case '{result['case_id']}' failed: {result['error']}")
+                result = {"case_id": result["case_id"], "forecast": [], "error": result["error"]}
+            predictions.append(result)
+    return predictions
+
+
+def run_backtest(pm10_path=PM10_PATH, weather_path=None, start=None, end=None, step=24, history_hours=24,
+                 weather_hours=24, workers=1, batch_size=None, model_path=None, stations_dir=None,
+                 station_memory_mb=DEFAULT_STATION_MEMORY_MB, all_stations=False, future_weather=False):
+    """Loads the data, cuts the cases, forecasts and scores them. Returns the report dict."""
+    timings = {}
+
+    stage_start = time.perf_counter()
+    pm10 = load_pm10(pm10_path)
+    stations = load_stations() if os.path.exists(STATIONS_PATH) else {}
+    weather = WeatherReports.from_csv(weather_path) if weather_path else None
+    timings["load"] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    cases, actuals = make_cases(pm10, stations, weather, start, end, step, history_hours, weather_hours,
+                                all_stations=all_stations, future_weather=future_weather)
+    timings["cases"] = time.perf_counter() - stage_start
+    print(f"[INFO] Backtesting {len(cases)} cases")
+
+    stage_start = time.perf_counter()
+    was_enabled = instrumentation.enabled()
+    instrumentation.enable()
+    instrumentation.reset()
+    try:
+        predictions = forecast_cases(cases, workers, batch_size, model_path, stations_dir, station_memory_mb)
+        forecast_metrics = instrumentation.report()
+    finally:
+        instrumentation.enable(was_enabled)
+    timings["forecast"] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    ok = [i for i, prediction in enumerate(predictions) if "error" not in prediction]
+    report = score([cases[i] for i in ok], [predictions[i] for i in ok], actuals[ok])
+    timings["score"] = time.perf_counter() - stage_start
+
+    report.update({
+        "cases": len(cases),
+        "failed": len(cases) - len(ok),
+        "weather": ("observed up to the origin and over the horizon (perfect weather forecast, optimistic scores)"
+                    if future_weather else "observed up to the origin"),
+        "cases_per_second": len(cases) / timings["forecast"] if timings["forecast"] else None,
+        "timings": timings,
+        "forecast_metrics": forecast_metrics,
+    })
+    return report
+
+
+def print_report(report):
+    def row(name, m):
+        if not m["n"]:
+            return f"  {name:<14} {'-':>8} {'-':>8} {0:>8}"
+        return f"  {name:<14} {m['mae']:>8.2f} {m['rmse']:>8.2f} {m['n']:>8}"
+
+    print(f"\nCases: {report['cases']} ({report['failed']} failed), "
+          f"{report['cases_per_second']:,.1f} cases/s")
+    print(f"Weather: {report['weather']}")
+    print("Stage timings: " + ", ".join(f"{stage} {seconds:.2f} s" for stage, seconds in report["timings"].items()))
+    timers = report["forecast_metrics"]["timers"]
+    if timers:
+        print("Forecast stages: " + ", ".join(f"{stage} {timer['total_s']:.2f} s" for stage, timer in
+                                              sorted(timers.items(), key=lambda item: -item[1]["total_s"])))
+    print(f"\n  {'':<14} {'MAE':>8} {'RMSE':>8} {'n':>8}")
+    print(row("overall", report["overall"]))
+    print("\nPer station:")
+    for station, m in report["stations"].items():
+        print(row(station, m))
+    print("\nPer horizon hour:")
+    for h, m in report["horizons"].items():
+        print(row(f"+{h}h", m))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the PM10 forecaster.")
+    parser.add_argument("--pm10", default=PM10_PATH, help="Hourly PM10 CSV (DateTime + one column per station)")
+    parser.add_argument("--weather", default=None, help="Raw ISD weather CSV (DATE, WND, TMP, ... columns)")
+    parser.add_argument("--start", default=None, help="First prediction origin (default: start of the data)")
+    parser.add_argument("--end", default=None, help="End of the prediction origins (default: end of the data)")
+    parser.add_argument("--step", type=int, default=24, help="Hours between prediction origins (default: 24)")
+    parser.add_argument("--history-hours", type=int, default=24, help="Hours of PM10 history per case (default: 24)")
+    parser.add_argument("--weather-hours", type=int, default=24,
+                        help="Hours of weather reports before the origin per case (default: 24)")
+    parser.add_argument("--future-weather", action="store_true",
+                        help="Also give cases the observed weather of the forecast horizon, i.e. a perfect "
+                             "weather forecast (optimistic scores)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for forecasting (default: 1)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Cases per model call (see main.py)")
+    parser.add_argument("--model-path", default=None, help="Path to the model (.cbm or .pkl)")
+    parser.add_argument("--station-models-dir", default=None, help="Directory of per-station models")
+    parser.add_argument("--station-memory-mb", type=int, default=DEFAULT_STATION_MEMORY_MB,
+                        help=f"Memory budget of loaded station models (default: {DEFAULT_STATION_MEMORY_MB})")
+    parser.add_argument("--all-stations", action="store_true",
+                        help="Give every case the history of all stations (for models with neighbor features)")
+    parser.add_argument("--report", default=None, help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    report = run_backtest(args.pm10, args.weather, args.start, args.end, args.step, args.history_hours,
+                          args.weather_hours, args.workers, args.batch_size, args.model_path,
+                          args.station_models_dir, args.station_memory_mb, args.all_stations, args.future_weather)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote report to: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark of the compiled NumPy evaluator (compiled_model.py) against
+CatBoost's predict, on the feature rows the forecasting path builds.
+
+The feature rows of synthetic cases (benchmarks/synthetic.py) are captured
+from forecast_batch, and perturbed copies are added (values scaled, 10% NaN
+weather, 10% unknown stations). Predictions are checked to be bit-for-bit
+identical, then:
+- single-row latency: one DataFrame row, and one row of values
+  (median of --repeat calls)
+- batch throughput: rows per second for batches of growing size
+
+Usage:
+    python benchmarks/bench_compiled.py [--model-path models/catboost_best_model.cbm] [--cases 200]
+                                        [--repeat 500] [--batch-sizes 1 24 1000 100000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import forecast_cache  # noqa: E402
+from compiled_model import compile_model  # noqa: E402
+from feature_store import WEATHER_COLUMNS  # noqa: E402
+from model_registry import load_model  # noqa: E402
+from prediction import forecast_batch  # noqa: E402
+from synthetic import make_cases  # noqa: E402
+
+
+class RecordingModel:
+    """Forwards to a model and keeps the feature rows it is asked to predict."""
+    def __init__(self, model):
+        self.model = model
+        self.feature_names_ = model.feature_names_
+        self.frames = []
+
+    def predict(self, X):
+        self.frames.append(X.copy())
+        return self.model.predict(X)
+
+
+def feature_rows(model, n_cases, horizon=24):
+    recorder = RecordingModel(model)
+    forecast_batch(make_cases(n_cases, n_stations=2)["cases"], recorder, horizon=horizon)
+    return pd.concat(recorder.frames, ignore_index=True)
+
+
+def perturbed(X, seed=1):
+    rng = np.random.default_rng(seed)
+    Y = X.copy()
+    for column in Y.columns:
+        if Y[column].dtype.kind == "f":
+            Y[column] = Y[column] * rng.uniform(0.5, 1.5, len(Y))
+    for column in [column for column in WEATHER_COLUMNS if column in Y]:
+        Y.loc[rng.random(len(Y)) < 0.1, column] = np.nan
+    Y.loc[rng.random(len(Y)) < 0.1, "station_code"] = "Unknown"
+    return Y
+
+
+def latency(fn, X, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+def throughput(fn, X, min_seconds=0.5):
+    calls, start = 0, time.perf_counter()
+    while calls == 0 or time.perf_counter() - start < min_seconds:
+        fn(X)
+        calls += 1
+    return calls * len(X) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compiled model evaluator.")
+    parser.add_argument("--model-path", default=None, help="CatBoost model (default: the default model)")
+    parser.add_argument("--cases", type=int, default=200, help="Synthetic cases to capture feature rows from")
+    parser.add_argument("--repeat", type=int, default=500, help="Calls per single-row latency measurement")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 24, 1000, 100000],
+                        help="Batch sizes of the throughput measurement")
+    args = parser.parse_args()
+
+    forecast_cache.configure(0)
+    model = load_model(args.model_path)
+    start = time.perf_counter()
+    compiled = compile_model(model)
+    print(f"compiled {model.tree_count_} trees in {time.perf_counter() - start:.2f} s")
+
+    X = feature_rows(model, args.cases)
+    X = pd.concat([X, perturbed(X)], ignore_index=True)
+    np.testing.assert_array_equal(compiled.predict(X), model.predict(X))
+    for i in range(0, len(X), max(1, len(X) // 50)):
+        np.testing.assert_array_equal(compiled.predict(X.iloc[[i]]), model.predict(X.iloc[[i]]))
+    print(f"{len(X)} rows: predictions identical")
+
+    row = X.iloc[[len(X) // 3]]
+    values = row[compiled.feature_names_].to_numpy(dtype=object)
+    catboost_s, compiled_s = latency(model.predict, row, args.repeat), latency(compiled.predict, row, args.repeat)
+    values_s = latency(compiled.predict, values, args.repeat)
+    print(f"single row: CatBoost {catboost_s * 1e6:,.0f} us, compiled {compiled_s * 1e6:,.0f} us "
+          f"({catboost_s / compiled_s:.1f}x), compiled from values {values_s * 1e6:,.0f} us "
+          f"({catboost_s / values_s:.1f}x)")
+
+    for size in args.batch_sizes:
+        batch = X.sample(size, replace=size > len(X), random_state=0).reset_index(drop=True)
+        catboost_rate, compiled_rate = throughput(model.predict, batch), throughput(compiled.predict, batch)
+        print(f"batch {size:>7,}: CatBoost {catboost_rate:>12,.0f} rows/s, compiled {compiled_rate:>12,.0f} rows/s "
+              f"({compiled_rate / catboost_rate:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark of direct multi-horizon forecasting against the recursive path.
+
+A recursive model (pm10_lag_1/pm10_lag_2 of the previous hours, predictions
+fed back) and a direct model (lags of the forecast start + horizon feature,
+see train.py --direct) are trained with the same parameters on the years of a
+feature store before --test-year. Cases cut from --test-year are forecast with
+forecast_batch, and throughput and MAE by horizon are compared.
+The cases carry no weather records, so both models are trained without the
+weather columns.
+
+Usage:
+    python benchmarks/bench_direct.py --store data/feature_store --test-year 2023
+                                      [--cases 2000] [--iterations 300] [--sample 0.1]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from catboost import CatBoostRegressor, Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from feature_store import WEATHER_COLUMNS, FeatureStore  # noqa: E402
+from prediction import forecast_batch, init_case_state  # noqa: E402
+from train import CAT_FEATURES, DIRECT_PARAMS, TARGET, direct_frame  # noqa: E402
+
+HORIZON = 24
+
+
+def fit(frame, params, seed):
+    model = CatBoostRegressor(**params, loss_function="RMSE", random_seed=seed, logging_level="Silent")
+    model.fit(Pool(frame.drop(columns=[TARGET]), frame[TARGET], cat_features=CAT_FEATURES))
+    return model
+
+
+def make_cases(store, year, n_cases, seed=0):
+    """Cases starting at random hours of `year` with two hours of history, and their observed PM10."""
+    rng = np.random.default_rng(seed)
+    cases, actuals = [], []
+    for station in store.stations:
+        frame = store.read(stations=[station], years=[year], columns=["DATE", TARGET], dropna=False)
+        pm10, dates = frame[TARGET].to_numpy(), frame["DATE"]
+        starts = np.arange(2, len(pm10) - HORIZON)
+        starts = starts[~np.isnan(pm10[starts - 1]) & ~np.isnan(pm10[starts - 2])]
+        for start in rng.choice(starts, min(n_cases // len(store.stations), len(starts)), replace=False):
+            cases.append({
+                "case_id": f"{station}-{start}",
+                "stations": [{"station_code": station, "history": [
+                    {"timestamp": dates[i].isoformat(), "pm10": float(pm10[i])} for i in (start - 2, start - 1)]}],
+                "target": {"prediction_start_time": dates[start].isoformat()},
+            })
+            actuals.append(pm10[start:start + HORIZON])
+    return cases, np.array(actuals)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark direct against recursive multi-horizon forecasting.")
+    parser.add_argument("--store", required=True, help="Feature store directory")
+    parser.add_argument("--test-year", type=int, required=True, help="Year to forecast; earlier years are trained on")
+    parser.add_argument("--cases", type=int, default=2000, help="Number of test cases")
+    parser.add_argument("--iterations", type=int, default=300, help="CatBoost iterations of both models")
+    parser.add_argument("--sample", type=float, default=0.1, help="Row fraction per horizon of the direct model")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    args = parser.parse_args()
+
+    store = FeatureStore(args.store)
+    years = sorted({year for station in store.stations for year in store.years(station) if year < args.test_year})
+    columns = [col for col in store.columns if col not in WEATHER_COLUMNS and col != "DATE"]
+    params = {**DIRECT_PARAMS, "iterations": args.iterations}
+
+    recursive_frame = store.read(years=years, columns=columns)
+    recursive, recursive_fit_s = timed(fit, recursive_frame, params, args.seed)
+    print(f"Recursive model: {len(recursive_frame)} rows, trained in {recursive_fit_s:.0f} s")
+    frame = direct_frame(store, years=years, horizon=HORIZON, sample=args.sample, seed=args.seed, columns=columns)
+    direct, direct_fit_s = timed(fit, frame, params, args.seed)
+    print(f"Direct model:    {len(frame)} rows, trained in {direct_fit_s:.0f} s")
+
+    cases, actuals = make_cases(store, args.test_year, args.cases, args.seed)
+    print(f"Test cases: {len(cases)} x {HORIZON} h from {args.test_year}")
+    _, parse_s = timed(lambda: [init_case_state(case) for case in cases])
+    print(f"Case parsing (included in both): {parse_s:.2f} s")
+    for name, model in [("recursive", recursive), ("direct", direct)]:
+        results, seconds = timed(forecast_batch, cases, model, HORIZON)
+        predicted = np.array([[step["pm10_pred"] for step in result["forecast"]] for result in results])
+        errors = np.abs(predicted - actuals)
+        by_horizon = np.nanmean(errors, axis=0)
+        print(f"{name:>9}: {seconds:.2f} s ({len(cases) / seconds:,.0f} cases/s, "
+              f"{seconds - parse_s:.2f} s without parsing), MAE {np.nanmean(errors):.2f} "
+              f"(h1 {by_horizon[0]:.2f}, h6 {by_horizon[5]:.2f}, h12 {by_horizon[11]:.2f}, h24 {by_horizon[23]:.2f})")
+
+
+if __name__ == "__main__":
+    main()
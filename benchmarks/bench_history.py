@@ -0,0 +1,69 @@
+"""
+Benchmark of the array-backed case history (history.py) against the previous
+DataFrame + pd.to_datetime conversion of init_case_state, for histories of
+growing length. The lags are checked to be equal.
+
+Usage:
+    python benchmarks/bench_history.py [--cases 200] [--lengths 24 720 8760 43800]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from history import History  # noqa: E402
+
+# --- Previous history conversion of init_case_state, kept verbatim as the reference ---
+
+def reference_lags(station):
+    history = pd.DataFrame(station.get("history", []))
+    if history.empty or "timestamp" not in history or "pm10" not in history:
+        raise IndexError("History is missing or invalid")
+    if len(history) < 2:
+        raise IndexError("Not enough history points for lag features")
+    history["timestamp"] = pd.to_datetime(history["timestamp"])
+    return history["pm10"].iloc[-1], history["pm10"].iloc[-2]
+
+
+def array_lags(station):
+    return tuple(History.from_records(station["history"], last=2).lags(2))
+
+
+def make_station(length, rng):
+    times = pd.date_range("2020-01-01", periods=length, freq="h").strftime("%Y-%m-%dT%H:%M:%S")
+    pm10 = np.round(rng.gamma(2.0, 15.0, length), 2)
+    return {"station_code": "MpKrakAlKras",
+            "history": [{"timestamp": ts, "pm10": float(value)} for ts, value in zip(times, pm10)]}
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the case history conversion.")
+    parser.add_argument("--cases", type=int, default=200, help="Cases per history length")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[24, 720, 8760, 43800],
+                        help="History lengths (hours)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for length in args.lengths:
+        station = make_station(length, rng)
+        stations = [station] * args.cases
+        reference, reference_s = timed(lambda: [reference_lags(s) for s in stations])
+        arrays, array_s = timed(lambda: [array_lags(s) for s in stations])
+        assert [tuple(np.float32(v) for v in lags) for lags in reference] == [tuple(lags) for lags in arrays]
+        print(f"history {length:>6} h: DataFrame {reference_s / args.cases * 1e6:>9,.0f} us/case, "
+              f"arrays {array_s / args.cases * 1e6:>6,.1f} us/case ({reference_s / array_s:,.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark of the columnar LanduseIndex against the previous LanduseHandler,
+which kept every landuse way/relation as a Python dict with its tags and
+node refs. Writes a synthetic .osm file of small landuse polygons, compares
+the memory retained by both, and times class-fraction queries around
+random targets.
+
+Usage:
+    python benchmarks/bench_landuse.py --polygons 100000 [--queries 1000] [--radius 1000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import osmium
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from landuse import LanduseIndex  # noqa: E402
+
+CLASSES = ["residential", "industrial", "commercial", "forest", "farmland", "meadow", "grass", "retail"]
+REGION = (20.8, 52.1, 21.3, 52.4)  # min_lon, min_lat, max_lon, max_lat
+
+
+# --- Previous dict-per-object handler, kept verbatim as the reference ---
+
+class ReferenceLanduseHandler(osmium.SimpleHandler):
+    def __init__(self):
+        super().__init__()
+        self.landuse_ways = []
+        self.landuse_relations = []
+
+    def way(self, w):
+        if 'landuse' in w.tags:
+            self.landuse_ways.append({
+                "type": "way",
+                "id": w.id,
+                "landuse": w.tags['landuse'],
+                "tags": dict(w.tags),
+                "node_refs": [node.ref for node in w.nodes]
+            })
+
+    def relation(self, r):
+        if 'landuse' in r.tags:
+            self.landuse_relations.append({
+                "type": "relation",
+                "id": r.id,
+                "landuse": r.tags['landuse'],
+                "tags": dict(r.tags),
+                "members": [(m.ref, m.role, m.type) for m in r.members]
+            })
+
+
+def write_osm(path, n_polygons, seed=0):
+    """Writes n_polygons random 6-gons (~50-300 m across) with a landuse tag."""
+    rng = np.random.default_rng(seed)
+    min_lon, min_lat, max_lon, max_lat = REGION
+    centers = rng.uniform((min_lon, min_lat), (max_lon, max_lat), size=(n_polygons, 2))
+    radii = rng.uniform(0.0005, 0.003, size=n_polygons)
+    angles = np.linspace(0, 2 * np.pi, 7)[:-1]
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6" generator="bench">\n')
+        for p in range(n_polygons):
+            lons = centers[p, 0] + radii[p] * np.cos(angles) * 1.6
+            lats = centers[p, 1] + radii[p] * np.sin(angles)
+            for k in range(6):
+                f.write(f'<node id="{p * 6 + k + 1}" version="1" lat="{lats[k]:.7f}" lon="{lons[k]:.7f}"/>\n')
+        for p in range(n_polygons):
+            refs = "".join(f'<nd ref="{p * 6 + k + 1}"/>' for k in list(range(6)) + [0])
+            f.write(f'<way id="{p + 1}" version="1">{refs}'
+                    f'<tag k="landuse" v="{CLASSES[p % len(CLASSES)]}"/><tag k="name" v="area {p}"/></way>\n')
+        f.write("</osm>\n")
+
+
+def retained(load):
+    """Result of load() with the wall time and the memory it still holds."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, size
+
+
+def load_reference(path):
+    handler = ReferenceLanduseHandler()
+    handler.apply_file(path)
+    return handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark landuse loading and queries.")
+    parser.add_argument("--polygons", type=int, default=100_000, help="Number of synthetic landuse polygons")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of class-fraction queries")
+    parser.add_argument("--radius", type=float, default=1000.0, help="Query radius in meters")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "landuse.osm")
+        write_osm(path, args.polygons)
+        print(f"Synthetic landuse polygons: {args.polygons}")
+
+        reference, reference_s, reference_bytes = retained(lambda: load_reference(path))
+        print(f"dict handler:  {reference_s:.2f} s, {reference_bytes / 1e6:.1f} MB retained "
+              f"(node refs only, no coordinates)")
+        del reference
+
+        index, index_s, index_bytes = retained(lambda: LanduseIndex.from_file(path))
+        print(f"LanduseIndex:  {index_s:.2f} s, {index_bytes / 1e6:.1f} MB retained "
+              f"(resolved geometry + grid index)")
+
+    rng = np.random.default_rng(1)
+    min_lon, min_lat, max_lon, max_lat = REGION
+    targets = rng.uniform((min_lat, min_lon), (max_lat, max_lon), size=(args.queries, 2))
+    start = time.perf_counter()
+    shares = index.fractions_many(targets, args.radius)
+    elapsed = time.perf_counter() - start
+    print(f"Class fractions within {args.radius:.0f} m: {elapsed / args.queries * 1000:.2f} ms per target "
+          f"(mean covered share {shares.sum(axis=1).mean():.3f})")
+
+
+if __name__ == "__main__":
+    main()
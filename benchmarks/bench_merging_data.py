@@ -0,0 +1,135 @@
+"""
+Benchmark of the grouped merge_hourly_reports against the previous
+implementation (groupby('hour') + a Python loop calling merge_weather_data per
+hour) on synthetic FM-12/FM-15 reports. Both outputs are checked to give the
+same CSV.
+
+Usage:
+    python benchmarks/bench_merging_data.py --years 5 [--skip-reference]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "notebooks"))
+from merging_data import NUMERIC_COLUMNS, merge_hourly_reports  # noqa: E402
+
+
+# --- Previous per-hour implementation, kept verbatim as the reference ---
+
+def merge_weather_data(group):
+    """Function to merge FM-12 and FM-15 data for the same hour"""
+
+    if len(group) == 1:
+        # If there's only one measurement, return it as is
+        return group.iloc[0]
+
+    # List of numeric columns to average
+    numeric_columns = [
+        'wind_speed_raw', 'wind_dir_sin', 'wind_dir_cos', 'ceiling_height_ft',
+        'ceiling_coverage', 'visibility_m', 'temperature_C', 'SLP_hpa', 'DEW_C',
+        'MA1_main', 'MA1_sec', 'GA1_amt', 'GA1_height', 'GA2_amt', 'GA2_height',
+        'MD1_m1', 'MD1_m2', 'MW1_val'
+    ]
+
+    # Create new row using first observation as base
+    merged_row = group.iloc[0].copy()
+
+    # For numeric columns - calculate arithmetic mean
+    for col in numeric_columns:
+        if col in group.columns:
+            # Ignore NaN values when calculating mean
+            values = group[col].dropna()
+            if len(values) > 0:
+                merged_row[col] = values.mean()
+            else:
+                merged_row[col] = np.nan
+
+    # For REPORT_TYPE - combine names
+    report_types = group['REPORT_TYPE'].unique()
+    merged_row['REPORT_TYPE'] = '+'.join(sorted(report_types))
+
+    # For text/categorical columns - take first non-null value
+    text_columns = ['GA1_type', 'GA2_type']
+    for col in text_columns:
+        if col in group.columns:
+            non_null_values = group[col].dropna()
+            if len(non_null_values) > 0:
+                merged_row[col] = non_null_values.iloc[0]
+
+    return merged_row
+
+
+def reference_merge(df_hourly):
+    df_hourly = df_hourly.copy()
+    df_hourly['hour'] = df_hourly['DATE'].dt.floor('h')
+    grouped = df_hourly.groupby('hour')
+    merged_data = []
+
+    for hour, group in grouped:
+        merged_row = merge_weather_data(group)
+        merged_data.append(merged_row)
+
+    df_final = pd.DataFrame(merged_data)
+    return df_final.drop('hour', axis=1)
+
+
+def make_reports(years, seed=0):
+    """Full-hour FM-15 (METAR) and FM-12 (SYNOP) reports with missing values, in file order."""
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range("2019-01-01", periods=int(years * 365 * 24), freq="h")
+    metar = hours[rng.random(len(hours)) < 0.97]
+    synop = hours[rng.random(len(hours)) < 0.9]
+    extra = hours[rng.random(len(hours)) < 0.02]
+    dates = np.concatenate([metar, synop, extra])
+    report_type = np.array(["FM-15"] * len(metar) + ["FM-12"] * len(synop) + ["SY-MT"] * len(extra), dtype=object)
+    order = np.argsort(dates, kind="stable")
+    n = len(dates)
+
+    df = pd.DataFrame({"STATION": 12566099999, "DATE": dates[order], "SOURCE": 4,
+                       "REPORT_TYPE": report_type[order]})
+    for col in NUMERIC_COLUMNS:
+        values = np.round(rng.normal(10, 5, n), 1)
+        values[rng.random(n) < 0.2] = np.nan
+        df[col] = values
+    for col in ["GA1_type", "GA2_type"]:
+        values = rng.choice(np.array(["01", "03", "07", "08"], dtype=object), n)
+        values[rng.random(n) < 0.4] = np.nan
+        df[col] = values
+    return df
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark merging of hourly weather reports.")
+    parser.add_argument("--years", type=float, default=5, help="Years of synthetic hourly reports")
+    parser.add_argument("--skip-reference", action="store_true", help="Only time merge_hourly_reports")
+    args = parser.parse_args()
+
+    df = make_reports(args.years)
+    print(f"Synthetic full-hour reports: {len(df)}")
+
+    merged, merged_s = timed(merge_hourly_reports, df)
+    print(f"grouped (merge_hourly_reports): {merged_s:.2f} s ({len(df) / merged_s:,.0f} reports/s)")
+
+    if not args.skip_reference:
+        reference, reference_s = timed(reference_merge, df)
+        print(f"per-hour loop (reference):      {reference_s:.2f} s ({len(df) / reference_s:,.0f} reports/s)")
+        print(f"Speedup: {reference_s / merged_s:.1f}x")
+
+        assert reference.to_csv() == merged.to_csv()
+        print("Outputs are identical.")
+
+
+if __name__ == "__main__":
+    main()
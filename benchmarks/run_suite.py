@@ -0,0 +1,262 @@
+"""
+Benchmark suite of the forecasting hot paths, for comparing commits.
+
+On synthetic cases (see synthetic.py) it times:
+- preprocess_weather:          the raw weather records of one case
+- find_weather_for_timestamp:  one lookup in a case's preprocessed weather
+- forecast_with_lag:           one case, 24 hours
+- generate_output:             all cases in one call
+- cli / cli_workers / cli_stream: `python main.py` end to end, in a subprocess
+
+and records throughput, latency percentiles and peak RSS for each as JSON
+(with the commit, parameters and machine), by default to
+benchmarks/results/<commit>.json. --compare prints the change against an
+earlier result file.
+
+Every benchmark runs in a fresh process (the in-process ones in a child
+started with --in-process), so its peak RSS is its own: the high-water mark
+of the child, which also holds the synthetic cases and the model, and of the
+main.py process for the CLI runs.
+
+Usage:
+    python benchmarks/run_suite.py [--cases 500] [--stations 1] [--history 24] [--weather-rows 48]
+                                   [--workers 2] [--model-path models/catboost_best_model.cbm]
+                                   [--output results.json] [--compare benchmarks/results/<commit>.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import forecast_cache  # noqa: E402
+from main import generate_output  # noqa: E402
+from model_registry import default_model_path, load_model  # noqa: E402
+from prediction import find_weather_for_timestamp, forecast_with_lag  # noqa: E402
+from weather_preprocessing import preprocess_weather  # noqa: E402
+from synthetic import make_cases, write_cases  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def peak_rss_mb():
+    """
+    Peak RSS of this process. ru_maxrss of a child process includes the RSS of
+    the process it was forked from, while VmHWM only covers the process after
+    exec.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmHWM")) / 1024
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def summarize(latencies, items, total_s, peak_rss):
+    """Throughput (items/s), latency percentiles (ms) and peak RSS (MiB) of a benchmark."""
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "calls": len(latencies),
+        "items": items,
+        "total_s": total_s,
+        "throughput_per_s": items / total_s if total_s else None,
+        "latency_ms": {"mean": float(latencies_ms.mean()), "p50": float(np.percentile(latencies_ms, 50)),
+                       "p90": float(np.percentile(latencies_ms, 90)), "p99": float(np.percentile(latencies_ms, 99)),
+                       "max": float(latencies_ms.max())},
+        "peak_rss_mb": peak_rss,
+    }
+
+
+IN_PROCESS = ["preprocess_weather", "find_weather_for_timestamp", "forecast_with_lag", "generate_output"]
+
+
+def bench_calls(func, args_list, items_per_call=1):
+    """Times func(*args) for every args of args_list."""
+    latencies = []
+    start = time.perf_counter()
+    for args in args_list:
+        call_start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - call_start)
+    total_s = time.perf_counter() - start
+    return summarize(latencies, len(args_list) * items_per_call, total_s, peak_rss_mb())
+
+
+# Runs main.py and reports its peak RSS on exit (see peak_rss_mb). main.py's
+# directory goes first on sys.path, as with `python main.py`, whatever the
+# working directory.
+CLI_LAUNCHER = """
+import atexit, os, runpy, sys
+def report():
+    with open("/proc/self/status") as f:
+        sys.stderr.write("".join(line for line in f if line.startswith("VmHWM")))
+atexit.register(report)
+sys.argv = sys.argv[1:]
+sys.path.insert(0, os.path.dirname(os.path.abspath(sys.argv[0])))
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def bench_cli(args, n_cases, repeat):
+    """Runs `python main.py args` repeat times; peak RSS is that of the main.py process."""
+    latencies, peak = [], 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, "-c", CLI_LAUNCHER, os.path.join(ROOT, "main.py")] + args,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        latencies.append(time.perf_counter() - start)
+        if process.returncode != 0:
+            raise RuntimeError(f"main.py {' '.join(args)} failed:\n{process.stderr}")
+        hwm = [line.split()[1] for line in process.stderr.splitlines() if line.startswith("VmHWM")]
+        if hwm:
+            peak = max(peak, int(hwm[-1]) / 1024)
+    return summarize(latencies, n_cases * repeat, sum(latencies), peak or None)
+
+
+def bench_in_process(name, n_cases=500, n_stations=1, history=24, weather_rows=48, repeat=3, model_path=None,
+                     seed=0):
+    """Runs one of the IN_PROCESS benchmarks in this process."""
+    # The benchmarks forecast the same cases several times: time the forecasts, not the forecast cache
+    forecast_cache.configure(0)
+    data = make_cases(n_cases, n_stations, history, weather_rows, seed)
+    cases = data["cases"]
+    if name == "generate_output":
+        return bench_calls(lambda: generate_output(data, model_path=model_path), [()] * repeat, items_per_call=n_cases)
+    if name == "forecast_with_lag":
+        model = load_model(model_path)
+        return bench_calls(forecast_with_lag, [(case, model, 24) for case in cases])
+
+    weather_frames = [pd.DataFrame(case["weather"]).rename(columns={"date": "DATE"}) for case in cases]
+    if name == "preprocess_weather":
+        return bench_calls(preprocess_weather, [(df,) for df in weather_frames])
+    processed = [preprocess_weather(df) for df in weather_frames]
+    lookups = [(weather, pd.Timestamp(case["target"]["prediction_start_time"]) + pd.Timedelta(hours=h))
+               for weather, case in zip(processed, cases) for h in (0, 12)]
+    return bench_calls(find_weather_for_timestamp, lookups)
+
+
+def bench_subprocess(name, args):
+    """Runs an IN_PROCESS benchmark in a fresh `run_suite.py --in-process` process."""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "result.json")
+        process = subprocess.run([sys.executable, os.path.abspath(__file__), "--in-process", name, "--output", output]
+                                 + args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if process.returncode != 0:
+            raise RuntimeError(f"Benchmark {name} failed:\n{process.stderr}")
+        with open(output) as f:
+            return json.load(f)
+
+
+def run_suite(n_cases=500, n_stations=1, history=24, weather_rows=48, workers=2, repeat=3, model_path=None,
+              seed=0):
+    data = make_cases(n_cases, n_stations, history, weather_rows, seed)
+    model_args = ["--model-path", model_path] if model_path else []
+    args = ["--cases", str(n_cases), "--stations", str(n_stations), "--history", str(history),
+            "--weather-rows", str(weather_rows), "--repeat", str(repeat), "--seed", str(seed)] + model_args
+    results = {name: bench_subprocess(name, args) for name in IN_PROCESS}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path, jsonl_path = os.path.join(tmp, "cases.json"), os.path.join(tmp, "cases.jsonl")
+        write_cases(json_path, data)
+        write_cases(jsonl_path, data)
+        results["cli"] = bench_cli(["--data-file", json_path, "--output-file", os.path.join(tmp, "out.json")]
+                                   + model_args, n_cases, repeat)
+        if workers > 1:
+            results["cli_workers"] = bench_cli(["--data-file", json_path, "--output-file",
+                                                os.path.join(tmp, "out.json"), "--workers", str(workers)]
+                                               + model_args, n_cases, repeat)
+        results["cli_stream"] = bench_cli(["--data-file", jsonl_path, "--output-file", os.path.join(tmp, "out.jsonl"),
+                                           "--stream"] + model_args, n_cases, repeat)
+    return results
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Prints throughput, p50 latency and peak RSS of results relative to a baseline result file."""
+    print(f"\nCompared with {baseline.get('commit')}:")
+    print(f"  {'benchmark':<28} {'throughput':>11} {'p50':>9} {'peak RSS':>9}")
+    for name, current in results.items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+
+        def change(now, then):
+            return f"{(now / then - 1) * 100:+.1f}%" if now and then else "-"
+
+        print(f"  {name:<28} {change(current['throughput_per_s'], before['throughput_per_s']):>11} "
+              f"{change(current['latency_ms']['p50'], before['latency_ms']['p50']):>9} "
+              f"{change(current['peak_rss_mb'], before['peak_rss_mb']):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the forecasting hot paths.")
+    parser.add_argument("--cases", type=int, default=500, help="Number of synthetic cases")
+    parser.add_argument("--stations", type=int, default=1, help="Stations per case")
+    parser.add_argument("--history", type=int, default=24, help="PM10 history points per station")
+    parser.add_argument("--weather-rows", type=int, default=48, help="Raw weather records per case")
+    parser.add_argument("--workers", type=int, default=2, help="Workers of the cli_workers run (1 to skip it)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of generate_output and of every CLI benchmark")
+    parser.add_argument("--model-path", default=None, help=f"Model to use (default: {default_model_path()})")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic cases")
+    parser.add_argument("--output", default=None, help="Result JSON file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier result JSON file to compare with")
+    parser.add_argument("--in-process", default=None, choices=IN_PROCESS,
+                        help="Only run this benchmark, in this process, and write its result to --output")
+    args = parser.parse_args()
+
+    if args.in_process:
+        result = bench_in_process(args.in_process, args.cases, args.stations, args.history, args.weather_rows,
+                                  args.repeat, args.model_path, args.seed)
+        with open(args.output, "w") as f:
+            json.dump(result, f)
+        return
+
+    params = {"cases": args.cases, "stations": args.stations, "history": args.history,
+              "weather_rows": args.weather_rows, "workers": args.workers, "repeat": args.repeat, "seed": args.seed}
+    results = run_suite(args.cases, args.stations, args.history, args.weather_rows, args.workers, args.repeat,
+                        args.model_path, args.seed)
+
+    print(f"  {'benchmark':<28} {'items/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'RSS MiB':>8}")
+    for name, result in results.items():
+        latency = result["latency_ms"]
+        print(f"  {name:<28} {result['throughput_per_s']:>10,.1f} {latency['p50']:>9.2f} {latency['p90']:>9.2f} "
+              f"{latency['p99']:>9.2f} {result['peak_rss_mb'] or 0:>8.0f}")
+
+    commit = git_commit()
+    report = {"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "params": params,
+              "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                          "cpus": os.cpu_count()},
+              "results": results}
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
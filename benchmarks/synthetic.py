@@ -0,0 +1,103 @@
+"""
+Synthetic forecast inputs of configurable size for the benchmarks.
+
+Writes cases in the data.json schema (or one case per line for .jsonl):
+--cases cases, each with --stations station objects of --history hourly PM10
+points, and --weather-rows raw ISD weather records (half-hourly, around the
+forecast start, with randomly missing groups, sentinels and bad quality flags).
+
+Usage:
+    python benchmarks/synthetic.py --cases 1000 [--stations 1] [--history 24] [--weather-rows 48]
+                                   [--seed 0] --output cases.json
+"""
+
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+# Pools of raw values per ISD group, including sentinels and bad quality flags
+FIELD_POOLS = {
+    "WND": ["260,1,N,0030,1", "180,1,N,0025,1", "999,9,C,0000,1", "090,1,V,0015,1", "999,9,9,9999,9"],
+    "TMP": ["+0050,1", "-0020,1", "+0123,1", "+9999,9", "+0010,5"],
+    "CIG": ["22000,1,9,N", "01200,1,1,Y", "99999,9,9,9", "00800,1,1,Y"],
+    "VIS": ["010000,1,N,1", "005000,1,N,1", "999999,9,9,9", "000800,1,N,1"],
+    "SLP": ["10132,1", "09985,1", "99999,9", "10250,1"],
+    "DEW": ["-0010,1", "+0045,1", "+9999,9", "-0100,1"],
+    "MA1": ["10110,1,09950,1", "99999,9,99999,9", "10050,1,09900,1"],
+    "GA1": ["03,1,01200,1,06,1", "99,9,99999,9,99,9", "07,1,00600,1,08,1"],
+    "MD1": ["3,1,012,1,+999,9", "8,1,999,9,+999,9", "1,1,005,1,+999,9"],
+}
+
+STATION_CODES = ["MpKrakAlKras", "MpKrakBujaka", "MpKrakBulwar", "MpKrakOsPias",
+                 "MpKrakSwoszo", "MpKrakWadow", "MpKrakZloRog"]
+
+
+def weather_records(start, rows, rng):
+    """rows half-hourly raw weather records from `start` on, ~20% of the groups missing."""
+    dates = pd.date_range(start, periods=rows, freq="30min").strftime("%Y-%m-%dT%H:%M:%S")
+    records = [{"date": date} for date in dates]
+    for group, pool in FIELD_POOLS.items():
+        values = np.array(pool, dtype=object)[rng.integers(0, len(pool), rows)]
+        for record, value, missing in zip(records, values, rng.random(rows) < 0.2):
+            if not missing:
+                record[group.lower()] = value
+    return records
+
+
+def make_case(i, rng, n_stations=1, history=24, weather_rows=48):
+    """One synthetic case in the data.json schema."""
+    start = pd.Timestamp("2023-01-01") + pd.Timedelta(hours=int(rng.integers(0, 365 * 24)))
+    history_times = pd.date_range(end=start - pd.Timedelta(hours=1), periods=history, freq="h")
+    history_times = history_times.strftime("%Y-%m-%dT%H:%M:%S")
+    stations = []
+    for code in rng.choice(STATION_CODES, n_stations, replace=n_stations > len(STATION_CODES)):
+        pm10 = np.round(rng.gamma(2.0, 15.0, history), 2)
+        stations.append({
+            "station_code": str(code),
+            "longitude": round(19.85 + rng.random() * 0.2, 6),
+            "latitude": round(50.0 + rng.random() * 0.1, 6),
+            "history": [{"timestamp": ts, "pm10": float(value)} for ts, value in zip(history_times, pm10)],
+        })
+    return {
+        "case_id": f"case_{i:06d}",
+        "stations": stations,
+        "target": {"longitude": 19.95, "latitude": 50.05, "prediction_start_time": start.strftime("%Y-%m-%dT%H:%M:%S")},
+        # Weather starts a day before the forecast start, as in the backtest cases
+        "weather": weather_records(start - pd.Timedelta(hours=24), weather_rows, rng),
+    }
+
+
+def make_cases(n_cases, n_stations=1, history=24, weather_rows=48, seed=0):
+    """{"cases": [...]} with n_cases synthetic cases."""
+    rng = np.random.default_rng(seed)
+    return {"cases": [make_case(i, rng, n_stations, history, weather_rows) for i in range(n_cases)]}
+
+
+def write_cases(path, data):
+    """Writes cases as data.json, or one case per line if path ends with .jsonl."""
+    with open(path, "w") as f:
+        if path.endswith(".jsonl"):
+            for case in data["cases"]:
+                f.write(json.dumps(case) + "\n")
+        else:
+            json.dump(data, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic forecast cases.")
+    parser.add_argument("--cases", type=int, default=1000, help="Number of cases")
+    parser.add_argument("--stations", type=int, default=1, help="Stations per case")
+    parser.add_argument("--history", type=int, default=24, help="Hourly PM10 history points per station (>= 2)")
+    parser.add_argument("--weather-rows", type=int, default=48, help="Raw weather records per case")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--output", required=True, help="Output .json or .jsonl file")
+    args = parser.parse_args()
+
+    write_cases(args.output, make_cases(args.cases, args.stations, args.history, args.weather_rows, args.seed))
+    print(f"Wrote {args.cases} cases to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
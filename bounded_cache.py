@@ -0,0 +1,80 @@
+"""
+Building blocks of the in-memory caches (weather_cache, forecast_cache).
+
+- BoundedLRU: values with an approximate size in bytes, least recently used
+  first; once the sizes exceed the budget, the oldest values are evicted
+- ProcessDefault: the process-wide instance of a cache class, replaced by
+  configure() and recreated in worker processes from settings()
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class BoundedLRU:
+    """LRU of at most memory_mb of values (0: nothing is kept). Thread-safe."""
+
+    def __init__(self, memory_mb):
+        self.budget = memory_mb * 1024 * 1024
+        self._values = OrderedDict()  # key -> (nbytes, value), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        """The value of key (now the most recently used), None if it is not cached."""
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is None:
+                return None
+            self._values.move_to_end(key)
+            return cached[1]
+
+    def put(self, key, value, nbytes):
+        """Keeps value unless key is already cached or value alone exceeds the budget."""
+        if nbytes > self.budget:
+            return
+        with self._lock:
+            if key in self._values:
+                return
+            self._values[key] = (nbytes, value)
+            self._bytes += nbytes
+            while self._bytes > self.budget:
+                _, (evicted_nbytes, _) = self._values.popitem(last=False)
+                self._bytes -= evicted_nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Cached values, their approximate bytes and evictions."""
+        with self._lock:
+            return {"entries": len(self._values), "bytes": self._bytes, "evictions": self.evictions}
+
+
+class ProcessDefault:
+    """
+    The process-wide instance of cache_class, created with its default
+    arguments. cache_class.settings() must return the arguments that recreate
+    an instance.
+    """
+
+    def __init__(self, cache_class):
+        self.cache_class = cache_class
+        self.cache = cache_class()
+
+    def configure(self, *args, **kwargs):
+        """Replaces the process-wide cache (see default_cache)."""
+        self.cache = self.cache_class(*args, **kwargs)
+        return self.cache
+
+    def settings(self):
+        """Arguments of configure() that recreate the process-wide cache, e.g. in a worker process."""
+        return self.cache.settings()
+
+    def default_cache(self):
+        """The process-wide cache."""
+        return self.cache
@@ -0,0 +1,162 @@
+"""
+Streaming input/output of forecast cases.
+
+iter_cases() reads cases one at a time, either from the "cases" array of a
+data.json file or from a JSONL file with one case per line, so a case file
+never has to be loaded into memory as a whole.
+
+PredictionWriter writes predictions as soon as they are produced. For .json
+output the result is byte-identical to json.dump({"predictions": [...]}, indent=2);
+for .jsonl output every prediction is written as one line. The file only
+appears once all predictions are written: a run that fails partway leaves no
+output rather than a valid document missing cases.
+"""
+
+import json
+import os
+
+CHUNK_SIZE = 1 << 20  # characters read from the input file at a time
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class _StreamBuffer:
+    """Text buffer over a file that decodes one JSON value at a time."""
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        # Drop what was consumed, then read at least as much as is buffered
+        # so that decoding a large value is retried O(log n) times
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        data = self.f.read(max(self.chunk_size, len(self.buf)))
+        if not data:
+            self.eof = True
+        self.buf += data
+
+    def peek(self):
+        """Next non-whitespace character ('' at end of file)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Invalid case file: expected '{char}' but found '{found or 'end of file'}'")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # A number may continue in the next chunk
+            if end == len(self.buf) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_json_cases(f, chunk_size=CHUNK_SIZE):
+    """Yields the elements of the top-level "cases" array of a JSON document."""
+    stream = _StreamBuffer(f, chunk_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key == "cases":
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.pos += 1
+            else:
+                while True:
+                    yield stream.value()
+                    if stream.peek() == "]":
+                        stream.pos += 1
+                        break
+                    stream.expect(",")
+        else:
+            # Other top-level keys are small; decode and skip them
+            stream.value()
+        if stream.peek() == "}":
+            return
+        stream.expect(",")
+
+
+def iter_cases(path, chunk_size=CHUNK_SIZE):
+    """
+    Yields the cases of a case file one at a time.
+    - *.jsonl: one case per line (a line holding {"cases": [...]} yields all its cases)
+    - otherwise: the elements of the "cases" array of a data.json document
+    """
+    with open(path, "r") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "cases" in record:
+                    yield from record["cases"]
+                else:
+                    yield record
+        else:
+            yield from _iter_json_cases(f, chunk_size)
+
+
+class PredictionWriter:
+    """
+    Incrementally writes predictions to a .json or .jsonl output file.
+    Use as a context manager; the JSON document is closed on exit, and only
+    moved to path if no exception is raised.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.jsonl = path.endswith(".jsonl")
+        self.count = 0
+        self.f = None
+        # Written next to the target and renamed, so a failed run leaves no partial output
+        self.tmp_path = f"{path}.tmp{os.getpid()}"
+
+    def __enter__(self):
+        self.f = open(self.tmp_path, "w")
+        if not self.jsonl:
+            self.f.write('{\n  "predictions": [')
+        return self
+
+    def write(self, prediction):
+        if self.jsonl:
+            self.f.write(json.dumps(prediction) + "\n")
+        else:
+            # Same layout as json.dump(..., indent=2) at nesting level 2
+            item = json.dumps(prediction, indent=2).replace("\n", "\n    ")
+            self.f.write(("," if self.count else "") + "\n    " + item)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and not self.jsonl:
+            self.f.write("\n  ]\n}" if self.count else "]\n}")
+        self.f.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+        return False
@@ -0,0 +1,366 @@
+"""
+CatBoost model compiled into flat NumPy arrays, with a vectorized evaluator.
+
+CatBoost's predict() on a few rows is dominated by its DataFrame and
+categorical feature handling, not by the 200 oblivious trees. compile_model
+reads a trained CatBoostRegressor (its JSON export) into arrays:
+
+- per tree split: the column it tests (a float feature or a CTR) and its border
+- per CTR (target statistic of categorical values, optionally combined with
+  float feature splits): its categorical features and float splits, and its
+  table of hash -> CTR value, precomputed from the learned counts
+- leaf values per tree, scale and bias
+- per categorical feature: CatBoost's hash of every known value (taken from
+  CatBoost's Python export, as CatBoost has no public hash function)
+
+CompiledModel.predict then scores N rows with array operations only, in the
+same float32/float64 arithmetic as CatBoost, so predictions are bit-for-bit
+identical to model.predict (see benchmarks/bench_compiled.py). Categorical
+values that are not in the compiled vocabulary are treated as unseen in
+training, as CatBoost does for values without statistics; compile_model
+raises if a value seen in training is missing from the vocabulary.
+
+The compiled model halves the time of a single case's 24 recursive steps
+(server, live forecasts); on batches of more than a few hundred rows,
+CatBoost's own evaluator is faster.
+
+Compiled models are saved as .npz and loaded by model_registry like .cbm
+files:
+    python model_registry.py compile models/catboost_best_model.cbm models/catboost_best_model.npz
+"""
+
+import ast
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+_MAGIC_MULT = np.uint64(0x4906BA494954CB65)
+_UNKNOWN_HASH = 0x7FFFFFFF  # hash of categorical values outside the vocabulary
+_EMPTY_KEY = 2 ** 64 - 1  # empty slot of CatBoost's CTR hash maps
+_BLOCK_ROWS = 8192  # rows evaluated at once, bounding the (trees, rows) intermediates
+_SMALL_ROWS = 200  # up to this many rows, per-row conversion and direct comparisons are faster
+
+
+def calc_hash(a, b):
+    """CatBoost's hash combination of uint64 arrays (wrapping arithmetic)."""
+    with np.errstate(over="ignore"):
+        return _MAGIC_MULT * (a + _MAGIC_MULT * b)
+
+
+def _ctr_value(count_in_class, total_count, ctr):
+    """A CTR from its counts, in float32 like CatBoost's evaluator."""
+    prior_num, prior_denom = np.float32(ctr["prior_numerator"]), np.float32(ctr["prior_denomerator"])
+    value = (np.float32(count_in_class) + prior_num) / (np.float32(total_count) + prior_denom)
+    return (value + np.float32(ctr["shift"])) * np.float32(ctr["scale"])
+
+
+def _ctr_table(ctr, data):
+    """Sorted hash keys and their CTR values of a learned CTR, and the value of unseen hashes."""
+    stride = data["hash_stride"]
+    entries = [data["hash_map"][i:i + stride] for i in range(0, len(data["hash_map"]), stride)]
+    entries = [(int(entry[0]), entry[1:]) for entry in entries if int(entry[0]) != _EMPTY_KEY]
+    values = []
+    for _, counts in entries:
+        if ctr["ctr_type"] in ("Counter", "FeatureFreq"):
+            values.append(_ctr_value(counts[0], data["counter_denominator"], ctr))
+        elif ctr["ctr_type"] in ("Borders", "Buckets") and len(counts) == 2:
+            good = counts[1] if ctr["ctr_type"] == "Borders" else counts[ctr["target_border_idx"]]
+            values.append(_ctr_value(good, counts[0] + counts[1], ctr))
+        else:
+            raise ValueError(f"Unsupported CTR type {ctr['ctr_type']} with {len(counts)} counters")
+    keys = np.array([key for key, _ in entries], dtype=np.uint64)
+    order = np.argsort(keys)
+    return keys[order], np.array(values, dtype=np.float32)[order], _ctr_value(0, 0, ctr)
+
+
+def _catboost_hashes(model, categories):
+    """CatBoost's hash of every value in categories ({feature name: values}), via its Python export."""
+    from catboost import Pool
+
+    names = model.feature_names_
+    cat_indices = model.get_cat_feature_indices()
+    n_rows = max([len(values) for values in categories.values()] + [1])
+    frame = pd.DataFrame({name: [0.0] * n_rows for name in names})
+    for index in cat_indices:
+        values = [str(value) for value in categories.get(names[index], [])] or ["0"]
+        frame[names[index]] = [values[i % len(values)] for i in range(n_rows)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.py")
+        model.save_model(path, format="python", pool=Pool(frame, cat_features=cat_indices))
+        with open(path) as f:
+            source = f.read()
+    match = re.search(r"^cat_features_hashes = (\{.*?^\})", source, re.M | re.S)
+    return ast.literal_eval(match.group(1)) if match else {}
+
+
+def default_categories():
+    """Known values of the categorical features: months and the stations of data/processed/stations.csv."""
+    from spatial import station_network
+    return {"month": list(range(1, 13)), "station_code": sorted(station_network())}
+
+
+def compile_model(model, categories=None):
+    """
+    Compiles a trained CatBoostRegressor with symmetric trees. categories maps
+    categorical feature names to their known values (default:
+    default_categories()). Raises ValueError if the model uses something the
+    evaluator does not support, or if a categorical value seen in training is
+    missing from categories.
+    """
+    categories = default_categories() if categories is None else categories
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.json")
+        model.save_model(path, format="json")
+        with open(path) as f:
+            exported = json.load(f)
+    info = exported["features_info"]
+    float_features = info.get("float_features", [])
+    cat_features = info.get("categorical_features", [])
+    ctrs = info.get("ctrs", [])
+    if "oblivious_trees" not in exported:
+        raise ValueError("Only models with symmetric (oblivious) trees are supported")
+    trees = exported["oblivious_trees"]
+    if any(split["split_type"] not in ("FloatFeature", "OnlineCtr") for tree in trees for split in tree["splits"]):
+        raise ValueError("Only float feature and CTR splits are supported (no one-hot or text features)")
+    if any(len(tree["leaf_values"]) != 2 ** len(tree["splits"]) for tree in trees):
+        raise ValueError("Only models with one prediction dimension are supported")
+    depth = max([len(tree["splits"]) for tree in trees] + [0])
+
+    # Columns tested by the splits: the float features, then the CTRs
+    n_float = len(float_features)
+    split_index = {}  # CatBoost's split_index -> (column, border)
+    for i, feature in enumerate(float_features):
+        for border in feature["borders"]:
+            split_index[len(split_index)] = (i, border)
+    for i, ctr in enumerate(ctrs):
+        for border in ctr["borders"]:
+            split_index[len(split_index)] = (n_float + i, border)
+    # Shallower trees get splits that are never true (border +inf) up to the depth of the deepest tree
+    split_columns, split_borders, leaf_values = [], [], []
+    for tree in trees:
+        for split in tree["splits"]:
+            column, border = split_index[split["split_index"]]
+            split_columns.append(column)
+            split_borders.append(border)
+        split_columns += [0] * (depth - len(tree["splits"]))
+        split_borders += [np.inf] * (depth - len(tree["splits"]))
+        leaf_values.append(tree["leaf_values"] + [0.0] * (2 ** depth - len(tree["leaf_values"])))
+
+    # CTRs: their projections and precomputed value tables
+    ctr_cat, ctr_float, ctr_float_borders, ctr_keys, ctr_values, ctr_defaults = [], [], [], [], [], []
+    for ctr in ctrs:
+        elements = ctr["elements"]
+        unsupported = {e["combination_element"] for e in elements} - {"cat_feature_value", "float_feature"}
+        if unsupported:
+            raise ValueError(f"Unsupported CTR elements: {sorted(unsupported)}")
+        ctr_cat.append([e["cat_feature_index"] for e in elements if e["combination_element"] == "cat_feature_value"])
+        floats = [e for e in elements if e["combination_element"] == "float_feature"]
+        ctr_float.append([e["float_feature_index"] for e in floats])
+        ctr_float_borders.append([e["border"] for e in floats])
+        keys, values, default = _ctr_table(ctr, exported["ctr_data"][ctr["identifier"]])
+        ctr_keys.append(keys)
+        ctr_values.append(values)
+        ctr_defaults.append(default)
+
+    # Hashes of the known categorical values
+    hashes = _catboost_hashes(model, categories) if cat_features else {}
+    cat_names = [feature["feature_id"] for feature in cat_features]
+    vocabulary = {name: [str(value) for value in categories.get(name, [])] for name in cat_names}
+    for c, name in enumerate(cat_names):
+        # Every value with statistics of its own must be known (checked on single-feature CTRs)
+        known = calc_hash(np.zeros(len(vocabulary[name]), dtype=np.uint64),
+                          np.array([hashes[value] for value in vocabulary[name]], dtype=np.int64).view(np.uint64))
+        for keys, cats, floats in zip(ctr_keys, ctr_cat, ctr_float):
+            missing = np.setdiff1d(keys, known) if cats == [c] and not floats else []
+            if len(missing):
+                raise ValueError(f"{len(missing)} values of categorical feature {name!r} seen in training are not "
+                                 f"among the {len(vocabulary[name])} known values; pass them in categories")
+
+    def ragged(lists, dtype):
+        return (np.array([x for values in lists for x in values], dtype=dtype),
+                np.cumsum([0] + [len(values) for values in lists]).astype(np.int64))
+
+    arrays = {"format_version": np.array(FORMAT_VERSION)}
+    arrays["feature_names"] = np.array(model.feature_names_, dtype=str)
+    arrays["float_columns"] = np.array([f["flat_feature_index"] for f in float_features], dtype=np.int64)
+    arrays["float_nan_true"] = np.array([f.get("nan_value_treatment") == "AsTrue" for f in float_features])
+    arrays["cat_columns"] = np.array([f["flat_feature_index"] for f in cat_features], dtype=np.int64)
+    values, offsets = ragged([vocabulary[name] for name in cat_names], str)
+    arrays["cat_values"], arrays["cat_value_offsets"] = values, offsets
+    arrays["cat_hashes"] = np.array([hashes[value] for name in cat_names for value in vocabulary[name]],
+                                    dtype=np.int64)
+    arrays["ctr_cat"], arrays["ctr_cat_offsets"] = ragged(ctr_cat, np.int64)
+    arrays["ctr_float"], arrays["ctr_float_offsets"] = ragged(ctr_float, np.int64)
+    arrays["ctr_float_borders"] = np.array([b for borders in ctr_float_borders for b in borders], dtype=np.float32)
+    arrays["ctr_keys"], arrays["ctr_key_offsets"] = ragged(ctr_keys, np.uint64)
+    arrays["ctr_values"] = np.concatenate(ctr_values).astype(np.float32) if ctrs else np.zeros(0, np.float32)
+    arrays["ctr_defaults"] = np.array(ctr_defaults, dtype=np.float32)
+    arrays["split_columns"] = np.array(split_columns, dtype=np.int64).reshape(len(trees), depth)
+    arrays["split_borders"] = np.array(split_borders, dtype=np.float32).reshape(len(trees), depth)
+    arrays["leaf_values"] = np.array(leaf_values, dtype=np.float64).reshape(len(trees), 2 ** depth)
+    scale, bias = exported.get("scale_and_bias", [1.0, [0.0]])
+    arrays["scale"], arrays["bias"] = np.array(scale, dtype=np.float64), np.array(bias[0], dtype=np.float64)
+    return CompiledModel(arrays)
+
+
+def _unflatten(data, offsets):
+    return [data[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+class CompiledModel:
+    """
+    Vectorized evaluator of a compiled CatBoost model (see compile_model).
+    Like a CatBoostRegressor, it has feature_names_ and predict(X) for a
+    DataFrame with those columns.
+    """
+
+    def __init__(self, arrays):
+        if int(arrays["format_version"]) != FORMAT_VERSION:
+            raise ValueError(f"Compiled model format {int(arrays['format_version'])} is not {FORMAT_VERSION}")
+        self.arrays = arrays
+        self.feature_names_ = [str(name) for name in arrays["feature_names"]]
+        self.float_columns = [self.feature_names_[i] for i in arrays["float_columns"]]
+        self.float_nan_true = arrays["float_nan_true"]
+        self.cat_columns = [self.feature_names_[i] for i in arrays["cat_columns"]]
+        values, offsets, hashes = arrays["cat_values"], arrays["cat_value_offsets"], arrays["cat_hashes"]
+        self.cat_hashes = [dict(zip(names.tolist(), codes.tolist()))
+                           for names, codes in zip(_unflatten(values, offsets), _unflatten(hashes, offsets))]
+
+        self.ctr_cat = _unflatten(arrays["ctr_cat"], arrays["ctr_cat_offsets"])
+        self.ctr_float = _unflatten(arrays["ctr_float"], arrays["ctr_float_offsets"])
+        self.ctr_float_borders = _unflatten(arrays["ctr_float_borders"], arrays["ctr_float_offsets"])
+        self.ctr_keys = _unflatten(arrays["ctr_keys"], arrays["ctr_key_offsets"])
+        self.ctr_values = _unflatten(arrays["ctr_values"], arrays["ctr_key_offsets"])
+        self.ctr_defaults = arrays["ctr_defaults"]
+
+        self.split_columns = arrays["split_columns"]
+        self.leaf_values = arrays["leaf_values"]
+        self.scale, self.bias = float(arrays["scale"]), float(arrays["bias"])
+        self.split_borders = split_borders = arrays["split_borders"]
+        # Borders of each column, and the rank of every split's border among them (see _predict_block)
+        n_columns = len(self.float_columns) + len(self.ctr_keys)
+        self.column_borders = [np.unique(split_borders[self.split_columns == j]) for j in range(n_columns)]
+        self.used_columns = [j for j in range(n_columns) if len(self.column_borders[j])]
+        most = max([len(borders) for borders in self.column_borders] + [0])
+        self.bucket_dtype = np.uint8 if most < 256 else np.uint16
+        self.split_ranks = np.array([[np.searchsorted(self.column_borders[j], border) for j, border in zip(*split)]
+                                     for split in zip(self.split_columns, split_borders)],
+                                    dtype=self.bucket_dtype).reshape(self.split_columns.shape)
+        self.tree_offsets = (np.arange(len(self.leaf_values)) * self.leaf_values.shape[1]).reshape(-1, 1)
+
+    @property
+    def tree_count_(self):
+        return len(self.leaf_values)
+
+    def save(self, path):
+        """Writes the arrays to a .npz file."""
+        with open(path, "wb") as f:
+            np.savez(f, **self.arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def _columns(self, X):
+        """Column name -> 1-D array of the rows of X (a DataFrame, or rows of values in feature_names_ order)."""
+        if isinstance(X, pd.DataFrame) and len(X) > _SMALL_ROWS:
+            return {name: series.to_numpy() for name, series in X.items()}
+        if isinstance(X, pd.DataFrame):  # converting the few rows at once is cheaper than per-column access
+            rows, names = X.to_numpy(dtype=object), X.columns
+        else:
+            rows, names = np.asarray(X, dtype=object).reshape(-1, len(self.feature_names_)), self.feature_names_
+        return {name: rows[:, i] for i, name in enumerate(names)}
+
+    def _float_matrix(self, columns, n):
+        """(float features, n) float32, NaN as below (or, for AsTrue features, above) every border."""
+        floats = np.empty((len(self.float_columns), n), dtype=np.float32)
+        for j, name in enumerate(self.float_columns):
+            floats[j] = columns[name]
+        nan = np.isnan(floats)
+        if nan.any():
+            floats[nan] = np.where(np.broadcast_to(self.float_nan_true[:, None], floats.shape)[nan], np.inf, -np.inf)
+        return floats
+
+    def _cat_hashes(self, columns, n):
+        """(categorical features, n) CatBoost hashes as uint64 (sign-extended like CatBoost's int32 hashes)."""
+        hashes = np.empty((len(self.cat_columns), n), dtype=np.int64)
+        for j, name in enumerate(self.cat_columns):
+            table = self.cat_hashes[j]
+            if n <= _SMALL_ROWS:
+                hashes[j] = [table.get(str(value), _UNKNOWN_HASH) for value in columns[name]]
+            else:
+                codes, uniques = pd.factorize(columns[name], use_na_sentinel=False)
+                hashes[j] = np.array([table.get(str(value), _UNKNOWN_HASH) for value in uniques], dtype=np.int64)[codes]
+        return hashes.view(np.uint64)
+
+    def _ctrs(self, floats, hashes):
+        """(CTRs, n) float32 CTR values."""
+        n = floats.shape[1]
+        ctrs = np.empty((len(self.ctr_keys), n), dtype=np.float32)
+        projection_hashes = {}
+        for i, (cats, float_features, borders) in enumerate(zip(self.ctr_cat, self.ctr_float, self.ctr_float_borders)):
+            projection = (tuple(cats), tuple(float_features), borders.tobytes())
+            if projection not in projection_hashes:
+                key = np.zeros(n, dtype=np.uint64)
+                for c in cats:
+                    key = calc_hash(key, hashes[c])
+                for f, border in zip(float_features, borders):
+                    key = calc_hash(key, (floats[f] > border).astype(np.uint64))
+                projection_hashes[projection] = key
+            key = projection_hashes[projection]
+            keys = self.ctr_keys[i]
+            if not len(keys):
+                ctrs[i] = self.ctr_defaults[i]
+                continue
+            position = np.minimum(np.searchsorted(keys, key), len(keys) - 1)
+            ctrs[i] = np.where(keys[position] == key, self.ctr_values[i][position], self.ctr_defaults[i])
+        return ctrs
+
+    def predict(self, X):
+        """
+        Predictions (float64 array) for the rows of a DataFrame with the model's
+        feature columns, or of rows of values in feature_names_ order.
+        """
+        columns = self._columns(X)
+        n = len(next(iter(columns.values()), []))
+        return np.concatenate([self._predict_block({name: column[start:start + _BLOCK_ROWS]
+                                                    for name, column in columns.items()},
+                                                   min(_BLOCK_ROWS, n - start))
+                               for start in range(0, n, _BLOCK_ROWS)] or [np.zeros(0)])
+
+    def _predict_block(self, columns, n):
+        # Rows are the last axis throughout, so every step works on contiguous rows of n values
+        values = self._float_matrix(columns, n)
+        if len(self.ctr_keys):
+            values = np.concatenate([values, self._ctrs(values, self._cat_hashes(columns, n))])
+        if n <= _SMALL_ROWS:
+            # Splits compare the values with their borders
+            columns, thresholds = values, self.split_borders
+        else:
+            # Like CatBoost, columns are quantized once into the bucket between their split borders,
+            # and splits compare the (smaller) buckets with the ranks of their borders
+            columns, thresholds = np.zeros(values.shape, dtype=self.bucket_dtype), self.split_ranks
+            for j in self.used_columns:
+                columns[j] = np.searchsorted(self.column_borders[j], values[j])  # NaN is +-inf by now
+        # Leaf index of every row in every tree: bit d is the d-th split of the tree
+        trees, depth = self.split_columns.shape
+        leaves = np.zeros((trees, n), dtype=np.int64 if depth > 8 else np.uint8)
+        bits = np.empty((trees, n), dtype=bool)
+        for d in range(depth):
+            np.greater(columns[self.split_columns[:, d]], thresholds[:, d, None], out=bits)
+            leaves |= bits.view(np.uint8).astype(leaves.dtype, copy=False) << d
+        # Summed tree by tree in float64, like CatBoost (ndarray.sum may sum pairwise): cumsum is
+        # sequential but slow on many rows, where adding tree by tree costs little per tree
+        if n <= _SMALL_ROWS:
+            total = np.cumsum(self.leaf_values.ravel().take(leaves + self.tree_offsets), axis=0)[-1]
+        else:
+            total = np.zeros(n)
+            for tree_leaf_values, tree_leaves in zip(self.leaf_values, leaves):
+                total += tree_leaf_values.take(tree_leaves)
+        return total * self.scale + self.bias
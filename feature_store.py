@@ -0,0 +1,284 @@
+"""
+Columnar feature store for the PM10 training data.
+
+The hourly PM10 sources (per-year XLSX files from data/raw/AirQuality_Krakow,
+or the wide air_quality_2019_2023.csv) and the hourly weather are converted
+once into typed NumPy arrays, partitioned by station and year:
+
+    <root>/manifest.json
+    <root>/<station_code>/<year>/<column>.npy
+
+Every partition holds one row per hour (also hours without a PM10 value, so
+the lags of later appends stay exact) with the features of the training
+notebooks precomputed: calendar features, pm10_lag_1/pm10_lag_2 and the
+weather columns joined on the hour. Partitions are memory-mapped on read.
+
+append() adds new hours (e.g. next month's data) and only rewrites the
+partitions they fall into.
+
+Usage:
+    python feature_store.py ingest --store data/feature_store data/raw/AirQuality_Krakow/*.xlsx
+                            [--weather data/processed/weather_imputed.csv]
+    python feature_store.py info --store data/feature_store
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+STORE_VERSION = 1
+
+CALENDAR_COLUMNS = {
+    "year": np.int16, "month": np.int8, "day": np.int8, "hour": np.int8,
+    "hour_sin": np.float64, "hour_cos": np.float64, "doy_sin": np.float64, "doy_cos": np.float64,
+    "weekday_sin": np.float64, "weekday_cos": np.float64,
+}
+PM10_COLUMNS = {"pm10": np.float64, "pm10_lag_1": np.float64, "pm10_lag_2": np.float64}
+WEATHER_COLUMNS = [
+    'wind_speed_raw', 'wind_dir_sin', 'wind_dir_cos', 'ceiling_coverage', 'visibility_m',
+    'temperature_C', 'SLP_hpa', 'DEW_C', 'MA1_main', 'MA1_sec', 'GA1_amt',
+    'GA1_height', 'GA1_type', 'MD1_m1', 'MD1_m2'
+]
+LAGS = (1, 2)
+
+
+def read_pm10_xlsx(path):
+    """Wide PM10 frame (DateTime + one column per station) of a per-year XLSX file, as in notebook 01."""
+    df = pd.read_excel(path, dtype=str)
+    df["DateTime"] = pd.to_datetime(df["DateTime"].str.split(".").str[0], errors="coerce")
+    return df
+
+
+def read_pm10_csv(path):
+    """Wide PM10 frame (DateTime + one column per station) of air_quality_2019_2023.csv."""
+    return pd.read_csv(path, parse_dates=["DateTime"])
+
+
+def read_pm10_sources(paths):
+    """Concatenated wide PM10 frame of XLSX and/or CSV files."""
+    frames = [read_pm10_xlsx(p) if p.lower().endswith((".xlsx", ".xls")) else read_pm10_csv(p) for p in paths]
+    return pd.concat(frames, ignore_index=True).sort_values("DateTime", kind="stable")
+
+
+def calendar_features(timestamps):
+    """Calendar features of datetime64 timestamps, computed as in notebook 01."""
+    dates = pd.DatetimeIndex(timestamps)
+    hour = dates.hour.to_numpy()
+    day_of_year = dates.dayofyear.to_numpy()
+    weekday = dates.weekday.to_numpy()
+    features = {
+        "year": dates.year.to_numpy(), "month": dates.month.to_numpy(),
+        "day": dates.day.to_numpy(), "hour": hour,
+        "hour_sin": np.sin(2 * np.pi * hour / 24), "hour_cos": np.cos(2 * np.pi * hour / 24),
+        "doy_sin": np.sin(2 * np.pi * day_of_year / 365.25), "doy_cos": np.cos(2 * np.pi * day_of_year / 365.25),
+        "weekday_sin": np.sin(2 * np.pi * weekday / 7), "weekday_cos": np.cos(2 * np.pi * weekday / 7),
+    }
+    return {name: values.astype(CALENDAR_COLUMNS[name]) for name, values in features.items()}
+
+
+def hourly_weather(weather_df, columns=WEATHER_COLUMNS):
+    """Weather frame indexed by hour (first report of every hour), numeric columns only."""
+    hours = pd.to_datetime(weather_df["DATE"]).dt.floor("h")
+    weather = weather_df.reindex(columns=columns).apply(pd.to_numeric, errors="coerce")
+    weather.index = hours.to_numpy()
+    return weather[~weather.index.duplicated(keep="first")].sort_index()
+
+
+class FeatureStore:
+    """Station/year partitioned store of typed, memory-mapped feature columns."""
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            if self.manifest.get("version") != STORE_VERSION:
+                raise ValueError(f"Unsupported feature store version in {root}: {self.manifest.get('version')}")
+        else:
+            self.manifest = {"version": STORE_VERSION, "columns": {}, "stations": {}}
+
+    @property
+    def columns(self):
+        return list(self.manifest["columns"])
+
+    @property
+    def stations(self):
+        return sorted(self.manifest["stations"])
+
+    def years(self, station):
+        return sorted(int(year) for year in self.manifest["stations"][station]["rows"])
+
+    def __len__(self):
+        return sum(sum(info["rows"].values()) for info in self.manifest["stations"].values())
+
+    def _partition_dir(self, station, year):
+        return os.path.join(self.root, station, str(year))
+
+    def _load_partition(self, station, year, columns):
+        directory = self._partition_dir(station, year)
+        return {col: np.load(os.path.join(directory, col + ".npy"), mmap_mode="r") for col in columns}
+
+    def _write_partition(self, station, year, arrays):
+        # Written next to the partition and swapped in, so readers never see a partial partition
+        directory = self._partition_dir(station, year)
+        tmp, old = directory + ".tmp", directory + ".old"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for col, values in arrays.items():
+            np.save(os.path.join(tmp, col + ".npy"), values)
+        if os.path.exists(directory):
+            os.replace(directory, old)
+        os.replace(tmp, directory)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def _save_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def _last_values(self, station, n):
+        """Last n stored pm10 values of a station, oldest first (NaN-padded)."""
+        values = []
+        for year in reversed(self.years(station)):
+            values = list(self._load_partition(station, year, ["pm10"])["pm10"][-n:]) + values
+            if len(values) >= n:
+                break
+        return np.array([np.nan] * (n - len(values)) + values[-n:], dtype=np.float64)
+
+    def append(self, pm10_wide, weather_df=None):
+        """
+        Adds the hours of a wide PM10 frame (DateTime + one column per station)
+        newer than each station's last stored hour; older hours are skipped.
+        Missing hours in between are stored as NaN, so lags always refer to
+        the previous hours. weather_df (DATE + weather columns) is joined on the
+        hour. Returns the number of hours written.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        pm10_wide = pm10_wide.dropna(subset=["DateTime"])
+        # Source timestamps are truncated floats (e.g. 07:59:59 for 08:00): snap to the nearest hour
+        timestamps = pd.to_datetime(pm10_wide["DateTime"]).dt.round("h").to_numpy()
+        weather = hourly_weather(weather_df) if weather_df is not None else None
+
+        written = 0
+        for station in [col for col in pm10_wide.columns if col != "DateTime"]:
+            pm10 = pd.Series(pd.to_numeric(pm10_wide[station], errors="coerce").to_numpy(), index=timestamps)
+            pm10 = pm10[~pm10.index.duplicated(keep="first")].sort_index()
+
+            info = self.manifest["stations"].get(station)
+            if info is not None:
+                last = np.datetime64(info["last"])
+                pm10 = pm10[pm10.index > last]
+                start = last + np.timedelta64(1, "h")
+            elif len(pm10):
+                start = pm10.index[0]
+            if pm10.empty:
+                continue
+            hours = pd.date_range(start, pm10.index[-1], freq="h")
+            values = pm10.reindex(hours).to_numpy(dtype=np.float64)
+
+            # Lags over the previous stored hours and the new ones
+            previous = self._last_values(station, max(LAGS)) if info is not None else np.full(max(LAGS), np.nan)
+            extended = np.concatenate([previous, values])
+            columns = {"DATE": hours.to_numpy(dtype="datetime64[s]")}
+            columns.update(calendar_features(hours))
+            columns["pm10"] = values
+            for lag in LAGS:
+                columns[f"pm10_lag_{lag}"] = extended[max(LAGS) - lag:len(extended) - lag]
+            for col in WEATHER_COLUMNS:
+                columns[col] = (weather[col].reindex(hours).to_numpy(dtype=np.float64) if weather is not None
+                                else np.full(len(hours), np.nan))
+
+            self._append_station(station, columns)
+            written += len(hours)
+
+        self._save_manifest()
+        return written
+
+    def _append_station(self, station, columns):
+        if not self.manifest["columns"]:
+            self.manifest["columns"] = {col: np.asarray(values).dtype.str for col, values in columns.items()}
+        info = self.manifest["stations"].setdefault(station, {"rows": {}, "last": None})
+        years = columns["year"]
+        for year in np.unique(years):
+            rows = years == year
+            new = {col: np.asarray(values)[rows].astype(np.dtype(self.manifest["columns"][col]))
+                   for col, values in columns.items()}
+            if str(year) in info["rows"]:
+                old = self._load_partition(station, year, self.columns)
+                new = {col: np.concatenate([old[col], new[col]]) for col in self.columns}
+            self._write_partition(station, year, new)
+            info["rows"][str(year)] = len(new["DATE"])
+        info["last"] = str(columns["DATE"][-1])
+
+    def read(self, stations=None, years=None, columns=None, dropna=True):
+        """
+        Feature frame of the selected partitions, in the column order of the
+        training notebooks (station_code after the calendar features). With
+        dropna, hours without a PM10 value are left out, as in training.
+        """
+        columns = list(columns or self.columns)
+        load = list(dict.fromkeys(columns + (["pm10"] if dropna else [])))
+        load = [col for col in load if col != "station_code"]
+        parts = []
+        for station in stations or self.stations:
+            for year in self.years(station):
+                if years is not None and year not in years:
+                    continue
+                arrays = self._load_partition(station, year, load)
+                keep = ~np.isnan(arrays["pm10"]) if dropna else slice(None)
+                part = pd.DataFrame({col: np.asarray(arrays[col][keep]) for col in load})
+                part.insert(0, "station_code", station)
+                parts.append(part)
+
+        if not parts:
+            return pd.DataFrame(columns=self._ordered(columns))
+        frame = pd.concat(parts, ignore_index=True)
+        return frame[self._ordered(columns)]
+
+    def _ordered(self, columns):
+        order = ["DATE"] + list(CALENDAR_COLUMNS) + ["station_code"] + list(PM10_COLUMNS)
+        columns = list(columns) if "station_code" in columns else list(columns) + ["station_code"]
+        return sorted(columns, key=lambda col: order.index(col) if col in order else len(order))
+
+    def training_frame(self, stations=None, years=None):
+        """Features + target as used by notebooks/07_tree_based_modelling.ipynb (no DATE column)."""
+        return self.read(stations, years, [col for col in self.columns if col != "DATE"])
+
+
+def ingest(store_root, pm10_paths, weather_path=None):
+    """Converts PM10 sources (and an hourly weather CSV) into the feature store; returns the store."""
+    store = FeatureStore(store_root)
+    weather = pd.read_csv(weather_path) if weather_path else None
+    written = store.append(read_pm10_sources(pm10_paths), weather)
+    print(f"Wrote {written} station-hours to {store_root}")
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PM10 training feature store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = subparsers.add_parser("ingest", help="Convert PM10 XLSX/CSV files (and weather) into the store")
+    ingest_parser.add_argument("--store", required=True, help="Feature store directory")
+    ingest_parser.add_argument("--weather", default=None, help="Hourly weather CSV (DATE + weather columns)")
+    ingest_parser.add_argument("pm10_paths", nargs="+", help="Per-year PM10 XLSX files or the wide PM10 CSV")
+    info_parser = subparsers.add_parser("info", help="Show the partitions of a store")
+    info_parser.add_argument("--store", required=True, help="Feature store directory")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        ingest(args.store, args.pm10_paths, args.weather)
+    elif args.command == "info":
+        store = FeatureStore(args.store)
+        print(f"{len(store)} station-hours, {len(store.columns)} columns")
+        for station in store.stations:
+            info = store.manifest["stations"][station]
+            print(f"{station}: years {', '.join(map(str, store.years(station)))}, last hour {info['last']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Forecast memoization keyed on the inputs a forecast depends on.
+
+Upstream schedulers resubmit cases whose history, weather and start time have
+not changed. A case's forecast only depends on
+
+    the model (model_registry.model_fingerprint: SHA-256 of its file),
+    the horizon, the station code, the start time,
+    the two PM10 lags (as the float32 values the model sees),
+    the weather records (their weather_cache.weather_key),
+    the neighbor features, if the model uses them,
+
+so forecast_states looks every case up under the SHA-256 of these before
+forecasting, and only forecasts (and preprocesses the weather of) the misses.
+Forecasts are kept
+- in memory, in an LRU bounded by memory_mb (approximate sizes)
+- optionally in a SQLite database (path), shared across runs and processes
+
+Models without a fingerprint (not loaded by model_registry) are never cached.
+The process-wide cache is configured with configure() (main.py
+--forecast-cache-mb / --forecast-cache-path).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+import instrumentation
+from bounded_cache import BoundedLRU, ProcessDefault
+
+CACHE_VERSION = 1  # bump when the forecasting code changes its results
+DEFAULT_FORECAST_CACHE_MB = 16
+_ROW_BYTES = 250  # approximate memory of one {"timestamp", "pm10_pred"} row
+_SQL_BATCH = 500  # keys per SELECT
+
+
+def forecast_key(state, fingerprint, horizon):
+    """SHA-256 of everything the forecast of a state (see prediction.case_state) depends on."""
+    payload = json.dumps([CACHE_VERSION, fingerprint, horizon, state["station_code"],
+                          state["start_time"].isoformat(), float(state["pm10_lag_1"]), float(state["pm10_lag_2"]),
+                          getattr(state["weather"], "key", None),
+                          sorted((name, float(value)) for name, value in state["neighbors"].items())],
+                         separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _copy(forecast):
+    return None if forecast is None else [dict(row) for row in forecast]
+
+
+class ForecastCache:
+    """
+    Forecast per key, in an LRU of at most memory_mb (0: no memory cache) and,
+    with path, in a SQLite table. Thread-safe; worker processes open their
+    own connection. Forecasts are copied in and out, so callers may modify
+    the rows they put or get.
+    """
+
+    def __init__(self, memory_mb=DEFAULT_FORECAST_CACHE_MB, path=None):
+        self.path = path
+        self._forecasts = BoundedLRU(memory_mb)
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        self._write_failed = False
+        self.hits = self.disk_hits = self.misses = 0
+
+    def settings(self):
+        """Arguments that recreate this cache (see bounded_cache.ProcessDefault)."""
+        return {"memory_mb": self._forecasts.budget / (1024 * 1024), "path": self.path}
+
+    @property
+    def enabled(self):
+        return self._forecasts.budget > 0 or self.path is not None
+
+    def get_many(self, keys):
+        """The cached forecast of every key, None for the misses."""
+        results = [_copy(self._forecasts.get(key)) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        with self._lock:
+            self.hits += len(keys) - len(missing)
+
+        if missing and self.path:
+            found = self._read([keys[i] for i in missing])
+            for i in missing:
+                forecast = found.get(keys[i])
+                if forecast is not None:
+                    results[i] = forecast
+                    self._remember(keys[i], _copy(forecast))
+            with self._lock:
+                self.disk_hits += len(found)
+            instrumentation.count("forecast_cache_disk_hits", len(found))
+
+        n_misses = sum(result is None for result in results)
+        with self._lock:
+            self.misses += n_misses
+        instrumentation.count("forecast_cache_hits", len(keys) - len(missing))
+        instrumentation.count("forecast_cache_misses", n_misses)
+        return results
+
+    def put_many(self, forecasts):
+        """Caches a {key: forecast} dict."""
+        for key, forecast in forecasts.items():
+            self._remember(key, _copy(forecast))
+        if self.path and forecasts:
+            self._write(forecasts)
+
+    def _remember(self, key, forecast):
+        self._forecasts.put(key, forecast, _ROW_BYTES * len(forecast))
+
+    def _db(self):
+        # SQLite connections must not cross fork(), so every process opens its own
+        if self._connection is None or self._connection_pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS forecasts (key TEXT PRIMARY KEY, forecast TEXT NOT NULL)")
+            connection.commit()
+            self._connection, self._connection_pid = connection, os.getpid()
+        return self._connection
+
+    def _read(self, keys):
+        found = {}
+        try:
+            with self._lock:
+                db = self._db()
+                for start in range(0, len(keys), _SQL_BATCH):
+                    batch = keys[start:start + _SQL_BATCH]
+                    rows = db.execute(f"SELECT key, forecast FROM forecasts WHERE key IN ({','.join('?' * len(batch))})",
+                                      batch)
+                    found.update((key, json.loads(forecast)) for key, forecast in rows)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"Warning: Could not read forecast cache {self.path}: {e}")
+        return found
+
+    def _write(self, forecasts):
+        try:
+            with self._lock:
+                db = self._db()
+                with db:  # one transaction
+                    db.executemany("INSERT OR REPLACE INTO forecasts (key, forecast) VALUES (?, ?)",
+                                   [(key, json.dumps(forecast)) for key, forecast in forecasts.items()])
+        except (sqlite3.Error, OSError) as e:
+            if not self._write_failed:
+                self._write_failed = True
+                print(f"Warning: Could not write forecast cache {self.path}: {e}")
+
+    def clear(self):
+        """Forgets the in-memory entries (the database is kept)."""
+        self._forecasts.clear()
+
+    def stats(self):
+        """Cache counters: cached forecasts, their approximate bytes, hits, disk hits, misses and evictions."""
+        with self._lock:
+            return {**self._forecasts.stats(), "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses}
+
+
+_default = ProcessDefault(ForecastCache)
+# configure(memory_mb, path), settings() and default_cache(): the cache used by prediction.forecast_states
+configure, settings, default_cache = _default.configure, _default.settings, _default.default_cache
@@ -0,0 +1,68 @@
+"""
+Compact PM10 history of a station.
+
+A case's history is a list of {"timestamp", "pm10"} records. Forecasting only
+needs the last two values as lags, so init_case_state converts just the tail
+(History.from_records(records, last=2)) into a float32 array (the precision
+CatBoost uses for features), and its cost does not grow with the length of
+the history. The timestamps of the converted records are still parsed
+(parse_timestamp), so a malformed record fails its case.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+
+def parse_timestamp(timestamp):
+    """
+    Epoch seconds of an ISO-8601 timestamp (UTC for timestamps with an offset,
+    wall time for naive ones). Raises ValueError if it cannot be parsed.
+    """
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        ts = pd.Timestamp(timestamp)
+        if ts is pd.NaT:
+            raise ValueError(f"Invalid timestamp: {timestamp!r}")
+        return (ts.tz_convert("UTC").tz_localize(None) if ts.tzinfo else ts).value // 10 ** 9
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return (parsed - _EPOCH) // _SECOND
+
+
+class History:
+    """PM10 history of a station as float32 values, in record order."""
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float32)
+
+    @classmethod
+    def from_records(cls, records, last=None):
+        """
+        History of {"timestamp", "pm10"} records, only the last `last` of them
+        if given. Raises IndexError if a record lacks a field and ValueError
+        if a timestamp cannot be parsed.
+        """
+        if last is not None:
+            records = records[-last:] if last > 0 else []
+        try:
+            timestamps = [record["timestamp"] for record in records]
+            values = [np.nan if record["pm10"] is None else record["pm10"] for record in records]
+        except (KeyError, TypeError):
+            raise IndexError("History is missing or invalid")
+        for timestamp in timestamps:
+            parse_timestamp(timestamp)
+        return cls(values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def lags(self, n=2):
+        """The last n PM10 values, most recent first."""
+        return self.values[::-1][:n]
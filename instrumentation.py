@@ -0,0 +1,201 @@
+"""
+Timers and counters of the forecast pipeline.
+
+Stages are timed with `with timer("stage"):` and events counted with
+count("name", n). Both do nothing unless instrumentation is enabled
+(enable(), or --metrics-file in main.py): a disabled timer() returns a shared
+no-op context manager, so instrumented code costs about a function call.
+
+Durations are aggregated per stage in a Histogram with logarithmic buckets
+(10 per decade, 1 µs to 1000 s). report() returns all timers and counters as
+a dict, dump(path) writes it as JSON. Worker processes send their metrics to
+the parent with drain() and merge().
+"""
+
+import bisect
+import contextlib
+import json
+import math
+import threading
+import time
+
+# Upper bounds of the histogram buckets in seconds: 10 per decade from 1 µs to 1000 s
+BUCKET_BOUNDS = [10 ** (exponent / 10) for exponent in range(-60, 31)]
+
+_enabled = False
+_lock = threading.Lock()
+_timers = {}    # stage -> Histogram
+_counters = {}  # name -> int
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class Histogram:
+    """Count, total, min, max and bucket counts of durations in seconds."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)  # the last bucket is > 1000 s
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (at most max)."""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max, self.max)
+        return self.max
+
+    def to_dict(self):
+        ms = 1000
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_ms": self.total / self.count * ms if self.count else None,
+            "min_ms": self.min * ms if self.count else None,
+            "max_ms": self.max * ms,
+            "p50_ms": _scaled(self.percentile(50), ms),
+            "p90_ms": _scaled(self.percentile(90), ms),
+            "p99_ms": _scaled(self.percentile(99), ms),
+            # Non-empty buckets by upper bound in ms
+            "buckets_ms": {(f"{BUCKET_BOUNDS[i] * ms:.4g}" if i < len(BUCKET_BOUNDS) else "inf"): n
+                           for i, n in enumerate(self.buckets) if n},
+        }
+
+
+def _scaled(value, factor):
+    return None if value is None else value * factor
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def enable(on=True):
+    """Turns instrumentation on (or off)."""
+    global _enabled
+    _enabled = on
+
+
+def enabled():
+    return _enabled
+
+
+def timer(name):
+    """Context manager adding the duration of its block to the stage's histogram."""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def record(name, seconds):
+    """Adds a duration to the stage's histogram."""
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _timers.get(name)
+        if histogram is None:
+            histogram = _timers[name] = Histogram()
+        histogram.add(seconds)
+
+
+def count(name, n=1):
+    """Adds n to a counter."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def timed_iter(iterable, name):
+    """Yields the items of iterable, timing the production of every item as stage `name`."""
+    if not _enabled:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        record(name, time.perf_counter() - start)
+        yield item
+
+
+def reset():
+    """Forgets all timers and counters."""
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def drain():
+    """Raw timers and counters collected so far (None if disabled), and resets them; see merge()."""
+    if not _enabled:
+        return None
+    with _lock:
+        collected = (dict(_timers), dict(_counters))
+        _timers.clear()
+        _counters.clear()
+    return collected
+
+
+def merge(collected):
+    """Adds the result of drain() (e.g. from a worker process) to this process's metrics."""
+    if not collected or not _enabled:
+        return
+    timers, counters = collected
+    with _lock:
+        for name, histogram in timers.items():
+            if name in _timers:
+                _timers[name].merge(histogram)
+            else:
+                _timers[name] = histogram
+        for name, n in counters.items():
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def report():
+    """All timers (as histogram summaries) and counters."""
+    with _lock:
+        return {
+            "timers": {name: histogram.to_dict() for name, histogram in sorted(_timers.items())},
+            "counters": dict(sorted(_counters.items())),
+        }
+
+
+def dump(path):
+    """Writes report() as JSON."""
+    with open(path, "w") as f:
+        json.dump(report(), f, indent=2)
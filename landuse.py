@@ -0,0 +1,526 @@
+"""
+Landuse geometry and spatial queries.
+
+The osmium pass resolves every landuse area (closed ways and multipolygon
+relations) to its rings and keeps them in flat numpy arrays instead of one
+Python dict per OSM object:
+
+    vertices        (n_vertices, 2) float32  lon/lat of all ring vertices, ring after ring
+    ring_offsets    (n_rings + 1,)  int64    start of each ring in vertices
+    polygon_rings   (n_polygons + 1,) int64  start of each polygon's rings in ring_offsets
+    polygon_class   (n_polygons,)   int32    index into classes (the 'landuse' tag value)
+
+A uniform lon/lat grid maps every cell to the polygons whose bounding box
+overlaps it, so a query only tests the few polygons near its location.
+
+LanduseIndex.load() caches these arrays as .npy files, keyed by the SHA-256
+of the PBF content and the extraction settings, and memory-maps them on later
+runs instead of re-reading the PBF. The cache lives in $PM10_CACHE_DIR/landuse
+(default: ~/.cache/pm10/landuse).
+
+For targets inside a fixed bounding box, LanduseRaster is built once offline:
+a (rows, columns, classes) float32 array of landuse class shares per grid
+cell (optionally averaged over a radius around each cell), saved as .npy and
+memory-mapped at forecast time, so a batch of coordinates is looked up by
+array indexing instead of geometry work.
+
+Usage:
+    python landuse.py query landuse.pbf --lat 50.06 --lon 19.94 [--radius 1000] [--cache-dir DIR]
+    python landuse.py raster landuse.pbf --output landuse_raster.npy [--bbox 19.79 49.97 20.22 50.13]
+                             [--resolution 100] [--radius 1000]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from array import array
+
+import numpy as np
+import osmium
+
+EARTH_METERS_PER_DEGREE = 111320.0
+DEFAULT_CELL_SIZE = 0.01     # grid cell size in degrees (~1.1 km in latitude)
+LARGE_POLYGON_CELLS = 256    # polygons covering more cells are tested by bounding box only
+DEFAULT_SAMPLES = 32         # sample grid per axis used to estimate area fractions
+POLYGON_BLOCK = 1024         # candidate polygons tested against the sample grid at a time
+
+_CELL_OFFSET = 1 << 20       # keeps cell coordinates positive when packed into one key
+
+KRAKOW_BBOX = (19.79, 49.97, 20.22, 50.13)  # min_lon, min_lat, max_lon, max_lat
+RASTER_SUPERSAMPLE = 4       # sample points per raster cell and axis
+
+CACHE_VERSION = 1            # bump when the extraction or the cached array layout changes
+HASH_CHUNK_SIZE = 1 << 24    # bytes read at a time when hashing a PBF file
+_CACHED_ARRAYS = ("vertices", "ring_offsets", "polygon_rings", "polygon_class",
+                  "bbox", "_large", "_cell_keys", "_cell_start", "_cell_polygons")
+
+
+class LanduseHandler(osmium.SimpleHandler):
+    """
+    Osmium handler that collects the geometry of every area with a 'landuse' tag.
+    Implementing area() makes osmium assemble closed ways and multipolygon
+    relations into rings with resolved node locations.
+    """
+    def __init__(self):
+        super().__init__()
+        self.classes = {}
+        self.vertices = array("f")
+        self.ring_offsets = array("q", [0])
+        self.polygon_rings = array("q", [0])
+        self.polygon_class = array("i")
+        self.n_ways = 0
+        self.n_relations = 0
+
+    def area(self, a):
+        landuse = a.tags.get("landuse")
+        if landuse is None:
+            return
+        # Copy the rings first, so an area with unresolved nodes is skipped as a whole
+        try:
+            rings = []
+            for outer in a.outer_rings():
+                rings.append([(node.lon, node.lat) for node in outer])
+                for inner in a.inner_rings(outer):
+                    rings.append([(node.lon, node.lat) for node in inner])
+        except osmium.InvalidLocationError:
+            return
+        if not rings:
+            return
+
+        for ring in rings:
+            for lon, lat in ring:
+                self.vertices.append(lon)
+                self.vertices.append(lat)
+            self.ring_offsets.append(self.ring_offsets[-1] + len(ring))
+        self.polygon_rings.append(len(self.ring_offsets) - 1)
+        self.polygon_class.append(self.classes.setdefault(landuse, len(self.classes)))
+        if a.from_way():
+            self.n_ways += 1
+        else:
+            self.n_relations += 1
+
+
+class LanduseIndex:
+    """
+    Columnar landuse polygons with a grid index for "landuse class fractions
+    within radius r of (lat, lon)" queries.
+    """
+    def __init__(self, classes, vertices, ring_offsets, polygon_rings, polygon_class,
+                 cell_size=DEFAULT_CELL_SIZE, n_ways=0, n_relations=0):
+        self.classes = list(classes)
+        self.vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 2)
+        self.ring_offsets = np.asarray(ring_offsets, dtype=np.int64)
+        self.polygon_rings = np.asarray(polygon_rings, dtype=np.int64)
+        self.polygon_class = np.asarray(polygon_class, dtype=np.int32)
+        self.cell_size = cell_size
+        self.n_ways = n_ways
+        self.n_relations = n_relations
+        self._build_index()
+
+    @classmethod
+    def from_file(cls, pbf_path, cell_size=DEFAULT_CELL_SIZE):
+        """Reads all landuse areas of an OSM file (.pbf, .osm, ...)."""
+        handler = LanduseHandler()
+        handler.apply_file(pbf_path)
+        classes = sorted(handler.classes, key=handler.classes.get)
+        return cls(classes, np.frombuffer(handler.vertices, dtype=np.float32),
+                   np.frombuffer(handler.ring_offsets, dtype=np.int64),
+                   np.frombuffer(handler.polygon_rings, dtype=np.int64),
+                   np.frombuffer(handler.polygon_class, dtype=np.int32),
+                   cell_size, handler.n_ways, handler.n_relations)
+
+    @classmethod
+    def load(cls, pbf_path, cache_dir=None, cell_size=DEFAULT_CELL_SIZE):
+        """
+        Landuse index of a PBF file, memory-mapped from the cache if this file
+        content was parsed before with the same settings, else parsed and cached.
+        """
+        cache_dir = cache_dir or default_cache_dir()
+        directory = os.path.join(cache_dir, cache_key(file_hash(pbf_path, cache_dir), cell_size))
+        if os.path.exists(os.path.join(directory, "meta.json")):
+            return cls.open(directory)
+
+        index = cls.from_file(pbf_path, cell_size)
+        try:
+            index.save(directory)
+        except OSError as e:
+            print(f"Warning: Could not write landuse cache {directory}: {e}")
+        return index
+
+    def save(self, directory):
+        """Writes the geometry and index arrays as .npy files (plus meta.json) to directory."""
+        # Written next to the target and renamed, so readers never see a partial cache
+        tmp = f"{directory}.tmp{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        for name in _CACHED_ARRAYS:
+            np.save(os.path.join(tmp, name.lstrip("_") + ".npy"), getattr(self, name))
+        meta = {"version": CACHE_VERSION, "classes": self.classes, "cell_size": self.cell_size,
+                "n_ways": self.n_ways, "n_relations": self.n_relations}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        try:
+            os.replace(tmp, directory)
+        except OSError:
+            # Another process wrote the same cache first
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(os.path.join(directory, "meta.json")):
+                raise
+
+    @classmethod
+    def open(cls, directory):
+        """Memory-maps an index written by save()."""
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        index = cls.__new__(cls)
+        index.classes = meta["classes"]
+        index.cell_size = meta["cell_size"]
+        index.n_ways = meta["n_ways"]
+        index.n_relations = meta["n_relations"]
+        for name in _CACHED_ARRAYS:
+            setattr(index, name, np.load(os.path.join(directory, name.lstrip("_") + ".npy"), mmap_mode="r"))
+        return index
+
+    def __len__(self):
+        return len(self.polygon_class)
+
+    @property
+    def nbytes(self):
+        """Memory used by the geometry and index arrays."""
+        arrays = (self.vertices, self.ring_offsets, self.polygon_rings, self.polygon_class,
+                  self.bbox, self._cell_keys, self._cell_start, self._cell_polygons, self._large)
+        return sum(a.nbytes for a in arrays)
+
+    def _build_index(self):
+        n_polygons = len(self.polygon_class)
+        # Bounding box of every polygon: (min_lon, min_lat, max_lon, max_lat)
+        self.bbox = np.zeros((n_polygons, 4), dtype=np.float32)
+        if n_polygons:
+            first_vertex = self.ring_offsets[self.polygon_rings[:-1]]
+            self.bbox[:, :2] = np.minimum.reduceat(self.vertices, first_vertex)
+            self.bbox[:, 2:] = np.maximum.reduceat(self.vertices, first_vertex)
+
+        x0, y0 = self._cell(self.bbox[:, 0]), self._cell(self.bbox[:, 1])
+        x1, y1 = self._cell(self.bbox[:, 2]), self._cell(self.bbox[:, 3])
+        width, height = x1 - x0 + 1, y1 - y0 + 1
+        n_cells = width * height
+        large = n_cells > LARGE_POLYGON_CELLS
+        self._large = np.flatnonzero(large)
+
+        # One (cell, polygon) pair for every cell a small polygon's bounding box covers
+        small = np.flatnonzero(~large)
+        counts = n_cells[small]
+        polygons = np.repeat(small, counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = x0[polygons] + within % width[polygons]
+        cy = y0[polygons] + within // width[polygons]
+        keys = self._key(cx, cy)
+        order = np.argsort(keys, kind="stable")
+        self._cell_polygons = polygons[order].astype(np.int32)
+        self._cell_keys, self._cell_start = np.unique(keys[order], return_index=True)
+        self._cell_start = np.append(self._cell_start, len(order)).astype(np.int64)
+
+    def _cell(self, degrees):
+        return np.floor(np.asarray(degrees, dtype=np.float64) / self.cell_size).astype(np.int64)
+
+    @staticmethod
+    def _key(cx, cy):
+        return (cx + _CELL_OFFSET) * (2 * _CELL_OFFSET) + (cy + _CELL_OFFSET)
+
+    def candidates(self, min_lon, min_lat, max_lon, max_lat):
+        """Polygons whose bounding box intersects the given box."""
+        cx = np.arange(self._cell(min_lon), self._cell(max_lon) + 1)
+        cy = np.arange(self._cell(min_lat), self._cell(max_lat) + 1)
+        keys = self._key(np.repeat(cx, len(cy)), np.tile(cy, len(cx)))
+        pos = np.searchsorted(self._cell_keys, keys)
+        found = [self._cell_polygons[self._cell_start[p]:self._cell_start[p + 1]]
+                 for p, key in zip(pos, keys) if p < len(self._cell_keys) and self._cell_keys[p] == key]
+        polygons = np.unique(np.concatenate(found + [self._large]).astype(np.int64))
+        box = self.bbox[polygons]
+        hit = (box[:, 0] <= max_lon) & (box[:, 2] >= min_lon) & (box[:, 1] <= max_lat) & (box[:, 3] >= min_lat)
+        return polygons[hit]
+
+    def fractions_array(self, lat, lon, radius_m=1000.0, samples=DEFAULT_SAMPLES):
+        """
+        Share of the disk of radius_m around (lat, lon) covered by each class,
+        as an array aligned with self.classes. Estimated on a samples x samples
+        point grid; overlapping polygons of different classes are each counted.
+        """
+        result = np.zeros(len(self.classes))
+        dlat = radius_m / EARTH_METERS_PER_DEGREE
+        dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+        polygons = self.candidates(lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+        if len(polygons) == 0:
+            return result
+
+        # Sample points on a samples x samples grid over the disk's bounding box;
+        # rows share a latitude, columns a longitude
+        u = (np.arange(samples) + 0.5) / samples * 2 - 1
+        in_disk = u[:, None] ** 2 + u[None, :] ** 2 <= 1
+        ys, xs = lat + u * dlat, lon + u * dlon
+
+        covered = np.zeros((samples, samples, len(self.classes)), dtype=bool)
+        for lo in range(0, len(polygons), POLYGON_BLOCK):
+            block = polygons[lo:lo + POLYGON_BLOCK]
+            inside = self._inside_grid(block, ys, xs)
+            classes = self.polygon_class[block]
+            for c in np.unique(classes):
+                covered[:, :, c] |= inside[:, classes == c, :].any(axis=1)
+        result[:] = covered[in_disk].mean(axis=0)
+        return result
+
+    def _inside_grid(self, polygons, ys, xs):
+        """
+        (rows, polygons, columns) even-odd point-in-polygon test of the sample grid
+        with (sorted) latitudes ys and longitudes xs.
+        Scanline: every edge is intersected with the rows it straddles, and each
+        crossing flips the parity of all points to its left. A polygon's holes are
+        just more rings of it.
+        """
+        ring_start, ring_end = self.polygon_rings[polygons], self.polygon_rings[polygons + 1]
+        rings = _ranges(ring_start, ring_end)
+        edges_per_ring = self.ring_offsets[rings + 1] - self.ring_offsets[rings] - 1
+        first = _ranges(self.ring_offsets[rings], self.ring_offsets[rings] + edges_per_ring)
+        ring_polygon = np.repeat(np.arange(len(polygons)), ring_end - ring_start)
+        edge_polygon = np.repeat(ring_polygon, edges_per_ring)
+
+        x1, y1 = self.vertices[first].astype(np.float64).T
+        x2, y2 = self.vertices[first + 1].astype(np.float64).T
+
+        # Rows with y1 <= y < y2 or y2 <= y < y1
+        row_lo = np.searchsorted(ys, np.minimum(y1, y2), side="left")
+        row_hi = np.searchsorted(ys, np.maximum(y1, y2), side="left")
+        edges = np.repeat(np.arange(len(first)), row_hi - row_lo)
+        rows = _ranges(row_lo, row_hi)
+        x_cross = x1[edges] + (ys[rows] - y1[edges]) * (x2[edges] - x1[edges]) / (y2[edges] - y1[edges])
+        # Points with x < x_cross are flipped: columns [0, col)
+        col = np.searchsorted(xs, x_cross, side="left")
+
+        shape = (len(ys), len(polygons), len(xs) + 1)
+        flat = np.ravel_multi_index((rows, edge_polygon[edges], col), shape)
+        toggles = np.bincount(flat, minlength=np.prod(shape)).reshape(shape)
+        flips = np.cumsum(toggles[:, :, ::-1], axis=2)[:, :, ::-1]
+        return flips[:, :, 1:] % 2 == 1
+
+    def fractions(self, lat, lon, radius_m=1000.0, samples=DEFAULT_SAMPLES):
+        """{class: covered share} for the disk of radius_m around (lat, lon); absent classes are omitted."""
+        shares = self.fractions_array(lat, lon, radius_m, samples)
+        return {self.classes[c]: float(shares[c]) for c in np.flatnonzero(shares)}
+
+    def fractions_many(self, points, radius_m=1000.0, samples=DEFAULT_SAMPLES):
+        """(len(points), len(classes)) array of class shares for (lat, lon) points."""
+        result = np.zeros((len(points), len(self.classes)))
+        for i, (lat, lon) in enumerate(points):
+            result[i] = self.fractions_array(lat, lon, radius_m, samples)
+        return result
+
+
+class LanduseRaster:
+    """
+    Landuse class shares on a fixed-resolution grid over a bounding box.
+    Cell (0, 0) is the south-west corner; cells are resolution_m square.
+    With radius_m, every cell holds the shares within radius_m of its center
+    instead of the shares of the cell itself.
+    """
+    def __init__(self, shares, classes, bbox, resolution_m, radius_m=None):
+        self.shares = shares
+        self.classes = list(classes)
+        self.bbox = tuple(bbox)
+        self.resolution_m = resolution_m
+        self.radius_m = radius_m
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        self.dlat = resolution_m / EARTH_METERS_PER_DEGREE
+        self.dlon = self.dlat / np.cos(np.radians((min_lat + max_lat) / 2))
+
+    @staticmethod
+    def grid_shape(bbox, resolution_m):
+        """(rows, columns) of a raster over bbox at resolution_m."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        dlat = resolution_m / EARTH_METERS_PER_DEGREE
+        dlon = dlat / np.cos(np.radians((min_lat + max_lat) / 2))
+        return int(np.ceil((max_lat - min_lat) / dlat)), int(np.ceil((max_lon - min_lon) / dlon))
+
+    @classmethod
+    def build(cls, index, bbox=KRAKOW_BBOX, resolution_m=100.0, radius_m=None,
+              supersample=RASTER_SUPERSAMPLE):
+        """Rasterizes the polygons of a LanduseIndex onto supersample x supersample points per cell."""
+        raster = cls(None, index.classes, bbox, resolution_m, radius_m)
+        height, width = cls.grid_shape(bbox, resolution_m)
+        min_lon, min_lat = bbox[0], bbox[1]
+        ys = min_lat + (np.arange(height * supersample) + 0.5) * raster.dlat / supersample
+        xs = min_lon + (np.arange(width * supersample) + 0.5) * raster.dlon / supersample
+
+        covered = np.zeros((len(ys), len(xs), len(index.classes)), dtype=bool)
+        for polygon in index.candidates(xs[0], ys[0], xs[-1], ys[-1]) if len(ys) and len(xs) else []:
+            box = index.bbox[polygon]
+            r0, r1 = np.searchsorted(ys, box[1]), np.searchsorted(ys, box[3], side="right")
+            c0, c1 = np.searchsorted(xs, box[0]), np.searchsorted(xs, box[2], side="right")
+            if r0 < r1 and c0 < c1:
+                inside = index._inside_grid(np.array([polygon]), ys[r0:r1], xs[c0:c1])[:, 0, :]
+                covered[r0:r1, c0:c1, index.polygon_class[polygon]] |= inside
+
+        shares = covered.reshape(height, supersample, width, supersample, -1).mean(axis=(1, 3))
+        if radius_m:
+            shares = _disk_mean(shares, radius_m / resolution_m)
+        raster.shares = shares.astype(np.float32)
+        return raster
+
+    def save(self, path):
+        """Writes the shares to path (.npy) and the grid description to path + '.json'."""
+        np.save(path, self.shares)
+        meta = {"classes": self.classes, "bbox": list(self.bbox),
+                "resolution_m": self.resolution_m, "radius_m": self.radius_m}
+        with open(path + ".json", "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def open(cls, path):
+        """Memory-maps a raster written by save()."""
+        with open(path + ".json") as f:
+            meta = json.load(f)
+        return cls(np.load(path, mmap_mode="r"), meta["classes"], meta["bbox"],
+                   meta["resolution_m"], meta["radius_m"])
+
+    def lookup(self, lats, lons):
+        """(n, classes) shares of the cells holding the given coordinates; NaN outside the raster."""
+        lats, lons = np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+        rows = np.floor((lats - self.bbox[1]) / self.dlat).astype(np.int64)
+        cols = np.floor((lons - self.bbox[0]) / self.dlon).astype(np.int64)
+        height, width = self.shares.shape[:2]
+        valid = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        result = np.full((len(lats), len(self.classes)), np.nan, dtype=np.float32)
+        result[valid] = self.shares[rows[valid], cols[valid]]
+        return result
+
+    def features(self, lat, lon):
+        """{class: share} of the cell holding (lat, lon); empty outside the raster."""
+        shares = self.lookup([lat], [lon])[0]
+        if np.isnan(shares).all():
+            return {}
+        return {name: float(share) for name, share in zip(self.classes, shares)}
+
+    def features_for_cases(self, cases):
+        """(len(cases), classes) shares at every case's target location."""
+        targets = [case["target"] for case in cases]
+        return self.lookup([t["latitude"] for t in targets], [t["longitude"] for t in targets])
+
+
+def _disk_mean(values, radius_cells):
+    """
+    Mean of values (rows, columns, channels) over a disk of radius_cells around
+    every cell, counting only cells inside the raster. Each disk row is a
+    horizontal run, summed from row-wise prefix sums.
+    """
+    height, width, channels = values.shape
+    k = int(radius_cells)
+    padded = np.zeros((height + 2 * k, width + 2 * k, channels + 1))
+    padded[k:k + height, k:k + width, :channels] = values
+    padded[k:k + height, k:k + width, channels] = 1.0  # cells inside the raster
+    prefix = np.concatenate([np.zeros((height + 2 * k, 1, channels + 1)), np.cumsum(padded, axis=1)], axis=1)
+
+    sums = np.zeros((height, width, channels + 1))
+    for dy in range(-k, k + 1):
+        half = int(np.floor(np.sqrt(max(radius_cells ** 2 - dy ** 2, 0))))
+        rows = prefix[k + dy:k + dy + height]
+        sums += rows[:, k + half + 1:k + half + 1 + width] - rows[:, k - half:k - half + width]
+    return sums[..., :channels] / sums[..., channels:]
+
+
+def default_cache_dir():
+    """$PM10_CACHE_DIR/landuse, or ~/.cache/pm10/landuse."""
+    root = os.environ.get("PM10_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "pm10")
+    return os.path.join(root, "landuse")
+
+
+def cache_key(pbf_hash, cell_size=DEFAULT_CELL_SIZE):
+    """Cache directory name for a PBF content hash and the extraction settings."""
+    settings = {"pbf": pbf_hash, "version": CACHE_VERSION, "cell_size": cell_size,
+                "large_polygon_cells": LARGE_POLYGON_CELLS}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def file_hash(path, cache_dir=None):
+    """
+    SHA-256 of a file's content. Hashing a regional PBF takes seconds, so the
+    digest is remembered in cache_dir/hashes.json per path, size and mtime.
+    """
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    hashes_path = os.path.join(cache_dir, "hashes.json") if cache_dir else None
+    hashes = {}
+    if hashes_path and os.path.exists(hashes_path):
+        try:
+            with open(hashes_path) as f:
+                hashes = json.load(f)
+        except ValueError:
+            hashes = {}
+    entry = hashes.get(os.path.abspath(path))
+    if entry and entry[:2] == signature:
+        return entry[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    digest = digest.hexdigest()
+
+    if hashes_path:
+        hashes[os.path.abspath(path)] = signature + [digest]
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{hashes_path}.tmp{os.getpid()}"
+            with open(tmp, "w") as f:
+                json.dump(hashes, f)
+            os.replace(tmp, hashes_path)
+        except OSError:
+            pass
+    return digest
+
+
+def _ranges(starts, ends):
+    """Concatenation of arange(start, end) for every pair."""
+    lengths = ends - starts
+    if lengths.sum() == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return np.arange(lengths.sum()) + offsets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Landuse queries and rasters.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    query = subparsers.add_parser("query", help="Landuse class shares around a location")
+    query.add_argument("pbf_path", help="Path to landuse.pbf")
+    query.add_argument("--lat", type=float, required=True, help="Latitude of the location")
+    query.add_argument("--lon", type=float, required=True, help="Longitude of the location")
+    query.add_argument("--radius", type=float, default=1000.0, help="Radius in meters (default: 1000)")
+    query.add_argument("--cache-dir", default=None, help="Landuse cache directory (default: ~/.cache/pm10/landuse)")
+
+    raster = subparsers.add_parser("raster", help="Build a landuse raster for a bounding box")
+    raster.add_argument("pbf_path", help="Path to landuse.pbf")
+    raster.add_argument("--output", required=True, help="Path to write the raster (.npy, plus a .npy.json)")
+    raster.add_argument("--bbox", type=float, nargs=4, default=KRAKOW_BBOX,
+                        metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"), help="Bounding box (default: Krakow)")
+    raster.add_argument("--resolution", type=float, default=100.0, help="Cell size in meters (default: 100)")
+    raster.add_argument("--radius", type=float, default=None,
+                        help="Store shares within this radius (meters) of each cell center instead of per cell")
+    raster.add_argument("--cache-dir", default=None, help="Landuse cache directory (default: ~/.cache/pm10/landuse)")
+    args = parser.parse_args()
+
+    index = LanduseIndex.load(args.pbf_path, args.cache_dir)
+    print(f"Landuse areas: {len(index)} ({index.n_ways} ways, {index.n_relations} relations), "
+          f"{index.nbytes / 1e6:.1f} MB")
+    if args.command == "query":
+        for name, share in sorted(index.fractions(args.lat, args.lon, args.radius).items(), key=lambda kv: -kv[1]):
+            print(f"{name}: {share:.3f}")
+    elif args.command == "raster":
+        result = LanduseRaster.build(index, args.bbox, args.resolution, args.radius)
+        result.save(args.output)
+        height, width, n_classes = result.shares.shape
+        print(f"Wrote {args.output}: {height} x {width} cells, {n_classes} classes")
+
+
+if __name__ == "__main__":
+    main()
@@ -37,49 +37,26 @@ Input JSON schema:
 
 Usage:
     python pm10_forecaster.py --data-file data.json [--landuse-pbf landuse.pbf] --output-file output.json
+    python pm10_forecaster.py serve [--port 8000]   # long-running server, see server.py
+    python pm10_forecaster.py live [--events events.jsonl] [--follow]   # hourly observation stream, see streaming.py
 """
 
 import argparse  # For parsing command-line arguments
 import json      # For reading and writing JSON files
+import math
 import random    # For generating random numbers (placeholder for real predictions)
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor  # For forecasting cases in parallel
 from datetime import datetime, timedelta  # For handling dates and times
-import osmium    # For reading OpenStreetMap .pbf files
-from prediction import forecast_with_lag, cat_model
-
-
-class LanduseHandler(osmium.SimpleHandler):
-    """
-    Osmium handler to collect landuse ways and relations from a .pbf file.
-    Each object with a 'landuse' tag is stored in a list.
-    """
-    def __init__(self):
-        super().__init__()
-        self.landuse_ways = []
-        self.landuse_relations = []
-
-    def way(self, w):
-        # Called for each way in the .pbf; store if it has a 'landuse' tag
-        if 'landuse' in w.tags:
-            self.landuse_ways.append({
-                "type": "way",
-                "id": w.id,
-                "landuse": w.tags['landuse'],
-                "tags": dict(w.tags),
-                # We only store node IDs (refs) here; lat/lon can be resolved later if needed
-                "node_refs": [node.ref for node in w.nodes]
-            })
-
-    def relation(self, r):
-        # Called for each relation in the .pbf; store if it has a 'landuse' tag
-        if 'landuse' in r.tags:
-            self.landuse_relations.append({
-                "type": "relation",
-                "id": r.id,
-                "landuse": r.tags['landuse'],
-                "tags": dict(r.tags),
-                # Store member references; for further spatial analysis if needed
-                "members": [(m.ref, m.role, m.type) for m in r.members]
-            })
+import forecast_cache
+import instrumentation
+import weather_cache
+from case_io import PredictionWriter, iter_cases
+from landuse import LanduseIndex
+from model_registry import DEFAULT_STATION_MEMORY_MB, load_models
+from prediction import forecast_batch
 
 
 def predict_pm10(base_time, history, landuse_data, hours=24):
@@ -109,107 +86,321 @@ def predict_pm10(base_time, history, landuse_data, hours=24):
     return forecast_list
 
 
-def generate_output(data, landuse_data=None, forecast_hours=24):
+def validate_case(case):
     """
-    Generates synthetic PM10 forecasts for each case’s target location.
-    - Uses 'prediction_start_time' from each case's target as the base timestamp.
-    - Raises an exception if 'prediction_start_time', 'longitude', or 'latitude' are missing/invalid.
-    - Optionally prints info about loaded landuse objects.
-    - Calls predict_pm10() to obtain the hourly forecast list.
+    Checks a case's target before forecasting and counts its stations (see instrumentation.py).
+    Raises ValueError if 'prediction_start_time', 'longitude', or 'latitude' are missing/invalid.
     """
-    predictions = []
+    case_id = case["case_id"]
+    target = case.get("target")
+    if not target or "prediction_start_time" not in target:
+        raise ValueError(f"Case '{case_id}' is missing 'prediction_start_time' in target.")
+
+    # Parse 'prediction_start_time' into a datetime object; raise on parse failure
+    try:
+        base_forecast_start = datetime.fromisoformat(target["prediction_start_time"])
+    except Exception as e:
+        raise ValueError(f"Invalid prediction_start_time for case '{case_id}': {e}")
+
+    # Ensure both longitude and latitude are present
+    longitude = target.get("longitude")
+    latitude = target.get("latitude")
+    if longitude is None or latitude is None:
+        raise ValueError(f"Case '{case_id}' target must include both 'longitude' and 'latitude'.")
 
-    if landuse_data:
-        total = len(landuse_data["ways"]) + len(landuse_data["relations"])
-        print(f"[INFO] Landuse objects loaded: {total}")
+    stations = case.get("stations", [])
+    instrumentation.count("stations", len(stations))
 
-    for case in data["cases"]:
-        case_id = case["case_id"]
-        target = case.get("target")
-        if not target or "prediction_start_time" not in target:
-            raise ValueError(f"Case '{case_id}' is missing 'prediction_start_time' in target.")
 
-        # Parse 'prediction_start_time' into a datetime object; raise on parse failure
+# Model of a worker process, loaded once by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_path, stations_dir=None, station_memory_mb=DEFAULT_STATION_MEMORY_MB, metrics=False,
+                 weather_cache_settings=None, forecast_cache_settings=None):
+    """Process pool initializer: loads the model (or the station model registry) once per worker."""
+    global _worker_model
+    instrumentation.enable(metrics)
+    instrumentation.reset()  # forked workers inherit the parent's metrics
+    if weather_cache_settings:
+        weather_cache.configure(**weather_cache_settings)
+    if forecast_cache_settings:
+        forecast_cache.configure(**forecast_cache_settings)
+    _worker_model = load_models(model_path, stations_dir, station_memory_mb)
+
+
+def _error_result(case, error):
+    return {"case_id": case.get("case_id"), "error": f"{type(error).__name__}: {error}"}
+
+
+def forecast_isolated(cases, model, forecast_hours):
+    """
+    Validates and forecasts cases as one batch. If the batch fails, the cases
+    are retried one by one so that a failing case is returned as an error
+    entry ({"case_id", "error"}) instead of failing all the cases.
+    """
+    results = [None] * len(cases)
+    valid = []
+    for i, case in enumerate(cases):
         try:
-            base_forecast_start = datetime.fromisoformat(target["prediction_start_time"])
+            validate_case(case)
+            valid.append(i)
         except Exception as e:
-            raise ValueError(f"Invalid prediction_start_time for case '{case_id}': {e}")
-
-        # Ensure both longitude and latitude are present
-        longitude = target.get("longitude")
-        latitude = target.get("latitude")
-        if longitude is None or latitude is None:
-            raise ValueError(f"Case '{case_id}' target must include both 'longitude' and 'latitude'.")
-
-        stations = case.get("stations", [])
-        print(f"[DEBUG] Generating for case: {case_id}, "
-              f"target: ({latitude}, {longitude}), "
-              f"start: {base_forecast_start.isoformat()}")
-        print(f"[DEBUG] Available stations: {len(stations)}")
-
-        # (Optional) Gather history from all stations for potential future use
-        all_history = []
-        for station in stations:
-            station_code = station["station_code"]
-            history = station.get("history", [])
-            all_history.extend(history)
-            print(f"  [INFO] Station {station_code}: {len(history)} history points")
-
-        # Call the separate prediction function
-        # forecast_list = predict_pm10(
-        #     base_time=base_forecast_start,
-        #     history=all_history,
-        #     landuse_data=landuse_data,
-        #     hours=forecast_hours
-        # )
-
-        forecast_result = forecast_with_lag(case, cat_model, forecast_hours)
-        forecast_list = forecast_result["forecast"]
-
-        predictions.append({
-            "case_id": case_id,
-            "forecast": forecast_list
-        })
+            results[i] = _error_result(case, e)
+
+    try:
+        batch = forecast_batch([cases[i] for i in valid], model, forecast_hours)
+        for i, result in zip(valid, batch):
+            results[i] = result
+    except Exception:
+        for i in valid:
+            try:
+                results[i] = forecast_batch([cases[i]], model, forecast_hours)[0]
+            except Exception as e:
+                results[i] = _error_result(cases[i], e)
+    return results
+
+
+def _forecast_chunk(cases, forecast_hours):
+    """Worker task: forecast_isolated of a chunk of cases with the worker's model."""
+    return forecast_isolated(cases, _worker_model, forecast_hours)
+
+
+def _forecast_chunk_with_metrics(cases, forecast_hours):
+    """Worker task: _forecast_chunk plus the worker's metrics of the chunk (see instrumentation.drain)."""
+    return _forecast_chunk(cases, forecast_hours), instrumentation.drain()
+
+
+def iter_batches(cases, batch_size):
+    """Groups an iterable of cases into lists of at most batch_size cases."""
+    batch = []
+    for case in cases:
+        batch.append(case)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def forecast_parallel(cases, forecast_hours=24, batch_size=256, workers=2, model_path=None,
+                      stations_dir=None, station_memory_mb=DEFAULT_STATION_MEMORY_MB):
+    """
+    Shards the cases across a process pool of `workers` processes.
+    Each worker loads the model once and forecasts chunks of batch_size cases.
+    Yields predictions in the order of cases, keeping at most a few chunks in
+    flight per worker, so cases may come from a stream; a failing case is
+    reported and yielded as {"case_id", "forecast": [], "error"} without
+    stopping the other cases.
+    """
+    def chunk_predictions(chunk):
+        chunk_results, metrics = chunk
+        instrumentation.merge(metrics)
+        for result in chunk_results:
+            if "error" in result:
+                instrumentation.count("case_errors")
+                print(f"[ERROR] Case '{result['case_id']}' failed: {result['error']}")
+                yield {"case_id": result["case_id"], "forecast": [], "error": result["error"]}
+            else:
+                yield {"case_id": result["case_id"], "forecast": result["forecast"]}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path, stations_dir, station_memory_mb,
+                                       instrumentation.enabled(), weather_cache.settings(),
+                                       forecast_cache.settings())) as executor:
+        pending = deque()
+        for chunk in iter_batches(cases, batch_size):
+            pending.append(executor.submit(_forecast_chunk_with_metrics, chunk, forecast_hours))
+            if len(pending) >= workers * 2:
+                yield from chunk_predictions(pending.popleft().result())
+        while pending:
+            yield from chunk_predictions(pending.popleft().result())
+
+
+def forecast_stream(cases, forecast_hours=24, batch_size=256, workers=1, model_path=None,
+                    stations_dir=None, station_memory_mb=DEFAULT_STATION_MEMORY_MB):
+    """
+    Yields predictions for an iterable of cases, batch_size cases at a time,
+    so memory is bounded by one batch (per worker) instead of by all cases.
+    """
+    if workers > 1:
+        yield from forecast_parallel(cases, forecast_hours, batch_size, workers, model_path,
+                                     stations_dir, station_memory_mb)
+        return
+
+    model = load_models(model_path, stations_dir, station_memory_mb)
+    for batch in iter_batches(cases, batch_size):
+        for case in batch:
+            validate_case(case)
+        for forecast_result in forecast_batch(batch, model, forecast_hours):
+            yield {
+                "case_id": forecast_result["case_id"],
+                "forecast": forecast_result["forecast"]
+            }
+
+
+def generate_output(data, landuse_data=None, forecast_hours=24, batch_size=None, workers=1, model_path=None,
+                    stations_dir=None, station_memory_mb=DEFAULT_STATION_MEMORY_MB):
+    """
+    Generates PM10 forecasts for each case’s target location.
+    - Uses 'prediction_start_time' from each case's target as the base timestamp.
+    - Raises an exception if 'prediction_start_time', 'longitude', or 'latitude' are missing/invalid.
+    - Optionally prints info about loaded landuse objects.
+    - Calls forecast_batch() on batches of batch_size cases (all cases at once if None),
+      so the model is called once per forecast hour for the whole batch.
+    - With workers > 1 the batches run in a process pool (see forecast_parallel);
+      failing cases are then reported instead of raised.
+    - The model is loaded lazily from model_path (default: model_registry.default_model_path()).
+    - With stations_dir, cases are forecast with their station's model where one exists
+      (see model_registry.StationModelRegistry).
+    """
+    if landuse_data is not None:
+        print(f"[INFO] Landuse objects loaded: {len(landuse_data)}")
+
+    cases = data["cases"]
+    if workers > 1:
+        # Several chunks per worker keep the pool balanced while batches stay large
+        batch_size = batch_size or max(math.ceil(len(cases) / (workers * 4)), 1)
+        return {"predictions": list(forecast_parallel(cases, forecast_hours, batch_size, workers, model_path,
+                                                      stations_dir, station_memory_mb))}
+
+    for case in cases:
+        validate_case(case)
+
+    # Forecast the cases batch by batch, one horizon step at a time
+    model = load_models(model_path, stations_dir, station_memory_mb)
+    batch_size = batch_size or max(len(cases), 1)
+    predictions = []
+    for start in range(0, len(cases), batch_size):
+        for forecast_result in forecast_batch(cases[start:start + batch_size], model, forecast_hours):
+            predictions.append({
+                "case_id": forecast_result["case_id"],
+                "forecast": forecast_result["forecast"]
+            })
 
     return {"predictions": predictions}
 
 
+def load_landuse(pbf_path, cache_dir=None):
+    """
+    Reads the landuse areas of a .pbf file into a LanduseIndex (see landuse.py).
+    The parsed result is cached on disk and memory-mapped by later runs.
+    """
+    print(f"Reading landuse data from: {pbf_path}")
+    with instrumentation.timer("landuse_load"):
+        landuse_data = LanduseIndex.load(pbf_path, cache_dir)
+    print(f"Found {landuse_data.n_ways} landuse ways.")
+    print(f"Found {landuse_data.n_relations} landuse relations.")
+    return landuse_data
+
+
 def main():
+    # "python main.py serve ..." runs the long-running forecast server
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from server import main as serve
+        serve(sys.argv[2:])
+        return
+    # "python main.py live ..." updates forecasts from a stream of observations
+    if len(sys.argv) > 1 and sys.argv[1] == "live":
+        from streaming import main as live
+        live(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="Generate random PM10 forecasts.")
-    parser.add_argument("--data-file", required=True, help="Path to input data.json")
+    parser.add_argument("--data-file", required=True, help="Path to input data.json (or cases.jsonl, one case per line)")
     parser.add_argument("--landuse-pbf", required=False, help="Path to landuse.pbf")
-    parser.add_argument("--output-file", required=True, help="Path to write output.json")
+    parser.add_argument("--landuse-cache-dir", default=None,
+                        help="Directory of the parsed landuse cache (default: $PM10_CACHE_DIR/landuse or ~/.cache/pm10/landuse)")
+    parser.add_argument("--output-file", required=True, help="Path to write output.json (or output.jsonl)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Number of cases forecast together per model call (default: all cases)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes to forecast cases in parallel (default: 1)")
+    parser.add_argument("--model-path", default=None,
+                        help="Path to the model (.cbm or .pkl; default: models/catboost_best_model.cbm, else .pkl)")
+    parser.add_argument("--station-models-dir", default=None,
+                        help="Directory of per-station models (<station_code>.cbm, e.g. models/stations); "
+                             "stations without one use --model-path")
+    parser.add_argument("--station-memory-mb", type=int, default=DEFAULT_STATION_MEMORY_MB,
+                        help=f"Memory budget of loaded station models (default: {DEFAULT_STATION_MEMORY_MB})")
+    parser.add_argument("--weather-cache-mb", type=float, default=weather_cache.DEFAULT_WEATHER_CACHE_MB,
+                        help="Memory budget of preprocessed weather shared by cases with identical weather records "
+                             f"(default: {weather_cache.DEFAULT_WEATHER_CACHE_MB}, 0 to disable)")
+    parser.add_argument("--weather-cache-dir", default=None,
+                        help="Also keep preprocessed weather in this directory, across runs (it must be trusted: "
+                             "entries are unpickled)")
+    parser.add_argument("--weather-cache-dir-mb", type=float, default=weather_cache.DEFAULT_WEATHER_DISK_MB,
+                        help="Disk budget of --weather-cache-dir; least recently used entries are deleted beyond it "
+                             f"(default: {weather_cache.DEFAULT_WEATHER_DISK_MB})")
+    parser.add_argument("--forecast-cache-mb", type=float, default=forecast_cache.DEFAULT_FORECAST_CACHE_MB,
+                        help="Memory budget of forecasts reused for cases with unchanged inputs "
+                             f"(default: {forecast_cache.DEFAULT_FORECAST_CACHE_MB}, 0 to disable)")
+    parser.add_argument("--forecast-cache-path", default=None,
+                        help="Also keep forecasts in this SQLite file, across runs (e.g. ~/.cache/pm10/forecasts.sqlite)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read cases one at a time and write each forecast as soon as it is done")
+    parser.add_argument("--metrics-file", default=None,
+                        help="Time the pipeline stages and write the timers and counters as JSON to this file")
     args = parser.parse_args()
 
+    if args.metrics_file:
+        instrumentation.enable()
+    weather_cache.configure(args.weather_cache_mb, args.weather_cache_dir, args.weather_cache_dir_mb)
+    forecast_cache.configure(args.forecast_cache_mb, args.forecast_cache_path)
+    run_start = time.perf_counter()
+
     # Read the input JSON file containing cases, stations, and target definitions
-    with open(args.data_file, "r") as f:
-        data = json.load(f)
+    data = None
+    if not args.stream:
+        with instrumentation.timer("json_load"):
+            if args.data_file.endswith(".jsonl"):
+                data = {"cases": list(iter_cases(args.data_file))}
+            else:
+                with open(args.data_file, "r") as f:
+                    data = json.load(f)
 
     landuse_data = None
     if args.landuse_pbf:
-        print(f"Reading landuse data from: {args.landuse_pbf}")
-        handler = LanduseHandler()
-        handler.apply_file(args.landuse_pbf)
-        print(f"Found {len(handler.landuse_ways)} landuse ways.")
-        print(f"Found {len(handler.landuse_relations)} landuse relations.")
-
-        landuse_data = {
-            "ways": handler.landuse_ways,
-            "relations": handler.landuse_relations
-        }
-
-    # Generate synthetic forecasts (random) for each case’s target
-    output = generate_output(data, landuse_data=landuse_data)
-
-    # Write the generated forecasts to the specified output JSON file
-    with open(args.output_file, "w") as f:
-        json.dump(output, f, indent=2)
+        landuse_data = load_landuse(args.landuse_pbf, args.landuse_cache_dir)
+
+    if args.stream:
+        # Forecast batch by batch, writing each forecast as soon as it is done
+        if landuse_data is not None:
+            print(f"[INFO] Landuse objects loaded: {len(landuse_data)}")
+        with PredictionWriter(args.output_file) as writer:
+            cases = instrumentation.timed_iter(iter_cases(args.data_file), "json_load")
+            for prediction in forecast_stream(cases, batch_size=args.batch_size or 256,
+                                              workers=args.workers, model_path=args.model_path,
+                                              stations_dir=args.station_models_dir,
+                                              station_memory_mb=args.station_memory_mb):
+                with instrumentation.timer("output_write"):
+                    writer.write(prediction)
+    else:
+        # Generate forecasts for each case’s target
+        output = generate_output(data, landuse_data=landuse_data, batch_size=args.batch_size,
+                                 workers=args.workers, model_path=args.model_path,
+                                 stations_dir=args.station_models_dir, station_memory_mb=args.station_memory_mb)
+
+        # Write the generated forecasts to the specified output JSON file
+        with instrumentation.timer("output_write"):
+            if args.output_file.endswith(".jsonl"):
+                with PredictionWriter(args.output_file) as writer:
+                    for prediction in output["predictions"]:
+                        writer.write(prediction)
+            else:
+                with open(args.output_file, "w") as f:
+                    json.dump(output, f, indent=2)
 
     print(f"Read input from: {args.data_file}")
     if args.landuse_pbf:
         print(f"Land use PBF provided at: {args.landuse_pbf}")
     print(f"Wrote forecasts to: {args.output_file}")
 
+    if args.metrics_file:
+        instrumentation.record("total", time.perf_counter() - run_start)
+        instrumentation.dump(args.metrics_file)
+        print(f"Wrote metrics to: {args.metrics_file}")
+
 
 if __name__ == "__main__":
     main()
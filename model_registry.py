@@ -0,0 +1,227 @@
+"""
+Lazy loading and caching of forecast models.
+
+Models are loaded on first use, not at import time, and cached by absolute
+path and modification time, so a model file is deserialized once per process
+and reloaded only when it changes on disk.
+
+Supported formats:
+- *.cbm: CatBoost native binary format (fastest to load)
+- *.npz: CatBoost model compiled into NumPy arrays (compiled_model.py),
+  evaluated without CatBoost and with identical predictions
+- anything else: joblib pickle, as saved by the training notebook
+
+Per-station models (models/stations/<station_code>.cbm, see train.py) are
+served by a StationModelRegistry, which loads them on demand, keeps the
+recently used ones within a memory budget and falls back to the global model.
+
+Every loaded model carries the SHA-256 of its file as model.fingerprint (see
+model_fingerprint), which identifies it in forecast_cache.py.
+
+Usage:
+    python model_registry.py export models/catboost_best_model.pkl models/catboost_best_model.cbm
+    python model_registry.py compile models/catboost_best_model.cbm models/catboost_best_model.npz
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import joblib
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+DEFAULT_MODEL_NAME = "catboost_best_model"
+STATIONS_DIR = os.path.join(MODELS_DIR, "stations")
+DEFAULT_STATION_MEMORY_MB = 512
+
+_cache = {}  # absolute path -> (mtime, model)
+_lock = threading.Lock()
+
+
+def default_model_path():
+    """
+    Path of the default model: $PM10_MODEL_PATH if set, otherwise
+    models/catboost_best_model.cbm if it exists, else the .pkl next to it.
+    """
+    if os.environ.get("PM10_MODEL_PATH"):
+        return os.environ["PM10_MODEL_PATH"]
+    cbm_path = os.path.join(MODELS_DIR, DEFAULT_MODEL_NAME + ".cbm")
+    if os.path.exists(cbm_path):
+        return cbm_path
+    return os.path.join(MODELS_DIR, DEFAULT_MODEL_NAME + ".pkl")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_model(path):
+    if path.endswith(".cbm"):
+        from catboost import CatBoostRegressor
+        model = CatBoostRegressor()
+        model.load_model(path, format="cbm")
+    elif path.endswith(".npz"):
+        from compiled_model import CompiledModel
+        model = CompiledModel.load(path)
+    else:
+        model = joblib.load(path)
+    try:
+        model.fingerprint = file_sha256(path)
+    except AttributeError:
+        pass  # models that do not take attributes have no fingerprint
+    return model
+
+
+def model_fingerprint(model):
+    """
+    SHA-256 of the file a model was loaded from, or None for models that were
+    not loaded by this module (their forecasts are not cached).
+    """
+    return getattr(model, "fingerprint", None)
+
+
+def load_model(path=None):
+    """
+    Returns the model stored at path (default: default_model_path()).
+    The model is read on the first call and served from the cache afterwards,
+    until the file's modification time changes.
+    """
+    path = os.path.abspath(path or default_model_path())
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        model = _read_model(path)
+        _cache[path] = (mtime, model)
+        return model
+
+
+def clear_cache():
+    """Forgets all cached models."""
+    with _lock:
+        _cache.clear()
+
+
+class StationModelRegistry:
+    """
+    Models keyed by station_code, with the global model as fallback.
+
+    The model files of stations_dir (<station_code>.cbm, else .pkl) are listed
+    once; a station's model is read when it is first needed and kept in an LRU
+    cache. When the cached model files exceed memory_budget_mb, the least
+    recently used models are evicted. Stations without a model file get the
+    global model (model_path, see load_model), which is only loaded if needed.
+    Thread-safe.
+    """
+
+    def __init__(self, stations_dir=STATIONS_DIR, model_path=None, memory_budget_mb=DEFAULT_STATION_MEMORY_MB):
+        self.stations_dir = stations_dir
+        self.model_path = model_path
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.paths = {}
+        if os.path.isdir(stations_dir):
+            for name in sorted(os.listdir(stations_dir)):
+                station_code, ext = os.path.splitext(name)
+                if ext == ".cbm" or (ext == ".pkl" and station_code not in self.paths):
+                    self.paths[station_code] = os.path.join(stations_dir, name)
+        self._models = OrderedDict()  # station_code -> (mtime, size, model), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def model_for(self, station_code):
+        """The station's own model if it has one, otherwise the global model."""
+        path = self.paths.get(station_code)
+        if path is None:
+            return load_model(self.model_path)
+
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._models.get(station_code)
+            if cached is not None and cached[0] == mtime:
+                self._models.move_to_end(station_code)
+                self.hits += 1
+                return cached[2]
+            if cached is not None:
+                self._bytes -= self._models.pop(station_code)[1]
+
+            self.misses += 1
+            model = _read_model(path)
+            size = os.path.getsize(path)
+            self._models[station_code] = (mtime, size, model)
+            self._bytes += size
+            # Evict the least recently used models, but always keep the one just loaded
+            while self._bytes > self.memory_budget and len(self._models) > 1:
+                _, (_, evicted_size, _) = self._models.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+            return model
+
+    def stats(self):
+        """Cache counters: loaded models, their file bytes, hits, misses and evictions."""
+        with self._lock:
+            return {"stations": len(self.paths), "loaded": len(self._models), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+def load_models(model_path=None, stations_dir=None, memory_budget_mb=DEFAULT_STATION_MEMORY_MB):
+    """
+    The model to forecast with: the global model (see load_model), or a
+    StationModelRegistry over stations_dir if one is given.
+    """
+    if stations_dir:
+        return StationModelRegistry(stations_dir, model_path, memory_budget_mb)
+    return load_model(model_path)
+
+
+def export_cbm(model_path, output_path):
+    """Saves a (pickled) CatBoost model in CatBoost's native binary format."""
+    load_model(model_path).save_model(output_path, format="cbm")
+
+
+def compile_model_file(model_path, output_path, categories_path=None):
+    """
+    Compiles a CatBoost model into a .npz (see compiled_model.py). The known
+    categorical values are compiled_model.default_categories(), with the
+    features of categories_path (JSON: {feature name: [values]}) replaced.
+    """
+    from compiled_model import compile_model, default_categories
+    categories = default_categories()
+    if categories_path:
+        with open(categories_path) as f:
+            categories.update(json.load(f))
+    compile_model(load_model(model_path), categories).save(output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast model utilities.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Convert a pickled CatBoost model to .cbm")
+    export.add_argument("model_path", help="Path to the pickled model (.pkl)")
+    export.add_argument("output_path", help="Path to write the .cbm model")
+    compile_parser = subparsers.add_parser("compile", help="Compile a CatBoost model into a NumPy .npz")
+    compile_parser.add_argument("model_path", help="Path to the CatBoost model (.cbm or .pkl)")
+    compile_parser.add_argument("output_path", help="Path to write the compiled model (.npz)")
+    compile_parser.add_argument("--categories", default=None,
+                                help="JSON file of the known values of categorical features, replacing the "
+                                     "defaults (months 1-12, the stations of data/processed/stations.csv)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_cbm(args.model_path, args.output_path)
+        print(f"Wrote {args.output_path}")
+    elif args.command == "compile":
+        compile_model_file(args.model_path, args.output_path, args.categories)
+        print(f"Wrote {args.output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,105 +1,150 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime
-
-# Read data from CSV file
-input_file = '../data/processed/weather_pre_algorithm.csv'
-df = pd.read_csv(input_file)
-
-df['DATE'] = pd.to_datetime(df['DATE'])
-
-# Step 1: Keep only measurements at full hours (minutes = 0)
-df_hourly = df[df['DATE'].dt.minute == 0].copy()
-
-print(f"Data before filtering: {len(df)} rows")
-print(f"Data after filtering (full hours only): {len(df_hourly)} rows")
-
-
-# Step 2: Group by hour (without considering REPORT_TYPE yet)
-df_hourly['hour'] = df_hourly['DATE'].dt.floor('h')
-
-# Step 3: Function to merge weather data
-def merge_weather_data(group):
-    """Function to merge FM-12 and FM-15 data for the same hour"""
-    
-    if len(group) == 1:
-        # If there's only one measurement, return it as is
-        return group.iloc[0]
-    
-    # List of numeric columns to average
-    numeric_columns = [
-        'wind_speed_raw', 'wind_dir_sin', 'wind_dir_cos', 'ceiling_height_ft', 
-        'ceiling_coverage', 'visibility_m', 'temperature_C', 'SLP_hpa', 'DEW_C',
-        'MA1_main', 'MA1_sec', 'GA1_amt', 'GA1_height', 'GA2_amt', 'GA2_height',
-        'MD1_m1', 'MD1_m2', 'MW1_val'
-    ]
-    
-    # Create new row using first observation as base
-    merged_row = group.iloc[0].copy()
-    
-    # For numeric columns - calculate arithmetic mean
-    for col in numeric_columns:
-        if col in group.columns:
-            # Ignore NaN values when calculating mean
-            values = group[col].dropna()
-            if len(values) > 0:
-                merged_row[col] = values.mean()
-            else:
-                merged_row[col] = np.nan
-    
-    # For REPORT_TYPE - combine names
-    report_types = group['REPORT_TYPE'].unique()
-    merged_row['REPORT_TYPE'] = '+'.join(sorted(report_types))
-    
-    # For text/categorical columns - take first non-null value
-    text_columns = ['GA1_type', 'GA2_type']
-    for col in text_columns:
-        if col in group.columns:
-            non_null_values = group[col].dropna()
-            if len(non_null_values) > 0:
-                merged_row[col] = non_null_values.iloc[0]
-    
-    return merged_row
+
+# Numeric columns averaged over the reports of one hour (NaN ignored)
+NUMERIC_COLUMNS = [
+    'wind_speed_raw', 'wind_dir_sin', 'wind_dir_cos', 'ceiling_height_ft',
+    'ceiling_coverage', 'visibility_m', 'temperature_C', 'SLP_hpa', 'DEW_C',
+    'MA1_main', 'MA1_sec', 'GA1_amt', 'GA1_height', 'GA2_amt', 'GA2_height',
+    'MD1_m1', 'MD1_m2', 'MW1_val'
+]
+
+# Text/categorical columns taking the first non-null value of the hour
+TEXT_COLUMNS = ['GA1_type', 'GA2_type']
+
+
+def merge_hourly_reports(df_hourly: pd.DataFrame, by=None) -> pd.DataFrame:
+    """
+    Merges the FM-12 and FM-15 reports of the same hour into one row.
+
+    Every hour (and every combination of the `by` columns, e.g. ['STATION'] for
+    multi-station data) becomes one row, in sorted order:
+    - hours with a single report are kept as they are
+    - otherwise the first report is the base row, the NUMERIC_COLUMNS are the
+      mean of the non-null values, TEXT_COLUMNS the first non-null value, and
+      REPORT_TYPE the sorted distinct report types joined with '+'
+    The index of each row is the index of the hour's first report.
+
+    All columns are merged with grouped array operations, not a Python loop over
+    the hours, and give exactly the values of the previous per-hour implementation.
+    """
+    hour = pd.to_datetime(df_hourly['DATE']).dt.floor('h')
+    keys = [df_hourly[col] for col in (by or [])] + [hour]
+    codes = df_hourly.groupby(keys, sort=True).ngroup().to_numpy()
+
+    # Hours without a valid key are dropped, as by groupby
+    valid = np.flatnonzero(codes >= 0)
+    order = valid[np.argsort(codes[valid], kind='stable')]
+    sorted_codes = codes[order]
+    n_groups = codes.max() + 1 if len(valid) else 0
+    group_start = np.searchsorted(sorted_codes, np.arange(n_groups))
+    multi = np.bincount(sorted_codes, minlength=n_groups) > 1
+
+    merged = df_hourly.iloc[order[group_start]].copy()
+    if not multi.any():
+        return merged
+
+    for col in NUMERIC_COLUMNS:
+        if col in merged.columns:
+            values = merged[col].to_numpy(dtype=float, copy=True)
+            values[multi] = _group_nanmean(df_hourly[col].to_numpy(dtype=float)[order], sorted_codes, n_groups)[multi]
+            merged[col] = values
+
+    report_types = merged['REPORT_TYPE'].to_numpy(dtype=object, copy=True)
+    report_types[multi] = _group_joined_types(df_hourly['REPORT_TYPE'].to_numpy(dtype=object)[order],
+                                              sorted_codes, n_groups)[multi]
+    merged['REPORT_TYPE'] = report_types
+
+    for col in TEXT_COLUMNS:
+        if col in merged.columns:
+            values = merged[col].to_numpy(dtype=object, copy=True)
+            column = df_hourly[col].to_numpy(dtype=object)[order]
+            non_null = np.flatnonzero(pd.notna(column))
+            groups, first = np.unique(sorted_codes[non_null], return_index=True)
+            update = multi[groups]
+            values[groups[update]] = column[non_null[first[update]]]
+            merged[col] = values
+
+    return merged
+
+
+def _group_nanmean(values, sorted_codes, n_groups):
+    """Mean of the non-NaN values of every group; NaN if there are none."""
+    present = ~np.isnan(values)
+    codes, values = sorted_codes[present], values[present]
+    result = np.full(n_groups, np.nan)
+    if len(values):
+        groups, starts, counts = np.unique(codes, return_index=True, return_counts=True)
+        # Groups with k values are summed as rows of a (groups, k) matrix, which adds in
+        # the same order as Series.mean on the group's values (np.add.reduceat does not)
+        for k in np.unique(counts):
+            same = counts == k
+            rows = values[starts[same][:, None] + np.arange(k)]
+            result[groups[same]] = rows.sum(axis=1) / k
+    return result
+
+
+def _group_joined_types(report_types, sorted_codes, n_groups):
+    """'+'.join(sorted(unique report types)) of every group."""
+    names, type_codes = np.unique(report_types.astype(str), return_inverse=True)
+    if len(names) > 62:
+        joined = pd.Series(report_types).groupby(sorted_codes).agg(lambda s: '+'.join(sorted(s.unique())))
+        return joined.reindex(range(n_groups)).to_numpy(dtype=object)
+
+    # One bit per report type (in sorted name order) for every group
+    bits = np.left_shift(np.int64(1), type_codes.astype(np.int64))
+    masks = np.bitwise_or.reduceat(bits, np.searchsorted(sorted_codes, np.arange(n_groups)))
+    distinct, inverse = np.unique(masks, return_inverse=True)
+    labels = ['+'.join(names[[i for i in range(len(names)) if mask >> i & 1]]) for mask in distinct]
+    return np.array(labels, dtype=object)[inverse]
+
 
 #Step 3.5 do interpolation to impute missing values of weather in the training set
 def impute_values():
     pass
 
-# Step 4: Group by hour and merge data
-grouped = df_hourly.groupby('hour')
-merged_data = []
 
-for hour, group in grouped:
-    merged_row = merge_weather_data(group)
-    merged_data.append(merged_row)
+def main():
+    # Read data from CSV file
+    input_file = '../data/processed/weather_pre_algorithm.csv'
+    df = pd.read_csv(input_file)
+
+    df['DATE'] = pd.to_datetime(df['DATE'])
+
+    # Step 1: Keep only measurements at full hours (minutes = 0)
+    df_hourly = df[df['DATE'].dt.minute == 0].copy()
+
+    print(f"Data before filtering: {len(df)} rows")
+    print(f"Data after filtering (full hours only): {len(df_hourly)} rows")
+
+    # Step 2-4: Group by hour and merge FM-12 and FM-15 data
+    df_final = merge_hourly_reports(df_hourly)
 
-# Create new DataFrame with processed data
-df_final = pd.DataFrame(merged_data)
+    print(f"\nData after merging: {len(df_final)} rows")
 
-# Remove helper column 'hour'
-df_final = df_final.drop('hour', axis=1)
+    # Display sample results
+    print("\nFirst few rows of processed dataset:")
+    print(df_final.head())
 
-print(f"\nData after merging: {len(df_final)} rows")
+    # Save to CSV file
+    output_file = 'processed_weather_data_merged.csv'
+    df_final.to_csv(output_file, index=False)
+    print(f"\nData saved to file: {output_file}")
 
-# Display sample results
-print("\nFirst few rows of processed dataset:")
-print(df_final.head())
+    # Check which hours had merged data
+    merged_hours = df_final[df_final['REPORT_TYPE'].astype(str).str.contains('+', regex=False)]
+    print("\nMerging summary:")
+    for date, report_type in zip(merged_hours['DATE'], merged_hours['REPORT_TYPE']):
+        print(f"Hour {date}: merged data {report_type}")
 
-# Save to CSV file
-output_file = 'processed_weather_data_merged.csv'
-df_final.to_csv(output_file, index=False)
-print(f"\nData saved to file: {output_file}")
+    # Display detailed statistics
+    print(f"\nProcessing statistics:")
+    print(f"- Original rows: {len(df)}")
+    print(f"- Rows with full hours: {len(df_hourly)}")
+    print(f"- Final processed rows: {len(df_final)}")
+    print(f"- Rows removed (30-minute intervals): {len(df) - len(df_hourly)}")
+    print(f"- Hours with merged FM-12+FM-15 data: {len(merged_hours)}")
 
-# Check which hours had merged data
-print("\nMerging summary:")
-for i, row in df_final.iterrows():
-    if '+' in str(row['REPORT_TYPE']):
-        print(f"Hour {row['DATE']}: merged data {row['REPORT_TYPE']}")
 
-# Display detailed statistics
-print(f"\nProcessing statistics:")
-print(f"- Original rows: {len(df)}")
-print(f"- Rows with full hours: {len(df_hourly)}")
-print(f"- Final processed rows: {len(df_final)}")
-print(f"- Rows removed (30-minute intervals): {len(df) - len(df_hourly)}")
-print(f"- Hours with merged FM-12+FM-15 data: {sum(1 for _, row in df_final.iterrows() if '+' in str(row['REPORT_TYPE']))}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,20 @@
-import joblib
 import pandas as pd
 import numpy as np
-from weather_preprocessing import preprocess_weather
+import forecast_cache
+import instrumentation
+import weather_cache
+from feature_store import CALENDAR_COLUMNS, calendar_features
+from history import History
+from model_registry import StationModelRegistry, load_model, model_fingerprint
+from spatial import NEIGHBOR_FEATURES, neighbor_lags
+from weather_index import WeatherIndex
 
-cat_model = joblib.load("models/catboost_best_model.pkl")
+
+def __getattr__(name):
+    # prediction.cat_model loads the default model lazily, on first access
+    if name == "cat_model":
+        return load_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 
@@ -13,86 +24,85 @@ def find_weather_for_timestamp(weather_df, target_timestamp):
     1. Same hour from nearest days (priority)
     2. Nearest hour if no same hour available  
     3. Average if multiple measurements at same hour
+    Builds a WeatherIndex for a single lookup; build the index once and use
+    WeatherIndex.lookup_many when looking up many timestamps.
     """
     if weather_df.empty:
         return {}
-    
-    # Convert to datetime if not already
-    weather_df = weather_df.copy()
-    weather_df['DATE'] = pd.to_datetime(weather_df['DATE'])
-    target_timestamp = pd.to_datetime(target_timestamp)
-    
-    target_hour = target_timestamp.hour
-    
-    # Step 1: Try to find same hour from different days
-    same_hour_mask = weather_df['DATE'].dt.hour == target_hour
-    same_hour_data = weather_df[same_hour_mask]
-    
-    if not same_hour_data.empty:
-        # Found weather data at the same hour - prioritize by date proximity
-        target_date = target_timestamp.date()
-        date_diffs = same_hour_data['DATE'].dt.date.apply(lambda x: abs((x - target_date).days))
-        min_date_diff = date_diffs.min()
-        
-        # Get all measurements from the closest date(s) with same hour
-        closest_same_hour = same_hour_data[date_diffs == min_date_diff]
-        
-        if len(closest_same_hour) == 1:
-            # One measurement at same hour from closest date
-            result = closest_same_hour.iloc[0].to_dict()
-            result.pop('DATE', None)
-            return result
-        else:
-            # Multiple measurements at same hour - average them
-            numeric_cols = closest_same_hour.select_dtypes(include=[np.number]).columns
-            result = {}
-            
-            for col in numeric_cols:
-                if col != 'DATE':
-                    result[col] = closest_same_hour[col].mean()
-            
-            # For categorical - take first value
-            categorical_cols = closest_same_hour.select_dtypes(exclude=[np.number, 'datetime']).columns
-            for col in categorical_cols:
-                if col != 'DATE':
-                    result[col] = closest_same_hour[col].iloc[0]
-                    
-            return result
-    
-    # Step 2: No same hour found - fall back to nearest timestamp (old logic)
-    time_diffs = np.abs((weather_df['DATE'] - target_timestamp).dt.total_seconds())
-    min_diff = time_diffs.min()
-    closest_indices = np.where(time_diffs == min_diff)[0]
-    
-    if len(closest_indices) == 1:
-        # One nearest timestamp
-        closest_row = weather_df.iloc[closest_indices[0]]
-        result = closest_row.to_dict()
-        result.pop('DATE', None)
-        return result
-    else:
-        # Multiple equidistant timestamps - average them
-        closest_rows = weather_df.iloc[closest_indices]
-        
-        numeric_cols = closest_rows.select_dtypes(include=[np.number]).columns
-        result = {}
-        
-        for col in numeric_cols:
-            if col != 'DATE':
-                result[col] = closest_rows[col].mean()
-        
-        categorical_cols = closest_rows.select_dtypes(exclude=[np.number, 'datetime']).columns
-        for col in categorical_cols:
-            if col != 'DATE':
-                result[col] = closest_rows[col].iloc[0]
-                
-        return result
+    return WeatherIndex(weather_df).lookup(target_timestamp)
 
-def forecast_with_lag(case, model, horizon=24):
+class CaseWeather:
     """
-    case: dict containing station info, history, target, weather
-    model: trained CatBoost model
-    horizon: number of hours to forecast (default: 24)
+    Weather of a single case, parsed, preprocessed and indexed once (shared by
+    cases with the same weather records, see weather_cache.py), when it is
+    first needed: a case whose forecast is cached never preprocesses it.
+    key identifies the records (their weather_key, None without weather); it
+    is only hashed if a weather or forecast cache asks for it.
+    Feature dicts are cached per forecast timestamp, so repeated lookups are O(1).
+    An empty dict is returned if the case has no weather or preprocessing fails.
+    """
+    def __init__(self, weather_data):
+        self._weather_data = weather_data
+        self._index = None
+        self._loaded = not weather_data
+        self._features = {}
+        self._key = None
+
+        if weather_data:
+            instrumentation.count("weather_records", len(weather_data))
+
+    @property
+    def key(self):
+        if self._key is None and self._weather_data:
+            self._key = weather_cache.weather_key(self._weather_data)
+        return self._key
+
+    @property
+    def index(self):
+        """The WeatherIndex of the case's records (None without weather or if preprocessing fails)."""
+        if not self._loaded:
+            self._loaded = True
+            try:
+                # Preprocessed and indexed once per distinct weather payload (see weather_cache.py)
+                cache = weather_cache.default_cache()
+                self._index = cache.index(self._weather_data, self.key if cache.enabled else None)
+
+            except Exception as e:
+                instrumentation.count("weather_preprocess_failures")
+                print(f"Warning: Weather preprocessing failed: {e}")
+        return self._index
+
+    def prepare(self, timestamps):
+        """Resolve the weather of many forecast timestamps in one vectorized lookup."""
+        missing = [ts for ts in timestamps if ts not in self._features]
+        if not missing or self.index is None:
+            return
+        try:
+            with instrumentation.timer("weather_lookup"):
+                self._features.update(zip(missing, self.index.lookup_many(missing)))
+        except Exception as e:
+            print(f"Warning: Weather lookup failed: {e}")
+
+    def features(self, ts):
+        """Weather features for a forecast timestamp."""
+        if ts not in self._features:
+            weather_features = {}
+            if self.index is not None:
+                try:
+                    # Find weather for current timestamp
+                    with instrumentation.timer("weather_lookup"):
+                        weather_features = self.index.lookup(ts)
+                except Exception as e:
+                    print(f"Warning: Weather lookup failed for {ts}: {e}")
+            self._features[ts] = weather_features
+        return self._features[ts]
+
+
+def read_case(case):
+    """
+    Validates a case and returns its station_code, the History of its last
+    two PM10 values and its start time. Raises KeyError, IndexError or
+    ValueError for invalid cases.
     """
 
     # --- Validate station ---
@@ -101,93 +111,269 @@ def forecast_with_lag(case, model, horizon=24):
     station = case["stations"][0]
 
     # --- Validate history ---
-    history = pd.DataFrame(station.get("history", []))
-    if history.empty or "timestamp" not in history or "pm10" not in history:
+    records = station.get("history") or []
+    if not records:
         raise IndexError("History is missing or invalid")
-    if len(history) < 2:
+    if len(records) < 2:
         raise IndexError("Not enough history points for lag features")
-    history["timestamp"] = pd.to_datetime(history["timestamp"])
-
-    # Start from the last known PM10
-    pm10_lag_1 = history["pm10"].iloc[-1]
-    pm10_lag_2 = history["pm10"].iloc[-2]
+    # Only the points used as lags are converted, however long the history is
+    history = History.from_records(records, last=2)
 
     # --- Validate target ---
     if "prediction_start_time" not in case.get("target", {}):
         raise KeyError("prediction_start_time missing")
     start_time = pd.to_datetime(case["target"]["prediction_start_time"])
+    return station["station_code"], history, start_time
 
-    forecast_rows = []
 
-    for i in range(horizon):
-        ts = start_time + pd.Timedelta(hours=i)
-        year, month, day, hour = ts.year, ts.month, ts.day, ts.hour
-        weekday, day_of_year = ts.weekday(), ts.dayofyear
-
-        # Cyclic encoding
-        hour_sin, hour_cos = np.sin(2*np.pi*hour/24), np.cos(2*np.pi*hour/24)
-        doy_sin, doy_cos = np.sin(2*np.pi*day_of_year/365.25), np.cos(2*np.pi*day_of_year/365.25)
-        weekday_sin, weekday_cos = np.sin(2*np.pi*weekday/7), np.cos(2*np.pi*weekday/7)
-
-        row = {
-            "DATE": ts,
-            "year": year,
-            "month": month,
-            "day": day,
-            "hour": hour,
-            "hour_sin": hour_sin,
-            "hour_cos": hour_cos,
-            "doy_sin": doy_sin,
-            "doy_cos": doy_cos,
-            "weekday_sin": weekday_sin,
-            "weekday_cos": weekday_cos,
-            "station_code": station["station_code"],
-            "pm10_lag_1": pm10_lag_1,
-            "pm10_lag_2": pm10_lag_2
-        }
-
-        # TODO: Add weather preprocessing
-        weather_data = case.get("weather", [])
-        weather_features = {}
+def init_case_state(case):
+    """
+    Validates a case (see read_case) and returns its initial forecasting
+    state: station_code, start time and the last two PM10 values as lags.
+    """
+    with instrumentation.timer("history_parse"):
+        station_code, history, start_time = read_case(case)
+    instrumentation.count("cases")
+    instrumentation.count("history_points", len(case["stations"][0]["history"]))
 
-        if weather_data:
-            try:
-                # Convert to DataFrame
-                weather_df = pd.DataFrame(weather_data)
-                weather_df.rename(columns={"date": "DATE"}, inplace=True)
-                
-                # Preprocess weather data
-                weather_processed = preprocess_weather(weather_df)
-                
-                # Find weather for current timestamp
-                weather_features = find_weather_for_timestamp(weather_processed, ts)
-                
-            except Exception as e:
-                print(f"Warning: Weather preprocessing failed for {ts}: {e}")
+    # Start from the last known PM10; weather is preprocessed once per case, not once per forecast hour
+    pm10_lag_1, pm10_lag_2 = history.lags(2)
+    return case_state(case, station_code, start_time, pm10_lag_1, pm10_lag_2, CaseWeather(case.get("weather", [])))
 
-        row.update(weather_features)
 
+def case_state(case, station_code, start_time, pm10_lag_1, pm10_lag_2, weather):
+    """
+    Forecasting state of a case, as used by forecast_states. weather is a
+    CaseWeather (or anything with the same prepare/features methods).
+    """
+    return {
+        "case": case,
+        "station_code": station_code,
+        "start_time": start_time,
+        "pm10_lag_1": pm10_lag_1,
+        "pm10_lag_2": pm10_lag_2,
+        "weather": weather,
+        # NEIGHBOR_FEATURES, if the model uses them (see add_neighbor_features)
+        "neighbors": {},
+        "forecast": [],
+    }
 
-        # --- Keep only columns that exist in the model ---
-        X_new = pd.DataFrame([row])
-        X_new = X_new[[col for col in model.feature_names_ if col in X_new.columns]]
 
-        # --- Predict ---
-        y_pred = model.predict(X_new)[0]
+# Feature of direct multi-horizon models: hours ahead of the last known PM10 (1 = first forecast hour)
+HORIZON_FEATURE = "horizon"
 
-        # Update lags
-        pm10_lag_2 = pm10_lag_1
-        pm10_lag_1 = y_pred
 
-        forecast_rows.append({
-            "timestamp": ts.strftime("%Y-%m-%dT%H:%MZ"),
-            "pm10_pred": float(y_pred)
-        })
+def build_feature_row(ts, station_code, pm10_lag_1, pm10_lag_2):
+    """Calendar, station and lag features for a single forecast timestamp."""
+    year, month, day, hour = ts.year, ts.month, ts.day, ts.hour
+    weekday, day_of_year = ts.weekday(), ts.dayofyear
+
+    # Cyclic encoding
+    hour_sin, hour_cos = np.sin(2*np.pi*hour/24), np.cos(2*np.pi*hour/24)
+    doy_sin, doy_cos = np.sin(2*np.pi*day_of_year/365.25), np.cos(2*np.pi*day_of_year/365.25)
+    weekday_sin, weekday_cos = np.sin(2*np.pi*weekday/7), np.cos(2*np.pi*weekday/7)
 
     return {
-        "case_id": case["case_id"],
-        "forecast": forecast_rows
+        "DATE": ts,
+        "year": year,
+        "month": month,
+        "day": day,
+        "hour": hour,
+        "hour_sin": hour_sin,
+        "hour_cos": hour_cos,
+        "doy_sin": doy_sin,
+        "doy_cos": doy_cos,
+        "weekday_sin": weekday_sin,
+        "weekday_cos": weekday_cos,
+        "station_code": station_code,
+        "pm10_lag_1": pm10_lag_1,
+        "pm10_lag_2": pm10_lag_2
     }
 
 
-print(cat_model.feature_names_)
+def uses_neighbor_features(model):
+    """Whether the model has NEIGHBOR_FEATURES."""
+    return any(name in model.feature_names_ for name in NEIGHBOR_FEATURES)
+
+
+def add_neighbor_features(states):
+    """
+    Sets the NEIGHBOR_FEATURES of every state, computed for all cases in one
+    vectorized pass (see spatial.py). They describe the other stations at the
+    forecast start and stay fixed over the horizon.
+    """
+    with instrumentation.timer("neighbor_features"):
+        lags = neighbor_lags([state["case"] for state in states])
+    for state, values in zip(states, lags):
+        state["neighbors"] = dict(zip(NEIGHBOR_FEATURES, values))
+
+
+def forecast_batch(cases, model, horizon=24):
+    """
+    Recursive forecast for many cases at once.
+    All cases are advanced one horizon step at a time: the feature rows of
+    every case at step h go into a single model.predict call, and the
+    predictions are fed back as lags for step h+1.
+    model may be a StationModelRegistry: each case then uses its station's
+    model, and the cases are grouped by model so that every model is still
+    called once per step.
+    Models with a HORIZON_FEATURE (direct multi-horizon models, see
+    train.py --direct) are not stepped: see forecast_direct.
+    If a model uses NEIGHBOR_FEATURES, they are added for all cases at once
+    (see add_neighbor_features).
+    Model features a case does not provide (the weather features of a case
+    without usable weather records) are passed to the model as NaN, which
+    CatBoost treats as missing values.
+    Returns a list of {"case_id", "forecast"} dicts in the order of cases.
+    """
+    states = [init_case_state(case) for case in cases]
+    forecast_states(states, model, horizon)
+    return [
+        {"case_id": state["case"]["case_id"], "forecast": state["forecast"]}
+        for state in states
+    ]
+
+
+def forecast_states(states, model, horizon=24):
+    """
+    Forecasts prepared states (see init_case_state and case_state) as
+    described in forecast_batch, appending every case's forecast to
+    state["forecast"]. Forecasts found in the forecast cache (see
+    forecast_cache.py) are not computed again, and their weather is not
+    preprocessed.
+    """
+    if not states:
+        return
+
+    # Group the cases by the model they are forecast with
+    groups = {}  # id(model) -> (model, states)
+    for state in states:
+        case_model = model.model_for(state["station_code"]) if isinstance(model, StationModelRegistry) else model
+        groups.setdefault(id(case_model), (case_model, []))[1].append(state)
+
+    if any(uses_neighbor_features(group_model) for group_model, _ in groups.values()):
+        add_neighbor_features(states)
+
+    # Only the cases without a cached forecast are forecast
+    cache = forecast_cache.default_cache()
+    computed = {}  # forecast key -> state
+    if cache.enabled:
+        with instrumentation.timer("forecast_cache"):
+            for group_model, group in groups.values():
+                fingerprint = model_fingerprint(group_model)
+                if fingerprint is None:
+                    continue
+                keys = [forecast_cache.forecast_key(state, fingerprint, horizon) for state in group]
+                remaining = []
+                for state, key, forecast in zip(group, keys, cache.get_many(keys)):
+                    if forecast is not None:
+                        state["forecast"].extend(forecast)
+                    else:
+                        computed[key] = state
+                        remaining.append(state)
+                group[:] = remaining
+
+    # Resolve each case's weather for the whole horizon in one lookup
+    for _, group in groups.values():
+        for state in group:
+            state["weather"].prepare([state["start_time"] + pd.Timedelta(hours=i) for i in range(horizon)])
+
+    # Direct multi-horizon models forecast all hours at once; the others step recursively
+    recursive = []
+    for group_model, group in groups.values():
+        if not group:
+            continue
+        if HORIZON_FEATURE in group_model.feature_names_:
+            forecast_direct(group, group_model, horizon)
+        else:
+            recursive.append((group_model, group))
+
+    for i in range(horizon):
+        for group_model, group in recursive:
+            with instrumentation.timer("feature_assembly"):
+                rows = []
+                for state in group:
+                    ts = state["start_time"] + pd.Timedelta(hours=i)
+                    row = build_feature_row(ts, state["station_code"],
+                                            state["pm10_lag_1"], state["pm10_lag_2"])
+                    row.update(state["weather"].features(ts))
+                    row.update(state["neighbors"])
+                    rows.append(row)
+
+                # --- Keep only columns used by the model, in model order ---
+                # Features a case does not provide (e.g. weather of a case without weather records) are NaN
+                X_new = pd.DataFrame(rows).reindex(columns=group_model.feature_names_)
+
+            # --- Predict all cases of this model for this step ---
+            with instrumentation.timer("model_predict"):
+                y_pred = np.asarray(group_model.predict(X_new)).reshape(-1)
+            instrumentation.count("predict_calls")
+            instrumentation.count("predict_rows", len(X_new))
+            if len(y_pred) != len(rows):
+                raise ValueError(f"Model returned {len(y_pred)} predictions for {len(rows)} feature rows")
+
+            for state, row, y in zip(group, rows, y_pred):
+                # Update lags
+                state["pm10_lag_2"] = state["pm10_lag_1"]
+                state["pm10_lag_1"] = y
+
+                state["forecast"].append({
+                    "timestamp": row["DATE"].strftime("%Y-%m-%dT%H:%MZ"),
+                    "pm10_pred": float(y)
+                })
+
+    if computed:
+        with instrumentation.timer("forecast_cache"):
+            cache.put_many({key: state["forecast"] for key, state in computed.items()})
+
+
+def forecast_direct(states, model, horizon=24):
+    """
+    Direct multi-horizon forecast: every hour of every case comes from a
+    single model.predict call. The lags stay at the last two known PM10
+    values and the HORIZON_FEATURE tells the model how far ahead each row is,
+    so no prediction is fed back.
+    Appends the forecast to each state (see init_case_state).
+    """
+    with instrumentation.timer("feature_assembly"):
+        offsets = pd.to_timedelta(np.arange(horizon), unit="h")
+        timestamps = [state["start_time"] + offsets for state in states]
+        try:
+            calendar = calendar_features(pd.DatetimeIndex([state["start_time"] for state in states]).repeat(horizon)
+                                         + np.tile(offsets, len(states)))
+        except ValueError:
+            # Start times in different time zones: calendar features case by case
+            calendars = [calendar_features(ts) for ts in timestamps]
+            calendar = {name: np.concatenate([c[name] for c in calendars]) for name in CALENDAR_COLUMNS}
+
+        X_new = pd.DataFrame(calendar)
+        station_codes = np.array([state["station_code"] for state in states], dtype=object)
+        X_new["station_code"] = np.repeat(station_codes, horizon)
+        for name in ["pm10_lag_1", "pm10_lag_2"]:
+            X_new[name] = np.repeat(np.array([state[name] for state in states], dtype=float), horizon)
+        X_new[HORIZON_FEATURE] = np.tile(np.arange(1, horizon + 1), len(states))
+        for name in NEIGHBOR_FEATURES:
+            if name in model.feature_names_:
+                X_new[name] = np.repeat(np.array([state["neighbors"].get(name, np.nan) for state in states],
+                                                 dtype=float), horizon)
+        weather = pd.DataFrame([state["weather"].features(ts) for state, case_ts in zip(states, timestamps)
+                                for ts in case_ts])
+        X_new = pd.concat([X_new, weather], axis=1).reindex(columns=model.feature_names_)
+
+    with instrumentation.timer("model_predict"):
+        y_pred = np.asarray(model.predict(X_new)).reshape(len(states), horizon)
+    instrumentation.count("predict_calls")
+    instrumentation.count("predict_rows", len(X_new))
+
+    for state, case_ts, case_pred in zip(states, timestamps, y_pred):
+        state["forecast"].extend({"timestamp": ts.strftime("%Y-%m-%dT%H:%MZ"), "pm10_pred": float(y)}
+                                 for ts, y in zip(case_ts, case_pred))
+
+
+def forecast_with_lag(case, model, horizon=24):
+    """
+    case: dict containing station info, history, target, weather
+    model: trained CatBoost model (or a StationModelRegistry)
+    horizon: number of hours to forecast (default: 24)
+    """
+    return forecast_batch([case], model, horizon)[0]
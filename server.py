@@ -0,0 +1,313 @@
+"""
+Long-running PM10 forecast server.
+
+Keeps the model resident and answers forecast
+requests over HTTP on a TCP port or a Unix socket. Concurrent requests are
+coalesced into micro-batches, so the model is called once per forecast hour
+for all cases that arrived within a few milliseconds of each other.
+
+Endpoints:
+    POST /forecast   body: {"cases": [...]} (same schema as data.json)
+                     returns: {"predictions": [...]} (same schema as output.json); 400 with
+                     {"error"} for invalid JSON or cases, 500 if forecasting fails
+    GET  /metrics    request/case/batch counters, latency percentiles, throughput, weather and forecast
+                     cache counters
+    GET  /health     {"status": "ok"}
+
+Usage:
+    python main.py serve [--host 127.0.0.1] [--port 8000] [--unix-socket /tmp/pm10.sock]
+                         [--model-path models/catboost_best_model.cbm] [--station-models-dir models/stations]
+                         [--weather-cache-mb 64] [--weather-cache-dir DIR] [--weather-cache-dir-mb 1024]
+                         [--forecast-cache-mb 16] [--forecast-cache-path forecasts.sqlite]
+                         [--max-batch-size 512] [--max-wait-ms 5]
+"""
+
+import argparse
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import forecast_cache
+import weather_cache
+from model_registry import DEFAULT_STATION_MEMORY_MB, StationModelRegistry, load_models
+from prediction import forecast_batch, read_case
+
+
+class ServerMetrics:
+    """
+    Thread-safe request/case/batch counters and a window of recent request
+    latencies. failed_requests counts bad requests and server errors;
+    server_errors only the latter.
+    """
+    def __init__(self, window=10000):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.requests = 0
+        self.failed_requests = 0
+        self.server_errors = 0
+        self.cases = 0
+        self.batches = 0
+        self.batched_cases = 0
+        self._latencies_ms = deque(maxlen=window)
+
+    def record_request(self, n_cases, latency_s, failed=False, server_error=False):
+        with self._lock:
+            self.requests += 1
+            self.failed_requests += int(failed or server_error)
+            self.server_errors += int(server_error)
+            self.cases += n_cases
+            self._latencies_ms.append(latency_s * 1000.0)
+
+    def record_batch(self, n_cases):
+        with self._lock:
+            self.batches += 1
+            self.batched_cases += n_cases
+
+    def snapshot(self):
+        with self._lock:
+            uptime = time.monotonic() - self.started
+            latencies = np.array(self._latencies_ms)
+            percentiles = {}
+            if len(latencies):
+                for p in (50, 90, 99):
+                    percentiles[f"p{p}"] = float(np.percentile(latencies, p))
+                percentiles["max"] = float(latencies.max())
+            return {
+                "uptime_s": uptime,
+                "requests": self.requests,
+                "failed_requests": self.failed_requests,
+                "server_errors": self.server_errors,
+                "cases": self.cases,
+                "batches": self.batches,
+                "mean_batch_cases": self.batched_cases / self.batches if self.batches else 0.0,
+                "requests_per_s": self.requests / uptime if uptime else 0.0,
+                "cases_per_s": self.cases / uptime if uptime else 0.0,
+                "latency_ms": percentiles,
+            }
+
+
+class _Job:
+    def __init__(self, cases):
+        self.cases = cases
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrently submitted cases into one forecast_batch call.
+    A batch is started as soon as max_batch_size cases are waiting, or
+    max_wait_ms after its first request arrived.
+    """
+    def __init__(self, model, forecast_hours=24, max_batch_size=512, max_wait_ms=5.0, metrics=None):
+        self.model = model
+        self.forecast_hours = forecast_hours
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.metrics = metrics or ServerMetrics()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, cases):
+        """Forecasts the cases (blocking) and returns their forecast results."""
+        job = _Job(cases)
+        self._queue.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.results
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            n_cases = len(jobs[0].cases)
+            deadline = time.monotonic() + self.max_wait_s
+            while n_cases < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                n_cases += len(job.cases)
+            self._process(jobs)
+
+    def _process(self, jobs):
+        cases = [case for job in jobs for case in job.cases]
+        try:
+            results = forecast_batch(cases, self.model, self.forecast_hours)
+            self.metrics.record_batch(len(cases))
+            start = 0
+            for job in jobs:
+                job.results = results[start:start + len(job.cases)]
+                start += len(job.cases)
+        except Exception:
+            # One bad request must not fail the others: retry request by request
+            for job in jobs:
+                try:
+                    job.results = forecast_batch(job.cases, self.model, self.forecast_hours)
+                    self.metrics.record_batch(len(job.cases))
+                except Exception as e:
+                    job.error = e
+        for job in jobs:
+            job.done.set()
+
+
+class ForecastRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler; the server provides .batcher, .metrics and .validate_case."""
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            metrics = self.server.metrics.snapshot()
+            if isinstance(self.server.batcher.model, StationModelRegistry):
+                metrics["station_models"] = self.server.batcher.model.stats()
+            metrics["weather_cache"] = weather_cache.default_cache().stats()
+            metrics["forecast_cache"] = forecast_cache.default_cache().stats()
+            self._send_json(200, metrics)
+        else:
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/forecast":
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+
+        start = time.monotonic()
+        n_cases = 0
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length))
+            cases = data["cases"]
+            n_cases = len(cases)
+            for case in cases:
+                self.server.validate_case(case)
+                read_case(case)
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError, ValueError) as e:
+            self.server.metrics.record_request(n_cases, time.monotonic() - start, failed=True)
+            self._send_json(400, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        # The cases are valid: anything failing now is a fault of the server or the model
+        try:
+            results = self.server.batcher.submit(cases)
+        except Exception as e:
+            print(f"[ERROR] Forecasting {n_cases} cases failed: {type(e).__name__}: {e}")
+            self.server.metrics.record_request(n_cases, time.monotonic() - start, server_error=True)
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        predictions = [{"case_id": r["case_id"], "forecast": r["forecast"]} for r in results]
+        self._send_json(200, {"predictions": predictions})
+        self.server.metrics.record_request(n_cases, time.monotonic() - start)
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        # Per-request access logs would dominate latency under load
+        pass
+
+
+class ForecastHTTPServer(ThreadingHTTPServer):
+    # Load tests open many connections at once; the default backlog of 5 resets them
+    request_queue_size = 1024
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def make_server(model, host="127.0.0.1", port=8000, unix_socket=None, forecast_hours=24,
+                max_batch_size=512, max_wait_ms=5.0, validate_case=None):
+    """
+    Creates (but does not start) a forecast HTTP server on host:port, or on
+    unix_socket if given. validate_case(case) is called on every incoming case.
+    """
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, ForecastRequestHandler)
+    else:
+        server = ForecastHTTPServer((host, port), ForecastRequestHandler)
+    server.metrics = ServerMetrics()
+    server.batcher = MicroBatcher(model, forecast_hours, max_batch_size, max_wait_ms, server.metrics)
+    server.validate_case = validate_case or (lambda case: None)
+    return server
+
+
+def main(argv=None):
+    # Imported here: main.py dispatches "serve" to this module
+    from main import validate_case
+
+    parser = argparse.ArgumentParser(description="Serve PM10 forecasts with a resident model.")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--unix-socket", default=None, help="Listen on this Unix socket instead of host:port")
+    parser.add_argument("--model-path", default=None, help="Path to the model (.cbm or .pkl)")
+    parser.add_argument("--station-models-dir", default=None,
+                        help="Directory of per-station models; stations without one use --model-path")
+    parser.add_argument("--station-memory-mb", type=int, default=DEFAULT_STATION_MEMORY_MB,
+                        help=f"Memory budget of loaded station models (default: {DEFAULT_STATION_MEMORY_MB})")
+    parser.add_argument("--weather-cache-mb", type=float, default=weather_cache.DEFAULT_WEATHER_CACHE_MB,
+                        help="Memory budget of preprocessed weather shared by requests with identical weather "
+                             f"records (default: {weather_cache.DEFAULT_WEATHER_CACHE_MB})")
+    parser.add_argument("--weather-cache-dir", default=None,
+                        help="Also keep preprocessed weather in this (trusted: entries are unpickled) directory")
+    parser.add_argument("--weather-cache-dir-mb", type=float, default=weather_cache.DEFAULT_WEATHER_DISK_MB,
+                        help=f"Disk budget of --weather-cache-dir (default: {weather_cache.DEFAULT_WEATHER_DISK_MB})")
+    parser.add_argument("--forecast-cache-mb", type=float, default=forecast_cache.DEFAULT_FORECAST_CACHE_MB,
+                        help="Memory budget of forecasts reused for resubmitted cases with unchanged inputs "
+                             f"(default: {forecast_cache.DEFAULT_FORECAST_CACHE_MB})")
+    parser.add_argument("--forecast-cache-path", default=None, help="Also keep forecasts in this SQLite file")
+    parser.add_argument("--max-batch-size", type=int, default=512, help="Maximum cases per micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="Maximum time a request waits for others to join its micro-batch")
+    args = parser.parse_args(argv)
+
+    model = load_models(args.model_path, args.station_models_dir, args.station_memory_mb)
+    weather_cache.configure(args.weather_cache_mb, args.weather_cache_dir, args.weather_cache_dir_mb)
+    forecast_cache.configure(args.forecast_cache_mb, args.forecast_cache_path)
+    server = make_server(model, args.host, args.port, args.unix_socket,
+                         max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+                         validate_case=validate_case)
+
+    where = args.unix_socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving PM10 forecasts on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Spatial neighbor features: distance-weighted PM10 of the nearby stations.
+
+A case carries the history of several stations, but the lag features only use
+its first station. The neighbor features add the last two PM10 values of the
+other stations of the case, averaged with inverse-distance weights (power
+IDW_POWER) over the NEIGHBORS stations nearest to the case's target within
+MAX_DISTANCE_M:
+
+    neighbor_pm10_lag_1, neighbor_pm10_lag_2
+
+Stations without coordinates in the case are placed with the fixed network of
+data/processed/stations.csv. Distances are great-circle distances: points are
+mapped to 3-D unit vectors, where the chord length is monotonic in the
+great-circle distance, and all targets of a batch are queried in one
+cKDTree.query. Each case's points get a fourth coordinate far apart from the
+other cases', so neighbors never cross cases and the whole batch shares one
+tree.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+STATIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "processed", "stations.csv")
+NEIGHBOR_FEATURES = ["neighbor_pm10_lag_1", "neighbor_pm10_lag_2"]
+NEIGHBORS = 4
+MAX_DISTANCE_M = 50_000
+IDW_POWER = 2
+MIN_DISTANCE_M = 100  # closer stations are weighted as if 100 m away
+EARTH_RADIUS_M = 6_371_008.8
+_GROUP_SPACING = 4.0  # > the largest chord (2) between unit vectors
+
+_network = None
+
+
+def load_stations(path=STATIONS_PATH):
+    """station_code -> (longitude, latitude)."""
+    stations = pd.read_csv(path)
+    return {row.station_code: (row.longitude, row.latitude) for row in stations.itertuples()}
+
+
+def station_network():
+    """Coordinates of the fixed station network (empty if stations.csv is missing), read once."""
+    global _network
+    if _network is None:
+        _network = load_stations() if os.path.exists(STATIONS_PATH) else {}
+    return _network
+
+
+def unit_vectors(lon_lat):
+    """(n, 2) degrees of longitude/latitude -> (n, 3) points on the unit sphere."""
+    lon, lat = np.radians(np.asarray(lon_lat, dtype=float).reshape(-1, 2)).T
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_meters(chord):
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(chord, 2.0) / 2)
+
+
+def meters_to_chord(meters):
+    return 2 * np.sin(np.minimum(meters / EARTH_RADIUS_M, np.pi) / 2)
+
+
+def nearest(target_lon_lat, point_lon_lat, target_groups=None, point_groups=None, exclude=None, k=NEIGHBORS,
+            max_distance_m=MAX_DISTANCE_M):
+    """
+    The k nearest points of every target within max_distance_m, in one
+    KD-tree query. Targets only see points of the same group; exclude[i] is
+    a point index never returned for target i (-1: none). Points or targets
+    with NaN coordinates are never matched.
+    Returns (indices, distances_m) of shape (n_targets, k), nearest first,
+    with index -1 and distance inf where there are fewer than k neighbors.
+    """
+    targets, points = unit_vectors(target_lon_lat), unit_vectors(point_lon_lat)
+    n_targets = len(targets)
+    indices = np.full((n_targets, k), -1)
+    distances = np.full((n_targets, k), np.inf)
+    valid_points = np.flatnonzero(~np.isnan(points).any(axis=1))
+    valid_targets = ~np.isnan(targets).any(axis=1)
+    if not len(valid_points) or not valid_targets.any() or k < 1:
+        return indices, distances
+
+    target_groups = np.zeros(n_targets) if target_groups is None else np.asarray(target_groups, dtype=float)
+    point_groups = np.zeros(len(points)) if point_groups is None else np.asarray(point_groups, dtype=float)
+    tree = cKDTree(np.column_stack([points[valid_points], point_groups[valid_points] * _GROUP_SPACING]))
+    query = np.column_stack([targets[valid_targets], target_groups[valid_targets] * _GROUP_SPACING])
+    # One extra neighbor, in case the excluded point is among the nearest
+    n_query = min(k + (exclude is not None), len(valid_points))
+    chord, found = tree.query(query, k=n_query, distance_upper_bound=meters_to_chord(max_distance_m))
+    chord, found = chord.reshape(len(query), n_query), found.reshape(len(query), n_query)
+
+    matched = found < len(valid_points)
+    found = np.where(matched, valid_points[np.minimum(found, len(valid_points) - 1)], -1)
+    if exclude is not None:
+        matched &= found != np.asarray(exclude)[valid_targets][:, None]
+    # Keep the first k matches of every row, in order of distance
+    keep = matched & (np.cumsum(matched, axis=1) <= k)
+    rows, cols = np.nonzero(keep)
+    slots = np.cumsum(keep, axis=1)[rows, cols] - 1
+    target_rows = np.flatnonzero(valid_targets)[rows]
+    indices[target_rows, slots] = found[rows, cols]
+    distances[target_rows, slots] = chord_to_meters(chord[rows, cols])
+    return indices, distances
+
+
+def idw_weights(distances_m, power=IDW_POWER):
+    """Inverse-distance weights, 0 where there is no neighbor (inf distance)."""
+    return 1.0 / np.maximum(distances_m, MIN_DISTANCE_M) ** power
+
+
+def weighted_mean(values, weights):
+    """Weighted mean over the last axis, skipping NaN values; NaN if nothing is left."""
+    weights = np.where(np.isnan(values), 0.0, weights)
+    total = weights.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, (np.nan_to_num(values) * weights).sum(axis=-1) / total, np.nan)
+
+
+def neighbor_lags(cases, network=None, k=NEIGHBORS, max_distance_m=MAX_DISTANCE_M):
+    """
+    NEIGHBOR_FEATURES of every case, shape (len(cases), 2): the IDW mean of
+    the last two PM10 values of the case's other stations nearest to its
+    target (the first station's location if the target has no coordinates).
+    """
+    network = station_network() if network is None else network
+    point_lon_lat, point_groups, lags, first_point, target_lon_lat = [], [], [], [], []
+    for i, case in enumerate(cases):
+        first_point.append(len(point_groups))
+        for station in case.get("stations", []):
+            code = station.get("station_code")
+            lon, lat = station.get("longitude"), station.get("latitude")
+            if lon is None or lat is None:
+                lon, lat = network.get(code, (np.nan, np.nan))
+            history = station.get("history") or []
+            point_lon_lat.append((lon, lat))
+            point_groups.append(i)
+            lags.append([history[-1]["pm10"] if len(history) > 0 else np.nan,
+                         history[-2]["pm10"] if len(history) > 1 else np.nan])
+        target = case.get("target", {})
+        if target.get("longitude") is not None and target.get("latitude") is not None:
+            target_lon_lat.append((target["longitude"], target["latitude"]))
+        elif first_point[-1] < len(point_lon_lat):
+            target_lon_lat.append(point_lon_lat[first_point[-1]])
+        else:
+            target_lon_lat.append((np.nan, np.nan))
+    if not cases:
+        return np.empty((0, len(NEIGHBOR_FEATURES)))
+
+    # The first station of a case provides its own lags, so it is not a neighbor
+    exclude = np.array([first if first < len(point_groups) and point_groups[first] == i else -1
+                        for i, first in enumerate(first_point)])
+    indices, distances = nearest(target_lon_lat, np.array(point_lon_lat, dtype=float).reshape(-1, 2),
+                                 np.arange(len(cases)), point_groups, exclude, k, max_distance_m)
+    lags = np.array(lags, dtype=float).reshape(-1, 2)
+    if not len(lags):
+        return np.full((len(cases), len(NEIGHBOR_FEATURES)), np.nan)
+    values = np.where((indices >= 0)[..., None], lags[np.maximum(indices, 0)], np.nan)  # (cases, k, 2)
+    return weighted_mean(np.moveaxis(values, -1, 0), idw_weights(distances)).T
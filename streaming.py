@@ -0,0 +1,321 @@
+"""
+Stateful streaming forecaster: hourly observations in, updated forecasts out.
+
+main.py forecasts self-contained cases, so a live deployment would have to
+resend every station's whole history and weather each hour to move the
+forecast one hour ahead. StreamingForecaster keeps the state between
+observations instead and reads them as events, one JSON object per line:
+
+    {"type": "pm10", "station_code": "MpKrakAlKras", "timestamp": "2025-01-01T10:00:00", "pm10": 41.2,
+     "longitude": 19.93, "latitude": 50.06}          # coordinates optional
+    {"type": "weather", "DATE": "2025-01-01T10:00:00", "TMP": "+0050,1", "WND": "260,1,N,0030,1", ...}
+
+A weather event is a raw ISD/METAR record like the "weather" records of a
+case. With a "station_code" it only applies to that station, otherwise to
+every station without weather of its own.
+
+Per station the state is a ring buffer of the last two PM10 observations
+(the lags), and per weather feed a ring buffer of the last weather_records
+raw records, preprocessed and indexed once after it changes (a CaseWeather,
+shared by all stations of the feed). Every event re-forecasts the stations it
+affects, 24 hours from the hour after their last observation, in one
+forecast_states call, and yields one {"station_code", "forecast"} line per
+station. A PM10 observation affects its station and, if their model uses
+neighbor features (see spatial.py), the stations within
+spatial.MAX_DISTANCE_M of it. The cost of an update does not depend on how
+much history the stream has seen.
+
+A forecast is the same as forecast_batch on the case made of the station's
+observations (own station first, then the others' last two values) and the
+records in the weather window.
+
+Usage:
+    python main.py live [--events events.jsonl | -] [--follow] [--output-file forecasts.jsonl]
+                        [--model-path ...] [--station-models-dir ...] [--weather-records 48]
+"""
+
+import argparse
+import contextlib
+import json
+import sys
+import time
+from collections import deque
+
+import pandas as pd
+
+import forecast_cache
+import instrumentation
+import weather_cache
+from history import History
+from model_registry import DEFAULT_STATION_MEMORY_MB, StationModelRegistry, load_models
+from prediction import CaseWeather, case_state, forecast_states, uses_neighbor_features
+from spatial import nearest, station_network
+
+DEFAULT_WEATHER_RECORDS = 48  # about a day of half-hourly METAR reports
+
+
+class StationState:
+    """Last two PM10 observations of a station, oldest first, and its coordinates."""
+    __slots__ = ("station_code", "longitude", "latitude", "observations")
+
+    def __init__(self, station_code):
+        self.station_code = station_code
+        self.longitude = None
+        self.latitude = None
+        self.observations = deque(maxlen=2)  # (pd.Timestamp, timestamp string, pm10)
+
+    def observe(self, timestamp, pm10):
+        """
+        Adds an observation; one at the time of the last observation replaces
+        it. Returns False (and keeps the state) for observations older than
+        the last one.
+        """
+        ts = pd.Timestamp(timestamp)
+        if self.observations:
+            last = self.observations[-1][0]
+            if ts < last:
+                return False
+            if ts == last:
+                self.observations.pop()
+        self.observations.append((ts, timestamp, pm10))
+        return True
+
+    @property
+    def ready(self):
+        return len(self.observations) == 2
+
+    def station(self):
+        """The station in the case schema, with its observations as history."""
+        return {"station_code": self.station_code, "longitude": self.longitude, "latitude": self.latitude,
+                "history": [{"timestamp": timestamp, "pm10": pm10} for _, timestamp, pm10 in self.observations]}
+
+
+class WeatherWindow:
+    """The last n raw weather records of a feed, preprocessed once per change."""
+    __slots__ = ("records", "_weather")
+
+    def __init__(self, n=DEFAULT_WEATHER_RECORDS):
+        self.records = deque(maxlen=n)
+        self._weather = None
+
+    def append(self, record):
+        self.records.append(record)
+        self._weather = None
+
+    def weather(self):
+        """CaseWeather of the window (see prediction.CaseWeather)."""
+        if self._weather is None:
+            self._weather = CaseWeather(list(self.records))
+        return self._weather
+
+
+class StreamingForecaster:
+    """
+    Per-station PM10 and per-feed weather state, updated event by event (see
+    the module docstring). model is a model or a StationModelRegistry, as for
+    forecast_batch.
+    """
+    def __init__(self, model, horizon=24, weather_records=DEFAULT_WEATHER_RECORDS):
+        self.model = model
+        self.horizon = horizon
+        self.weather_records = weather_records
+        self.stations = {}  # station_code -> StationState, in order of first observation
+        self.weather_windows = {None: WeatherWindow(weather_records)}  # station_code (None: shared) -> window
+
+    def _station(self, station_code):
+        if station_code not in self.stations:
+            self.stations[station_code] = StationState(station_code)
+        return self.stations[station_code]
+
+    def _window(self, station_code):
+        return self.weather_windows.get(station_code, self.weather_windows[None])
+
+    def _neighbors(self, station_code):
+        """
+        The other ready stations within spatial.MAX_DISTANCE_M of a station
+        whose model uses neighbor features, in order of first observation.
+        """
+        if not isinstance(self.model, StationModelRegistry) and not uses_neighbor_features(self.model):
+            return []
+        codes = list(self.stations)
+        network = station_network()
+        lon_lat = [(station.longitude, station.latitude) if station.longitude is not None
+                   and station.latitude is not None else network.get(code, (float("nan"), float("nan")))
+                   for code, station in self.stations.items()]
+        i = codes.index(station_code)
+        indices, _ = nearest([lon_lat[i]], lon_lat, exclude=[i], k=len(codes))
+        neighbors = [codes[j] for j in sorted(indices[0]) if j >= 0]
+        return [code for code in neighbors if self.stations[code].ready and uses_neighbor_features(
+            self.model.model_for(code) if isinstance(self.model, StationModelRegistry) else self.model)]
+
+    def apply(self, event):
+        """
+        Updates the state with one event and returns the codes of the stations
+        whose forecast it changes. Raises KeyError or ValueError for invalid
+        events.
+        """
+        kind = event.get("type")
+        if kind == "pm10":
+            station = self._station(event["station_code"])
+            # Stations near the old location lose this one as a neighbor
+            moved = []
+            if event.get("longitude") is not None and event.get("latitude") is not None:
+                if (station.longitude, station.latitude) != (event["longitude"], event["latitude"]):
+                    moved = self._neighbors(station.station_code)
+                station.longitude, station.latitude = event["longitude"], event["latitude"]
+            if not station.observe(event["timestamp"], event["pm10"]):
+                instrumentation.count("stale_events")
+                print(f"Warning: Ignoring PM10 of {station.station_code} at {event['timestamp']}, "
+                      f"older than its last observation")
+                return moved
+            return [station.station_code] + moved + self._neighbors(station.station_code)
+        if kind == "weather":
+            station_code = event.get("station_code")
+            record = {key: value for key, value in event.items() if key not in ("type", "station_code")}
+            if station_code is None:
+                self.weather_windows[None].append(record)
+                return [code for code in self.stations if code not in self.weather_windows]
+            if station_code not in self.weather_windows:
+                self.weather_windows[station_code] = WeatherWindow(self.weather_records)
+            self.weather_windows[station_code].append(record)
+            return [station_code]
+        raise ValueError(f"Unknown event type: {kind!r} (expected 'pm10' or 'weather')")
+
+    def case(self, station_code, snapshots=None):
+        """
+        The self-contained case equivalent to the current state of a station.
+        snapshots: StationState.station() of every station, if already built.
+        """
+        station = self.stations[station_code]
+        last = station.observations[-1][0]
+        if snapshots is None:
+            snapshots = {other.station_code: other.station() for other in self.stations.values()}
+        others = [snapshot for code, snapshot in snapshots.items() if code != station_code]
+        return {
+            "case_id": station_code,
+            "stations": [snapshots[station_code]] + others,
+            "target": {"longitude": station.longitude, "latitude": station.latitude,
+                       "prediction_start_time": (last + pd.Timedelta(hours=1)).isoformat()},
+            "weather": list(self._window(station_code).records),
+        }
+
+    def forecast(self, station_codes):
+        """Forecasts the given stations (those with two observations) in one batch."""
+        states = []
+        snapshots = None  # built once, shared by the cases of the batch
+        for code in dict.fromkeys(station_codes):
+            station = self.stations.get(code)
+            if station is None or not station.ready:
+                continue
+            if snapshots is None:
+                snapshots = {other.station_code: other.station() for other in self.stations.values()}
+            # The lags as init_case_state converts them (float32, None as NaN)
+            pm10_lag_1, pm10_lag_2 = History.from_records(snapshots[code]["history"], last=2).lags(2)
+            # The case is only read for neighbor features (see prediction.add_neighbor_features)
+            states.append(case_state(self.case(code, snapshots), code,
+                                     station.observations[-1][0] + pd.Timedelta(hours=1),
+                                     pm10_lag_1, pm10_lag_2, self._window(code).weather()))
+        with instrumentation.timer("stream_forecast"):
+            forecast_states(states, self.model, self.horizon)
+        return [{"station_code": state["station_code"], "forecast": state["forecast"]} for state in states]
+
+    def update(self, events):
+        """
+        Applies events and returns the updated forecasts of the stations they
+        affect, each station forecast once. Invalid events are reported and
+        skipped.
+        """
+        affected = []
+        for event in events:
+            instrumentation.count("events")
+            try:
+                affected.extend(self.apply(event))
+            except (KeyError, TypeError, ValueError) as e:
+                instrumentation.count("event_errors")
+                print(f"[ERROR] Invalid event {event!r}: {type(e).__name__}: {e}")
+        return self.forecast(affected)
+
+    def process(self, event):
+        """Applies one event and returns the updated forecasts it causes."""
+        return self.update([event])
+
+
+def iter_events(f, follow=False, poll_interval=1.0):
+    """
+    Yields the JSON events of a JSONL stream, line by line. With follow the
+    file is tailed like `tail -f`: at its end, new lines are waited for.
+    Lines that are not valid JSON are reported and skipped.
+    """
+    pending = ""
+    while True:
+        line = f.readline()
+        if not line:
+            if not follow:
+                break
+            time.sleep(poll_interval)
+            continue
+        pending += line
+        if not pending.endswith("\n") and follow:
+            continue  # a line still being written
+        line, pending = pending.strip(), ""
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            instrumentation.count("event_errors")
+            print(f"[ERROR] Invalid event line: {e}")
+
+
+def run(forecaster, events, out):
+    """Processes events one at a time, writing each updated forecast as a JSON line to out."""
+    for event in events:
+        for forecast in forecaster.process(event):
+            out.write(json.dumps(forecast) + "\n")
+        out.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update PM10 forecasts from a stream of hourly observations.")
+    parser.add_argument("--events", default="-", help="JSONL file of events (default: - for stdin)")
+    parser.add_argument("--follow", action="store_true", help="Keep reading events appended to --events")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="Seconds between checks for new events with --follow (default: 1)")
+    parser.add_argument("--output-file", default=None, help="Append forecasts to this JSONL file (default: stdout)")
+    parser.add_argument("--model-path", default=None, help="Path to the model (.cbm or .pkl)")
+    parser.add_argument("--station-models-dir", default=None,
+                        help="Directory of per-station models; stations without one use --model-path")
+    parser.add_argument("--station-memory-mb", type=int, default=DEFAULT_STATION_MEMORY_MB,
+                        help=f"Memory budget of loaded station models (default: {DEFAULT_STATION_MEMORY_MB})")
+    parser.add_argument("--weather-records", type=int, default=DEFAULT_WEATHER_RECORDS,
+                        help=f"Weather records kept per feed (default: {DEFAULT_WEATHER_RECORDS})")
+    parser.add_argument("--metrics-file", default=None,
+                        help="Time the updates and write the timers and counters as JSON to this file at the end")
+    args = parser.parse_args(argv)
+
+    if args.metrics_file:
+        instrumentation.enable()
+    # Every weather window is new and every update changes the inputs of the forecasts it
+    # makes, so neither cache would be hit (and the weather would be hashed for nothing)
+    weather_cache.configure(0)
+    forecast_cache.configure(0)
+    model = load_models(args.model_path, args.station_models_dir, args.station_memory_mb)
+    forecaster = StreamingForecaster(model, weather_records=args.weather_records)
+
+    with contextlib.ExitStack() as stack:
+        source = sys.stdin if args.events == "-" else stack.enter_context(open(args.events))
+        out = sys.stdout if args.output_file is None else stack.enter_context(open(args.output_file, "a"))
+        # Log messages go to stderr so that stdout only carries forecasts
+        stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        try:
+            run(forecaster, iter_events(source, args.follow, args.poll_interval), out)
+        except KeyboardInterrupt:
+            pass
+
+    if args.metrics_file:
+        instrumentation.dump(args.metrics_file)
+        print(f"Wrote metrics to: {args.metrics_file}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
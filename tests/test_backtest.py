@@ -0,0 +1,79 @@
+import joblib
+import numpy as np
+import pandas as pd
+
+import backtest
+from main import generate_output
+from tests.test_forecast import LagModel
+
+
+def hourly_pm10(periods=120):
+    hours = pd.date_range("2023-01-01", periods=periods, freq="h")
+    pm10 = pd.DataFrame({"StationA": np.arange(periods, dtype=float), "StationB": 50.0}, index=hours)
+    pm10.loc[hours[30:60], "StationB"] = np.nan
+    return pm10
+
+
+def test_make_cases_rolling_origins():
+    weather = backtest.WeatherReports(pd.DataFrame({
+        "DATE": ["2023-01-02T00:00:00", "2023-01-02T23:30:00", "2023-01-03T00:00:00"],
+        "TMP": ["+0050,1", "+0060,1", np.nan], "WND": ["260,1,N,0030,1", np.nan, "180,1,N,0020,1"]}))
+    cases, actuals = backtest.make_cases(hourly_pm10(), {"StationA": (19.9, 50.0)}, weather,
+                                         start="2023-01-02", step=24, history_hours=6, horizon=24)
+
+    # Origins at 24, 48, 72 and 96 h; StationB has no history before the 48 h origin
+    assert [case["case_id"] for case in cases] == [
+        "StationA_2023-01-02T00:00:00", "StationA_2023-01-03T00:00:00", "StationA_2023-01-04T00:00:00",
+        "StationA_2023-01-05T00:00:00", "StationB_2023-01-02T00:00:00", "StationB_2023-01-04T00:00:00",
+        "StationB_2023-01-05T00:00:00"]
+    assert actuals.shape == (7, 24)
+    np.testing.assert_array_equal(actuals[0], np.arange(24, 48))
+
+    case = cases[0]
+    assert case["target"] == {"longitude": 19.9, "latitude": 50.0, "prediction_start_time": "2023-01-02T00:00:00"}
+    assert case["stations"][0]["history"][-1] == {"timestamp": "2023-01-01T23:00:00", "pm10": 23.0}
+    assert len(case["stations"][0]["history"]) == 6
+    # Only the weather reported before the origin, unless the horizon's weather is asked for
+    assert case["weather"] == []
+    assert cases[1]["weather"] == [{"date": "2023-01-02T00:00:00", "tmp": "+0050,1", "wnd": "260,1,N,0030,1"},
+                                   {"date": "2023-01-02T23:30:00", "tmp": "+0060,1"}]
+    cases, _ = backtest.make_cases(hourly_pm10(), {"StationA": (19.9, 50.0)}, weather, start="2023-01-02",
+                                   step=24, history_hours=6, horizon=24, future_weather=True)
+    assert cases[0]["weather"] == [{"date": "2023-01-02T00:00:00", "tmp": "+0050,1", "wnd": "260,1,N,0030,1"},
+                                   {"date": "2023-01-02T23:30:00", "tmp": "+0060,1"}]
+
+
+def test_make_cases_all_stations():
+    cases, _ = backtest.make_cases(hourly_pm10(), start="2023-01-05", end="2023-01-06", history_hours=6,
+                                   all_stations=True)
+    assert [[s["station_code"] for s in case["stations"]] for case in cases] == [["StationA", "StationB"],
+                                                                                 ["StationB", "StationA"]]
+    assert cases[1]["stations"][1]["history"][-1] == {"timestamp": "2023-01-04T23:00:00", "pm10": 95.0}
+
+
+def test_backtest_scores_generate_output(tmp_path):
+    model_path = str(tmp_path / "model.pkl")
+    joblib.dump(LagModel(), model_path)
+    cases, actuals = backtest.make_cases(hourly_pm10(), {"StationA": (19.9, 50.0), "StationB": (19.9, 50.1)},
+                                         start="2023-01-02", step=24)
+    output = generate_output({"cases": cases}, model_path=model_path)
+    report = backtest.score(cases, output["predictions"], actuals)
+
+    predicted = np.array([[step["pm10_pred"] for step in p["forecast"]] for p in output["predictions"]])
+    errors = predicted - actuals
+    assert report["overall"]["n"] == np.isfinite(errors).sum()
+    assert np.isclose(report["overall"]["mae"], np.nanmean(np.abs(errors)))
+    assert np.isclose(report["horizons"][1]["rmse"], np.sqrt(np.nanmean(errors[:, 0] ** 2)))
+    assert set(report["stations"]) == {"StationA", "StationB"}
+
+
+def test_failing_cases_are_counted_in_process(tmp_path):
+    model_path = str(tmp_path / "model.pkl")
+    joblib.dump(LagModel(), model_path)
+    cases, _ = backtest.make_cases(hourly_pm10(), {"StationA": (19.9, 50.0), "StationB": (19.9, 50.1)},
+                                   start="2023-01-02", step=24)
+    del cases[1]["target"]["prediction_start_time"]
+    predictions = backtest.forecast_cases(cases, workers=1, model_path=model_path)
+    assert [p["case_id"] for p in predictions] == [case["case_id"] for case in cases]
+    assert [("error" in p) for p in predictions] == [i == 1 for i in range(len(cases))]
+    assert predictions[1]["forecast"] == [] and len(predictions[0]["forecast"]) == 24
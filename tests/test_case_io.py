@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from case_io import PredictionWriter, iter_cases
+
+CASES = [
+    {"case_id": "a", "stations": [], "target": {"prediction_start_time": "2025-01-01T00:00:00", "pm10": 1e-7}},
+    {"case_id": "b \"quoted\" ]}", "weather": [{"date": "2025-01-01T00:00:00", "tmp": "+0050,1"}]},
+    {"case_id": "c", "value": 12345678901234567890},
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_iter_cases_json(tmp_path, chunk_size):
+    """Cases are streamed from the "cases" array regardless of chunk boundaries."""
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"meta": {"cases": [0]}, "cases": CASES, "after": [1, 2]}, indent=2))
+    assert list(iter_cases(str(path), chunk_size=chunk_size)) == CASES
+
+
+def test_iter_cases_empty_and_jsonl(tmp_path):
+    empty = tmp_path / "empty.json"
+    empty.write_text('{"cases": []}')
+    assert list(iter_cases(str(empty))) == []
+
+    lines = tmp_path / "cases.jsonl"
+    lines.write_text("\n".join(json.dumps(case) for case in CASES) + "\n\n")
+    assert list(iter_cases(str(lines))) == CASES
+
+
+@pytest.mark.parametrize("predictions", [[], [{"case_id": "a", "forecast": [{"pm10_pred": 1.5}]}] * 3])
+def test_prediction_writer_matches_json_dump(tmp_path, predictions):
+    """Incremental .json output is byte-identical to json.dump(indent=2)."""
+    path = tmp_path / "output.json"
+    with PredictionWriter(str(path)) as writer:
+        for prediction in predictions:
+            writer.write(prediction)
+    assert path.read_text() == json.dumps({"predictions": predictions}, indent=2)
+
+
+@pytest.mark.parametrize("name", ["output.json", "output.jsonl"])
+def test_prediction_writer_leaves_no_output_on_failure(tmp_path, name):
+    path = tmp_path / name
+    with pytest.raises(ValueError):
+        with PredictionWriter(str(path)) as writer:
+            writer.write({"case_id": "a", "forecast": []})
+            raise ValueError("Invalid case file")
+    assert list(tmp_path.iterdir()) == []
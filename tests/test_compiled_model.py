@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import model_registry
+from compiled_model import CompiledModel, compile_model
+
+STATIONS = ["A", "B", "C", "D"]
+
+
+@pytest.fixture(scope="module")
+def trained():
+    from catboost import CatBoostRegressor
+    rng = np.random.default_rng(0)
+    n = 600
+    X = pd.DataFrame({
+        "month": rng.integers(1, 13, n),
+        "hour": rng.integers(0, 24, n),
+        "pm10_lag_1": rng.gamma(2.0, 15.0, n),
+        "station_code": rng.choice(STATIONS, n),
+        "temperature_C": np.where(rng.random(n) < 0.2, np.nan, rng.normal(10, 8, n)),
+    })
+    y = (X["pm10_lag_1"] * 0.8 + X["station_code"].map({"A": 5, "B": -3, "C": 0, "D": 12})
+         + X["temperature_C"].fillna(0) * 0.3 + rng.normal(0, 2, n))
+    model = CatBoostRegressor(iterations=40, depth=4, cat_features=["month", "station_code"], verbose=0,
+                              random_seed=0)
+    model.fit(X, y)
+    return model, X
+
+
+def perturbed(X, seed=1):
+    """Rows with values outside the training data, NaNs and an unknown station."""
+    rng = np.random.default_rng(seed)
+    Y = X.copy()
+    for column in ["hour", "pm10_lag_1", "temperature_C"]:
+        Y[column] = Y[column] * rng.uniform(0.5, 1.5, len(Y))
+        Y.loc[rng.random(len(Y)) < 0.1, column] = np.nan
+    Y.loc[rng.random(len(Y)) < 0.1, "station_code"] = "Unknown"
+    return Y
+
+
+def test_predictions_are_identical(trained):
+    model, X = trained
+    compiled = compile_model(model, {"month": range(1, 13), "station_code": STATIONS})
+    for rows in [X, perturbed(X), X.iloc[:1], perturbed(X).iloc[:7]]:
+        np.testing.assert_array_equal(compiled.predict(rows), model.predict(rows))
+    # Rows of values in feature order, and DataFrames with reordered columns
+    np.testing.assert_array_equal(compiled.predict(X.iloc[:3].to_numpy(dtype=object)), model.predict(X.iloc[:3]))
+    np.testing.assert_array_equal(compiled.predict(X[X.columns[::-1]]), model.predict(X))
+    assert compiled.predict(X.iloc[:0]).shape == (0,)
+
+
+def test_compiled_model_file_roundtrip(trained, tmp_path):
+    model, X = trained
+    cbm_path, npz_path = str(tmp_path / "m.cbm"), str(tmp_path / "m.npz")
+    categories_path = tmp_path / "categories.json"
+    categories_path.write_text('{"station_code": ["A", "B", "C", "D"]}')
+    model.save_model(cbm_path)
+    model_registry.compile_model_file(cbm_path, npz_path, str(categories_path))
+
+    loaded = model_registry.load_model(npz_path)
+    assert isinstance(loaded, CompiledModel)
+    assert loaded.feature_names_ == model.feature_names_
+    assert model_registry.model_fingerprint(loaded) == model_registry.file_sha256(npz_path)
+    np.testing.assert_array_equal(loaded.predict(X), model.predict(X))
+
+
+def test_missing_categories_are_rejected(trained):
+    model, _ = trained
+    with pytest.raises(ValueError, match="station_code"):
+        compile_model(model, {"month": range(1, 13), "station_code": STATIONS[:2]})
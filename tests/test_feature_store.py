@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from feature_store import WEATHER_COLUMNS, FeatureStore
+
+
+def wide_pm10(start, periods, seed=0):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start, periods=periods, freq="h")
+    df = pd.DataFrame({"DateTime": times, "StationA": rng.uniform(5, 80, periods),
+                       "StationB": rng.uniform(5, 80, periods)})
+    df.loc[3, "StationB"] = np.nan
+    return df
+
+
+def test_features_and_lags(tmp_path):
+    wide = wide_pm10("2020-12-31 20:00", 10)
+    # A truncated source timestamp is snapped to its hour
+    wide.loc[5, "DateTime"] = pd.Timestamp("2021-01-01 00:59:59")
+    weather = pd.DataFrame({"DATE": pd.date_range("2020-12-31", periods=48, freq="h"), "temperature_C": np.arange(48.0)})
+    store = FeatureStore(str(tmp_path))
+    store.append(wide, weather)
+
+    assert store.stations == ["StationA", "StationB"]
+    assert store.years("StationA") == [2020, 2021]
+    frame = store.read(stations=["StationB"])
+    assert len(frame) == 9  # the hour without PM10 is left out
+    assert list(frame.columns[:12]) == ["DATE", "year", "month", "day", "hour", "hour_sin", "hour_cos",
+                                        "doy_sin", "doy_cos", "weekday_sin", "weekday_cos", "station_code"]
+
+    pm10 = wide["StationB"].to_numpy()
+    row = frame[frame["DATE"] == pd.Timestamp("2021-01-01 01:00")].iloc[0]
+    assert (row["year"], row["month"], row["day"], row["hour"]) == (2021, 1, 1, 1)
+    assert row["pm10"] == pm10[5]
+    assert row["pm10_lag_1"] == pm10[4]
+    assert np.isnan(row["pm10_lag_2"])  # StationB has no PM10 at 23:00
+    assert row["temperature_C"] == 25.0
+    assert np.isnan(row["wind_speed_raw"])
+    assert set(WEATHER_COLUMNS) <= set(frame.columns)
+
+
+def test_append_matches_full_ingest(tmp_path):
+    wide = wide_pm10("2020-12-31 12:00", 48)
+    full = FeatureStore(str(tmp_path / "full"))
+    full.append(wide)
+
+    incremental = FeatureStore(str(tmp_path / "incremental"))
+    incremental.append(wide.iloc[:10])
+    incremental.append(wide.iloc[10:30])
+    incremental.append(wide.iloc[5:48])  # already stored hours are skipped
+    reopened = FeatureStore(str(tmp_path / "incremental"))
+
+    pd.testing.assert_frame_equal(full.read(dropna=False), reopened.read(dropna=False))
+    assert len(reopened) == 2 * 48
+
+
+def test_append_after_gap_fills_missing_hours(tmp_path):
+    wide = wide_pm10("2021-03-01 00:00", 6)
+    store = FeatureStore(str(tmp_path))
+    store.append(wide.iloc[:3])
+    store.append(wide.iloc[[5]])
+
+    frame = store.read(stations=["StationA"], dropna=False)
+    assert len(frame) == 6
+    assert np.isnan(frame["pm10"].iloc[3:5]).all()
+    assert np.isnan(frame["pm10_lag_1"].iloc[5]) and np.isnan(frame["pm10_lag_2"].iloc[5])
@@ -2,7 +2,8 @@ import pytest
 import pandas as pd
 import numpy as np
 
-from prediction import forecast_with_lag
+from prediction import forecast_with_lag, forecast_batch
+from weather_preprocessing import preprocess_weather
 
 
 # Mock model with feature_names_ to simulate CatBoost
@@ -19,6 +20,14 @@ class DummyModel:
 
 dummy_model = DummyModel()
 
+
+# Mock model whose prediction depends on every row's lags and hour
+class LagModel(DummyModel):
+    def predict(self, X):
+        return (0.5 * X["pm10_lag_1"] + 0.25 * X["pm10_lag_2"] + X["hour"]).to_numpy()
+
+lag_model = LagModel()
+
 # --- Fixtures ---
 @pytest.fixture
 def minimal_case():
@@ -80,3 +89,235 @@ def test_invalid_prediction_time(minimal_case):
     with pytest.raises(ValueError):
         forecast_with_lag(minimal_case, dummy_model)
 
+
+def test_batch_matches_single_case(minimal_case):
+    """Batched forecasts should equal forecasting each case on its own."""
+    other_case = {
+        **minimal_case,
+        "case_id": "case_other",
+        "stations": [{**minimal_case["stations"][0], "history": [
+            {"timestamp": "2025-01-05T10:00:00", "pm10": 10.0},
+            {"timestamp": "2025-01-05T11:00:00", "pm10": 80.0},
+        ]}],
+        "target": {**minimal_case["target"], "prediction_start_time": "2025-01-05T12:00:00"},
+    }
+    cases = [minimal_case, other_case]
+    batched = forecast_batch(cases, lag_model, horizon=24)
+    single = [forecast_with_lag(case, lag_model, horizon=24) for case in cases]
+    assert batched == single
+    assert [result["case_id"] for result in batched] == ["case_test", "case_other"]
+
+
+# --- Reference: the original per-case forecast loop (DataFrame history, pd.to_datetime, one predict per hour) ---
+
+def reference_weather(weather_df, target_timestamp):
+    """The original find_weather_for_timestamp."""
+    if weather_df.empty:
+        return {}
+    weather_df = weather_df.copy()
+    weather_df["DATE"] = pd.to_datetime(weather_df["DATE"])
+    target_timestamp = pd.to_datetime(target_timestamp)
+
+    def average(rows):
+        result = {col: rows[col].mean() for col in rows.select_dtypes(include=[np.number]).columns if col != "DATE"}
+        for col in rows.select_dtypes(exclude=[np.number, "datetime"]).columns:
+            if col != "DATE":
+                result[col] = rows[col].iloc[0]
+        return result
+
+    same_hour_data = weather_df[weather_df["DATE"].dt.hour == target_timestamp.hour]
+    if not same_hour_data.empty:
+        target_date = target_timestamp.date()
+        date_diffs = same_hour_data["DATE"].dt.date.apply(lambda x: abs((x - target_date).days))
+        closest_same_hour = same_hour_data[date_diffs == date_diffs.min()]
+        if len(closest_same_hour) == 1:
+            result = closest_same_hour.iloc[0].to_dict()
+            result.pop("DATE", None)
+            return result
+        return average(closest_same_hour)
+
+    time_diffs = np.abs((weather_df["DATE"] - target_timestamp).dt.total_seconds())
+    closest_indices = np.where(time_diffs == time_diffs.min())[0]
+    if len(closest_indices) == 1:
+        result = weather_df.iloc[closest_indices[0]].to_dict()
+        result.pop("DATE", None)
+        return result
+    return average(weather_df.iloc[closest_indices])
+
+
+def reference_forecast(case, model, horizon=24):
+    """The original forecast_with_lag."""
+    station = case["stations"][0]
+    history = pd.DataFrame(station.get("history", []))
+    history["timestamp"] = pd.to_datetime(history["timestamp"])
+    pm10_lag_1, pm10_lag_2 = history["pm10"].iloc[-1], history["pm10"].iloc[-2]
+    start_time = pd.to_datetime(case["target"]["prediction_start_time"])
+
+    forecast_rows = []
+    for i in range(horizon):
+        ts = start_time + pd.Timedelta(hours=i)
+        hour, weekday, day_of_year = ts.hour, ts.weekday(), ts.dayofyear
+        row = {
+            "DATE": ts, "year": ts.year, "month": ts.month, "day": ts.day, "hour": hour,
+            "hour_sin": np.sin(2 * np.pi * hour / 24), "hour_cos": np.cos(2 * np.pi * hour / 24),
+            "doy_sin": np.sin(2 * np.pi * day_of_year / 365.25), "doy_cos": np.cos(2 * np.pi * day_of_year / 365.25),
+            "weekday_sin": np.sin(2 * np.pi * weekday / 7), "weekday_cos": np.cos(2 * np.pi * weekday / 7),
+            "station_code": station["station_code"], "pm10_lag_1": pm10_lag_1, "pm10_lag_2": pm10_lag_2,
+        }
+        weather_data = case.get("weather", [])
+        if weather_data:
+            weather_df = pd.DataFrame(weather_data).rename(columns={"date": "DATE"})
+            row.update(reference_weather(preprocess_weather(weather_df), ts))
+
+        X_new = pd.DataFrame([row])
+        X_new = X_new[[col for col in model.feature_names_ if col in X_new.columns]]
+        y_pred = model.predict(X_new)[0]
+        pm10_lag_2, pm10_lag_1 = pm10_lag_1, y_pred
+        forecast_rows.append({"timestamp": ts.strftime("%Y-%m-%dT%H:%MZ"), "pm10_pred": float(y_pred)})
+    return {"case_id": case["case_id"], "forecast": forecast_rows}
+
+
+# Mock model depending on every feature, seen as float32 like CatBoost; missing features and NaN count as -1
+class AllFeaturesModel(DummyModel):
+    STATIONS = {"StationX": 3.0, "StationY": -7.0}
+
+    def __init__(self):
+        super().__init__()
+        self.feature_names_ = self.feature_names_ + ["temperature_C", "wind_speed_raw", "wind_dir_sin"]
+
+    def predict(self, X):
+        X = X.reindex(columns=self.feature_names_)
+        prediction = X["station_code"].map(self.STATIONS).to_numpy(dtype=np.float32)
+        numeric = [name for name in self.feature_names_ if name != "station_code"]
+        for weight, name in enumerate(numeric, start=1):
+            values = X[name].to_numpy(dtype=np.float32)
+            prediction += np.float32(weight / 64) * np.where(np.isnan(values), np.float32(-1), values)
+        return prediction.astype(np.float64)
+
+
+def test_batch_matches_the_original_per_case_loop(minimal_case):
+    """Mixed stations, start times, NaN lags and cases without weather, against the original algorithm."""
+    def case(case_id, station_code, history, start, weather):
+        return {**minimal_case, "case_id": case_id, "weather": weather,
+                "stations": [{**minimal_case["stations"][0], "station_code": station_code, "history": [
+                    {"timestamp": ts, "pm10": pm10} for ts, pm10 in history]}],
+                "target": {**minimal_case["target"], "prediction_start_time": start}}
+
+    weather = [{"date": "2025-01-04T10:00:00", "tmp": "+0050,1", "wnd": "260,1,N,0030,1"},
+               {"date": "2025-01-05T10:30:00", "tmp": "+0070,1", "wnd": "180,1,N,0025,1"},
+               {"date": "2025-01-05T13:00:00", "tmp": "-0020,1", "wnd": "090,1,N,0010,1"},
+               {"date": "2025-01-05T13:00:00", "tmp": "+0010,1", "wnd": "999,9,C,0000,1"}]
+    cases = [
+        minimal_case,
+        case("station_y", "StationY", [("2025-01-05T10:00:00", 10.0), ("2025-01-05T11:00:00", 80.0)],
+             "2025-01-05T12:00:00", weather),
+        case("nan_lag", "StationX", [("2025-01-05T09:00:00", None), ("2025-01-05T10:00:00", 35.5)],
+             "2025-01-05T11:00:00", weather),
+        case("no_weather", "StationY", [("2025-03-30T00:00:00", 12.25), ("2025-03-30T01:00:00", 14.0)],
+             "2025-03-30T02:00:00", []),
+    ]
+    model = AllFeaturesModel()
+    assert forecast_batch(cases, model, horizon=30) == [reference_forecast(case, model, horizon=30) for case in cases]
+
+def test_batch_empty():
+    """No cases should give no forecasts."""
+    assert forecast_batch([], lag_model) == []
+
+def test_weather_preprocessed_once_per_case(minimal_case, monkeypatch):
+    """Weather should be preprocessed once per case, not once per forecast hour."""
+    import weather_cache
+    calls = []
+    original = weather_cache.preprocess_weather
+    monkeypatch.setattr(weather_cache, "preprocess_weather", lambda df: calls.append(1) or original(df))
+    monkeypatch.setattr(weather_cache._default, "cache", weather_cache.WeatherCache())
+    forecast_with_lag(minimal_case, dummy_model, horizon=24)
+    assert len(calls) == 1
+
+
+# Mock direct multi-horizon model recording the feature matrix of every call
+class DirectModel(DummyModel):
+    def __init__(self):
+        super().__init__()
+        self.feature_names_ = self.feature_names_ + ["horizon", "temperature_C"]
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(X)
+        return (X["pm10_lag_1"] + X["horizon"]).to_numpy()
+
+def test_direct_model_predicts_all_hours_at_once(minimal_case):
+    """A model with a horizon feature forecasts every hour of every case in one call."""
+    other_case = {**minimal_case, "case_id": "case_other",
+                  "target": {**minimal_case["target"], "prediction_start_time": "2025-03-30T20:00:00"}}
+    model = DirectModel()
+    results = forecast_batch([minimal_case, other_case], model, horizon=6)
+
+    assert len(model.calls) == 1
+    X = model.calls[0]
+    assert list(X.columns) == model.feature_names_ and len(X) == 12
+    assert list(X["horizon"]) == list(range(1, 7)) * 2
+    assert (X["pm10_lag_1"] == 42.0).all() and (X["pm10_lag_2"] == 40.0).all()
+    assert X["temperature_C"].notna().all()
+    assert [step["pm10_pred"] for step in results[0]["forecast"]] == [43.0, 44.0, 45.0, 46.0, 47.0, 48.0]
+    assert results[1]["forecast"][-1]["timestamp"] == "2025-03-31T01:00Z"
+
+    # Calendar features are the same as in the recursive path
+    from prediction import build_feature_row
+    expected = pd.DataFrame([build_feature_row(pd.Timestamp("2025-03-30T20:00:00") + pd.Timedelta(hours=h),
+                                               "StationX", 42.0, 40.0) for h in range(6)])
+    names = model.feature_names_[:13]
+    np.testing.assert_array_equal(X[names].iloc[6:].to_numpy(dtype=object), expected[names].to_numpy(dtype=object))
+
+
+# Mock model using the neighbor features (see spatial.py)
+class NeighborModel(DirectModel):
+    def __init__(self, direct):
+        super().__init__()
+        self.feature_names_ = (self.feature_names_ if direct else DummyModel().feature_names_) + \
+            ["neighbor_pm10_lag_1", "neighbor_pm10_lag_2"]
+
+    def predict(self, X):
+        self.calls.append(X)
+        return X["neighbor_pm10_lag_1"].fillna(-1.0).to_numpy()
+
+@pytest.mark.parametrize("direct", [False, True])
+def test_neighbor_features_come_from_the_other_stations(minimal_case, direct):
+    """Neighbor lags are the other stations' last PM10, fixed over the horizon; NaN without neighbors."""
+    with_neighbor = {**minimal_case, "case_id": "case_neighbor", "stations": minimal_case["stations"] + [{
+        "station_code": "StationY", "longitude": 10.01, "latitude": 50.0,
+        "history": [{"timestamp": "2025-01-01T00:00:00", "pm10": 70.0},
+                    {"timestamp": "2025-01-01T01:00:00", "pm10": 80.0}]}]}
+    model = NeighborModel(direct)
+    results = forecast_batch([minimal_case, with_neighbor], model, horizon=3)
+
+    assert [step["pm10_pred"] for step in results[0]["forecast"]] == [-1.0] * 3
+    assert [step["pm10_pred"] for step in results[1]["forecast"]] == [80.0] * 3
+    assert (pd.concat(model.calls)["neighbor_pm10_lag_2"].dropna() == 70.0).all()
+
+
+# Mock model that also uses a weather feature, and records what it sees
+class WeatherModel(LagModel):
+    def __init__(self):
+        super().__init__()
+        self.feature_names_ = self.feature_names_ + ["temperature_C"]
+        self.frames = []
+
+    def predict(self, X):
+        self.frames.append(X)
+        return super().predict(X)
+
+
+def test_missing_features_are_nan(minimal_case):
+    """A case without weather still gets a forecast; its weather features are NaN."""
+    minimal_case["weather"] = []
+    model = WeatherModel()
+    result = forecast_batch([minimal_case], model, horizon=2)[0]
+    assert len(result["forecast"]) == 2
+    assert list(model.frames[0].columns) == model.feature_names_
+    assert model.frames[0]["temperature_C"].isna().all()
+
+
+def test_prediction_count_must_match_rows(minimal_case):
+    """A model returning fewer predictions than rows is an error, not a silently shorter forecast."""
+    with pytest.raises(ValueError, match="predictions"):
+        forecast_batch([minimal_case, minimal_case], dummy_model, horizon=1)
@@ -0,0 +1,111 @@
+import copy
+
+import numpy as np
+import pytest
+
+import forecast_cache
+import weather_cache
+from forecast_cache import ForecastCache
+from prediction import forecast_batch
+from tests.test_forecast import LagModel, minimal_case  # noqa: F401
+
+
+class CountingModel(LagModel):
+    """LagModel with a fingerprint, counting the rows it predicts."""
+    def __init__(self, fingerprint="model-a"):
+        super().__init__()
+        self.fingerprint = fingerprint
+        self.rows = 0
+
+    def predict(self, X):
+        self.rows += len(X)
+        return super().predict(X)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ForecastCache()
+    monkeypatch.setattr(forecast_cache._default, "cache", cache)
+    monkeypatch.setattr(weather_cache._default, "cache", weather_cache.WeatherCache(memory_mb=0))
+    return cache
+
+
+def variants(case):
+    """Cases that differ from case in one input each."""
+    lag, weather, start = copy.deepcopy(case), copy.deepcopy(case), copy.deepcopy(case)
+    lag["stations"][0]["history"][-1]["pm10"] += 1
+    weather["weather"][0]["tmp"] = "+0060,1"
+    start["target"]["prediction_start_time"] = "2025-01-01T03:00:00"
+    return [lag, weather, start]
+
+
+def test_resubmitted_cases_are_not_forecast_again(cache, minimal_case):
+    model = CountingModel()
+    first = forecast_batch([minimal_case] + variants(minimal_case), model, horizon=3)
+    assert model.rows == 4 * 3 and cache.stats()["misses"] == 4
+
+    resubmitted = copy.deepcopy(minimal_case)
+    resubmitted["case_id"] = "resubmitted"
+    resubmitted["stations"][0]["history"].insert(0, {"timestamp": "2024-12-31T23:00:00", "pm10": 1.0})
+    again = forecast_batch([resubmitted] + variants(minimal_case), model, horizon=3)
+    assert model.rows == 4 * 3 and cache.stats()["hits"] == 4
+    assert [r["forecast"] for r in again] == [r["forecast"] for r in first]
+    assert again[0]["case_id"] == "resubmitted"
+
+    # Another model, or another horizon, is another forecast
+    forecast_batch([minimal_case], CountingModel("model-b"), horizon=3)
+    forecast_batch([minimal_case], model, horizon=2)
+    assert cache.stats()["misses"] == 6
+
+
+def test_models_without_fingerprint_are_not_cached(cache, minimal_case):
+    model = LagModel()
+    forecast_batch([minimal_case], model, horizon=3)
+    forecast_batch([minimal_case], model, horizon=3)
+    assert cache.stats() == ForecastCache().stats()
+
+
+def test_sqlite_store_is_shared_across_instances(cache, minimal_case, tmp_path, monkeypatch):
+    path = str(tmp_path / "forecasts.sqlite")
+    monkeypatch.setattr(forecast_cache._default, "cache", ForecastCache(path=path))
+    expected = forecast_batch([minimal_case], CountingModel(), horizon=4)
+
+    reloaded = ForecastCache(memory_mb=0, path=path)
+    monkeypatch.setattr(forecast_cache._default, "cache", reloaded)
+    preprocessed = []
+    monkeypatch.setattr(weather_cache, "build_index", lambda data: preprocessed.append(1))
+    model = CountingModel()
+    assert forecast_batch([minimal_case], model, horizon=4) == expected
+    assert model.rows == 0 and not preprocessed  # neither forecast nor weather preprocessing
+    assert reloaded.stats()["disk_hits"] == 1
+
+
+def test_lru_eviction_within_budget():
+    forecast = [{"timestamp": "2025-01-01T00:00Z", "pm10_pred": 1.0}] * 24
+    size = forecast_cache._ROW_BYTES * len(forecast)
+    cache = ForecastCache(memory_mb=2.5 * size / (1024 * 1024))
+    cache.put_many({"a": forecast, "b": forecast, "c": forecast})
+    assert cache.get_many(["a", "b", "c"]) == [None, forecast, forecast]
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1 and stats["bytes"] <= 2.5 * size
+
+
+def test_forecast_key_covers_the_inputs(minimal_case):
+    from prediction import init_case_state
+    state = init_case_state(minimal_case)
+    key = forecast_cache.forecast_key(state, "model-a", 24)
+    assert forecast_cache.forecast_key(init_case_state(copy.deepcopy(minimal_case)), "model-a", 24) == key
+    for name, value in [("pm10_lag_1", np.float32(1)), ("station_code", "Other"), ("neighbors", {"x": 1.0})]:
+        assert forecast_cache.forecast_key({**state, name: value}, "model-a", 24) != key
+    assert forecast_cache.forecast_key(state, "model-a", 12) != key
+
+
+def test_output_rows_are_not_shared_with_the_cache(cache, minimal_case):
+    model = CountingModel()
+    first = forecast_batch([minimal_case], model, horizon=3)
+    expected = copy.deepcopy(first)
+    first[0]["forecast"][0]["pm10_pred"] = -1.0
+    second = forecast_batch([minimal_case], model, horizon=3)
+    assert second == expected and model.rows == 3
+    second[0]["forecast"][1]["pm10_pred"] = -1.0
+    assert forecast_batch([minimal_case], model, horizon=3) == expected
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from history import History, parse_timestamp
+from prediction import init_case_state
+
+
+def pandas_seconds(timestamp):
+    ts = pd.Timestamp(timestamp)
+    return (ts.tz_convert("UTC").tz_localize(None) if ts.tzinfo else ts).value // 10 ** 9
+
+
+def test_parse_timestamp_matches_pandas():
+    timestamps = ["2025-01-01T00:00:00", "2024-02-29T23:59:59", "1969-12-31T23:00:00", "2023-06-01 12:30:00",
+                  "2023-06-01T12:30", "2023-06-01T12:30:00Z", "2023-06-01T12:30:00+02:00",
+                  "2023-06-01T12:30-01:30", "2023-06-01", "2023-06-01T12:30:00.500"]
+    assert [parse_timestamp(ts) for ts in timestamps] == [pandas_seconds(ts) for ts in timestamps]
+
+
+@pytest.mark.parametrize("timestamp", ["not-a-date", "2023-02-29T00:00:00", "2023-13-01T00:00:00",
+                                       "2023-01-01T24:00:00", None])
+def test_invalid_timestamps_fail_the_history(timestamp):
+    with pytest.raises(ValueError):
+        History.from_records([{"timestamp": "2023-01-01T00:00:00", "pm10": 1.0}, {"timestamp": timestamp, "pm10": 2.0}])
+
+
+def test_history_from_records():
+    records = [{"timestamp": f"2025-01-01T0{h}:00:00", "pm10": value}
+               for h, value in enumerate([10.5, None, 30.25, 40.0])]
+    history = History.from_records(records)
+    assert history.values.dtype == np.float32
+    assert np.isnan(history.values[1])
+    assert history.lags(2).tolist() == [40.0, 30.25]
+    assert History.from_records(records, last=2).values.tolist() == history.values[-2:].tolist()
+    with pytest.raises(IndexError):
+        History.from_records([{"timestamp": "2025-01-01T00:00:00"}])
+
+
+def test_long_history_uses_the_last_points():
+    """Five years of hourly history: the lags are the last two records."""
+    times = pd.date_range("2020-01-01", periods=5 * 8760, freq="h").strftime("%Y-%m-%dT%H:%M:%S")
+    history = [{"timestamp": ts, "pm10": float(i % 97)} for i, ts in enumerate(times)]
+    case = {"case_id": "long", "stations": [{"station_code": "StationX", "history": history}],
+            "target": {"prediction_start_time": "2025-01-01T00:00:00"}}
+    state = init_case_state(case)
+    assert (state["pm10_lag_1"], state["pm10_lag_2"]) == (float((len(times) - 1) % 97), float((len(times) - 2) % 97))
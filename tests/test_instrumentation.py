@@ -0,0 +1,78 @@
+import joblib
+import pytest
+
+import instrumentation
+import main
+import weather_cache
+from prediction import forecast_batch
+from tests.test_forecast import LagModel, lag_model, minimal_case  # noqa: F401
+
+
+@pytest.fixture
+def metrics():
+    instrumentation.reset()
+    instrumentation.enable()
+    yield instrumentation
+    instrumentation.enable(False)
+    instrumentation.reset()
+
+
+def test_disabled_records_nothing():
+    instrumentation.reset()
+    with instrumentation.timer("stage"):
+        instrumentation.count("events")
+    assert instrumentation.report() == {"timers": {}, "counters": {}}
+    assert instrumentation.drain() is None
+
+
+def test_histogram_percentiles():
+    histogram = instrumentation.Histogram()
+    for ms in range(1, 101):
+        histogram.add(ms / 1000)
+    summary = histogram.to_dict()
+    assert summary["count"] == 100
+    assert summary["min_ms"] == pytest.approx(1) and summary["max_ms"] == pytest.approx(100)
+    # Percentiles are bucket upper bounds, 10 buckets per decade
+    assert 50 <= summary["p50_ms"] <= 50 * 10 ** 0.1
+    assert 99 <= summary["p99_ms"] <= 100
+    assert sum(summary["buckets_ms"].values()) == 100
+
+
+def test_drain_and_merge(metrics):
+    with metrics.timer("stage"):
+        pass
+    metrics.count("events", 3)
+    collected = metrics.drain()
+    assert metrics.report() == {"timers": {}, "counters": {}}
+
+    metrics.count("events")
+    metrics.merge(collected)
+    metrics.merge(collected)
+    report = metrics.report()
+    assert report["counters"] == {"events": 7}
+    assert report["timers"]["stage"]["count"] == 2
+
+
+def test_forecast_records_stages(metrics, minimal_case, monkeypatch):
+    monkeypatch.setattr(weather_cache._default, "cache", weather_cache.WeatherCache())
+    forecast_batch([minimal_case], lag_model, horizon=3)
+    report = metrics.report()
+    assert {"history_parse", "weather_preprocess", "feature_assembly", "model_predict"} <= set(report["timers"])
+    assert report["counters"]["cases"] == 1
+    assert report["counters"]["predict_calls"] == 3
+    assert report["counters"]["predict_rows"] == 3
+
+
+def test_worker_metrics_are_merged(metrics, minimal_case, tmp_path):
+    """Timers and counters of worker processes end up in the parent's report."""
+    model_path = str(tmp_path / "model.pkl")
+    joblib.dump(LagModel(), model_path)
+    metrics.count("parent_events")  # not sent back again by forked workers
+    output = main.generate_output({"cases": [minimal_case] * 4}, forecast_hours=3, batch_size=2, workers=2,
+                                  model_path=model_path)
+    assert len(output["predictions"]) == 4
+    report = metrics.report()
+    assert report["counters"]["cases"] == 4
+    assert report["counters"]["parent_events"] == 1
+    assert report["counters"]["stations"] == 4
+    assert report["timers"]["model_predict"]["count"] == 6
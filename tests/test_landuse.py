@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from landuse import LanduseIndex, LanduseRaster
+
+# A residential square (closed way) and a forest square with a hole (multipolygon relation)
+OSM = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6" generator="test">
+  <node id="1" version="1" lat="50.000" lon="10.000"/>
+  <node id="2" version="1" lat="50.000" lon="10.100"/>
+  <node id="3" version="1" lat="50.100" lon="10.100"/>
+  <node id="4" version="1" lat="50.100" lon="10.000"/>
+  <node id="11" version="1" lat="50.000" lon="11.000"/>
+  <node id="12" version="1" lat="50.000" lon="11.100"/>
+  <node id="13" version="1" lat="50.100" lon="11.100"/>
+  <node id="14" version="1" lat="50.100" lon="11.000"/>
+  <node id="21" version="1" lat="50.040" lon="11.040"/>
+  <node id="22" version="1" lat="50.040" lon="11.060"/>
+  <node id="23" version="1" lat="50.060" lon="11.060"/>
+  <node id="24" version="1" lat="50.060" lon="11.040"/>
+  <way id="100" version="1"><nd ref="1"/><nd ref="2"/><nd ref="3"/><nd ref="4"/><nd ref="1"/>
+    <tag k="landuse" v="residential"/></way>
+  <way id="101" version="1"><nd ref="11"/><nd ref="12"/><nd ref="13"/><nd ref="14"/><nd ref="11"/></way>
+  <way id="102" version="1"><nd ref="21"/><nd ref="22"/><nd ref="23"/><nd ref="24"/><nd ref="21"/></way>
+  <relation id="200" version="1">
+    <member type="way" ref="101" role="outer"/><member type="way" ref="102" role="inner"/>
+    <tag k="type" v="multipolygon"/><tag k="landuse" v="forest"/>
+  </relation>
+</osm>
+"""
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    path = tmp_path_factory.mktemp("landuse") / "landuse.osm"
+    path.write_text(OSM)
+    return LanduseIndex.from_file(str(path))
+
+
+def test_reads_ways_and_relations(index):
+    assert len(index) == 2
+    assert (index.n_ways, index.n_relations) == (1, 1)
+    assert index.classes == ["residential", "forest"]
+
+
+def test_fractions_inside_and_on_edge(index):
+    """A disk inside the square is fully covered; a disk centered on its edge is half covered."""
+    assert index.fractions(50.05, 10.05, radius_m=1000) == {"residential": 1.0}
+    assert index.fractions(50.05, 10.10, radius_m=1000)["residential"] == pytest.approx(0.5, abs=0.02)
+    assert index.fractions(40.0, 10.05, radius_m=1000) == {}
+
+
+def test_fractions_respect_holes(index):
+    """Inner rings of a multipolygon are not covered."""
+    assert index.fractions(50.05, 11.05, radius_m=500) == {}
+    # Disk of 2 km minus the ~0.02 x 0.02 degree hole
+    hole = (0.02 * 111320 * np.cos(np.radians(50.05))) * (0.02 * 111320)
+    expected = 1 - hole / (np.pi * 2000 ** 2)
+    assert index.fractions(50.05, 11.05, radius_m=2000)["forest"] == pytest.approx(expected, abs=0.03)
+
+
+def test_fractions_many_matches_single(index):
+    points = [(50.05, 10.05), (50.05, 11.05), (50.0, 10.5)]
+    shares = index.fractions_many(points, radius_m=2000)
+    assert shares.shape == (3, 2)
+    for row, (lat, lon) in zip(shares, points):
+        np.testing.assert_array_equal(row, index.fractions_array(lat, lon, radius_m=2000))
+
+
+def test_cache_is_memory_mapped_on_second_load(tmp_path, monkeypatch):
+    """The second load of the same PBF content reads the cache, not the PBF."""
+    path = tmp_path / "landuse.osm"
+    path.write_text(OSM)
+    cache_dir = str(tmp_path / "cache")
+    parsed = LanduseIndex.load(str(path), cache_dir)
+
+    monkeypatch.setattr(LanduseIndex, "from_file", classmethod(lambda cls, *args: pytest.fail("PBF re-read")))
+    cached = LanduseIndex.load(str(path), cache_dir)
+    assert isinstance(cached.vertices, np.memmap)
+    assert cached.classes == parsed.classes
+    assert (cached.n_ways, cached.n_relations) == (parsed.n_ways, parsed.n_relations)
+    np.testing.assert_array_equal(cached.fractions_array(50.05, 11.05, 2000),
+                                  parsed.fractions_array(50.05, 11.05, 2000))
+
+
+def test_cache_is_keyed_on_content(tmp_path):
+    """Changing the file content (or the settings) gives a new cache entry."""
+    path = tmp_path / "landuse.osm"
+    path.write_text(OSM)
+    cache_dir = str(tmp_path / "cache")
+    assert LanduseIndex.load(str(path), cache_dir).classes == ["residential", "forest"]
+
+    path.write_text(OSM.replace('v="forest"', 'v="farmland"'))
+    assert LanduseIndex.load(str(path), cache_dir).classes == ["residential", "farmland"]
+    LanduseIndex.load(str(path), cache_dir, cell_size=0.05)
+    entries = [name for name in (tmp_path / "cache").iterdir() if name.is_dir()]
+    assert len(entries) == 3
+
+
+def test_raster_lookup(index, tmp_path):
+    """Raster cells hold per-cell class shares; a saved raster is memory-mapped back."""
+    raster = LanduseRaster.build(index, bbox=(9.9, 49.9, 11.2, 50.2), resolution_m=200)
+    path = str(tmp_path / "raster.npy")
+    raster.save(path)
+    opened = LanduseRaster.open(path)
+    assert isinstance(opened.shares, np.memmap)
+
+    shares = opened.lookup([50.05, 50.05, 50.05, 40.0], [10.05, 11.02, 11.05, 10.05])
+    np.testing.assert_array_equal(shares[0], [1.0, 0.0])   # residential
+    np.testing.assert_array_equal(shares[1], [0.0, 1.0])   # forest
+    np.testing.assert_array_equal(shares[2], [0.0, 0.0])   # hole in the forest
+    assert np.isnan(shares[3]).all()                       # outside the raster
+    case = {"target": {"latitude": 50.05, "longitude": 10.05}}
+    np.testing.assert_array_equal(opened.features_for_cases([case]), shares[:1])
+
+
+def test_raster_with_radius_matches_index(index):
+    """A raster built with a radius approximates the index's shares within that radius."""
+    raster = LanduseRaster.build(index, bbox=(9.9, 49.9, 11.2, 50.2), resolution_m=100, radius_m=2000)
+    for lat, lon in [(50.05, 11.05), (50.05, 10.10)]:
+        np.testing.assert_allclose(raster.lookup([lat], [lon])[0], index.fractions_array(lat, lon, 2000), atol=0.03)
@@ -0,0 +1,18 @@
+import copy
+
+import main
+from tests.test_forecast import lag_model, minimal_case  # noqa: F401
+
+
+def test_forecast_chunk_isolates_failing_case(minimal_case, monkeypatch):
+    """A failing case becomes an error entry; the other cases are still forecast."""
+    monkeypatch.setattr(main, "_worker_model", lag_model)
+    broken = copy.deepcopy(minimal_case)
+    broken["case_id"] = "case_broken"
+    broken["stations"][0]["history"] = []
+
+    results = main._forecast_chunk([minimal_case, broken], forecast_hours=3)
+
+    assert [result["case_id"] for result in results] == ["case_test", "case_broken"]
+    assert len(results[0]["forecast"]) == 3
+    assert results[1]["error"].startswith("IndexError")
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "notebooks"))
+from merging_data import merge_hourly_reports  # noqa: E402
+
+
+def reports(rows):
+    df = pd.DataFrame(rows, columns=["STATION", "DATE", "REPORT_TYPE", "temperature_C", "SLP_hpa", "GA1_type"])
+    df["DATE"] = pd.to_datetime(df["DATE"])
+    return df
+
+
+def test_merges_reports_of_the_same_hour():
+    df = reports([
+        [1, "2020-01-01 01:00", "FM-15", 1.0, np.nan, None],
+        [1, "2020-01-01 00:00", "FM-15", 2.0, np.nan, None],
+        [1, "2020-01-01 00:00", "FM-12", 4.0, np.nan, "07"],
+        [1, "2020-01-01 00:00", "FM-15", np.nan, np.nan, "03"],
+    ])
+    merged = merge_hourly_reports(df)
+
+    assert list(merged.index) == [1, 0]  # sorted by hour, index of the first report
+    first = merged.loc[1]
+    assert first["REPORT_TYPE"] == "FM-12+FM-15"
+    assert first["temperature_C"] == 3.0
+    assert np.isnan(first["SLP_hpa"])
+    assert first["GA1_type"] == "07"
+    # A single report is kept as it is
+    assert merged.loc[0, "REPORT_TYPE"] == "FM-15"
+    assert merged.loc[0, "temperature_C"] == 1.0
+
+
+def test_merges_per_station():
+    df = reports([
+        [2, "2020-01-01 00:00", "FM-15", 2.0, 1000.0, None],
+        [1, "2020-01-01 00:00", "FM-15", 6.0, 1010.0, None],
+        [1, "2020-01-01 00:00", "FM-12", 8.0, 1020.0, None],
+    ])
+    merged = merge_hourly_reports(df, by=["STATION"])
+
+    assert list(merged["STATION"]) == [1, 2]
+    assert list(merged["temperature_C"]) == [7.0, 2.0]
+    assert list(merged["REPORT_TYPE"]) == ["FM-12+FM-15", "FM-15"]
+    assert len(merge_hourly_reports(df)) == 1
@@ -0,0 +1,97 @@
+import copy
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import model_registry
+from tests.test_forecast import DummyModel, minimal_case  # noqa: F401
+
+
+def test_model_is_cached_by_path_and_mtime(tmp_path):
+    """The same file is read once; touching it triggers a reload."""
+    path = str(tmp_path / "model.pkl")
+    joblib.dump(DummyModel(), path)
+
+    first = model_registry.load_model(path)
+    assert model_registry.load_model(path) is first
+
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    assert model_registry.load_model(path) is not first
+
+
+def test_import_does_not_load_model(monkeypatch):
+    """Importing prediction must not read any model file."""
+    import importlib
+    import prediction
+    monkeypatch.setattr(model_registry, "_read_model", lambda path: (_ for _ in ()).throw(AssertionError(path)))
+    importlib.reload(prediction)
+
+
+def test_cbm_export_roundtrip(tmp_path):
+    """A pickled CatBoost model exported to .cbm predicts the same."""
+    from catboost import CatBoostRegressor
+    X = pd.DataFrame({"a": np.arange(50.0), "station_code": ["x", "y"] * 25})
+    model = CatBoostRegressor(iterations=5, cat_features=["station_code"], verbose=0)
+    model.fit(X, np.arange(50.0))
+    pkl_path, cbm_path = str(tmp_path / "m.pkl"), str(tmp_path / "m.cbm")
+    joblib.dump(model, pkl_path)
+
+    model_registry.export_cbm(pkl_path, cbm_path)
+    loaded = model_registry.load_model(cbm_path)
+    np.testing.assert_array_equal(loaded.predict(X), model.predict(X))
+
+
+class ConstantModel(DummyModel):
+    """Predicts a constant and records the batch size of every call."""
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(len(X))
+        return np.full(len(X), self.value)
+
+
+def test_station_registry_lru_and_fallback(tmp_path):
+    stations_dir = tmp_path / "stations"
+    stations_dir.mkdir()
+    for i, station in enumerate(["A", "B", "C"]):
+        joblib.dump(ConstantModel(i), str(stations_dir / f"{station}.pkl"))
+    joblib.dump(ConstantModel(-1), str(tmp_path / "global.pkl"))
+    size = os.path.getsize(stations_dir / "A.pkl")
+
+    registry = model_registry.StationModelRegistry(str(stations_dir), str(tmp_path / "global.pkl"),
+                                                   memory_budget_mb=2.5 * size / 2**20)
+    a = registry.model_for("A")
+    assert registry.model_for("A") is a
+    registry.model_for("B")
+    registry.model_for("C")  # evicts A, the least recently used
+    assert registry.stats()["evictions"] == 1 and registry.stats()["loaded"] == 2
+    assert registry.model_for("A") is not a
+    assert registry.model_for("unknown").value == -1
+
+
+def test_forecast_batch_calls_each_model_once_per_step(tmp_path, minimal_case):
+    from prediction import forecast_batch
+
+    stations_dir = tmp_path / "stations"
+    stations_dir.mkdir()
+    joblib.dump(ConstantModel(1.0), str(stations_dir / "A.pkl"))
+    joblib.dump(ConstantModel(2.0), str(tmp_path / "global.pkl"))
+    registry = model_registry.StationModelRegistry(str(stations_dir), str(tmp_path / "global.pkl"))
+
+    cases = []
+    for i, station in enumerate(["A", "B", "A"]):
+        case = copy.deepcopy(minimal_case)
+        case["case_id"] = f"c{i}"
+        case["stations"][0]["station_code"] = station
+        cases.append(case)
+    results = forecast_batch(cases, registry, horizon=3)
+
+    assert [r["forecast"][0]["pm10_pred"] for r in results] == [1.0, 2.0, 1.0]
+    assert registry.model_for("A").calls == [2, 2, 2]
+    assert registry.model_for("B").calls == [1, 1, 1]
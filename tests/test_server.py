@@ -0,0 +1,91 @@
+import copy
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from prediction import forecast_batch
+from server import make_server
+from tests.test_forecast import lag_model, minimal_case  # noqa: F401
+
+
+@pytest.fixture
+def server():
+    server = make_server(lag_model, port=0, forecast_hours=3, max_wait_ms=50)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _request(server, path, payload=None):
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    data = json.dumps(payload).encode() if payload is not None else None
+    with urllib.request.urlopen(urllib.request.Request(url, data=data)) as response:
+        return json.loads(response.read())
+
+
+def test_concurrent_requests_match_batch_forecast(server, minimal_case):
+    """Concurrent single-case requests are micro-batched and give the same forecasts."""
+    cases = []
+    for i in range(8):
+        case = copy.deepcopy(minimal_case)
+        case["case_id"] = f"case_{i}"
+        case["stations"][0]["history"][1]["pm10"] = 10.0 * i
+        cases.append(case)
+
+    responses = [None] * len(cases)
+    def post(i):
+        responses[i] = _request(server, "/forecast", {"cases": [cases[i]]})["predictions"][0]
+    threads = [threading.Thread(target=post, args=(i,)) for i in range(len(cases))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert responses == forecast_batch(cases, lag_model, horizon=3)
+    metrics = _request(server, "/metrics")
+    assert metrics["requests"] == 8
+    assert metrics["cases"] == 8
+    assert metrics["batches"] < 8
+
+
+def test_bad_request_does_not_fail_others(server, minimal_case):
+    """An invalid case gets a 400 response; the server keeps answering."""
+    broken = copy.deepcopy(minimal_case)
+    broken["stations"][0]["history"] = []
+    with pytest.raises(urllib.error.HTTPError) as excinfo:
+        _request(server, "/forecast", {"cases": [broken]})
+    assert excinfo.value.code == 400
+
+    result = _request(server, "/forecast", {"cases": [minimal_case]})
+    assert len(result["predictions"][0]["forecast"]) == 3
+    assert _request(server, "/metrics")["failed_requests"] == 1
+
+
+class FailingModel:
+    feature_names_ = lag_model.feature_names_
+
+    def predict(self, X):
+        raise RuntimeError("Model failed")
+
+
+def test_forecast_failure_is_a_server_error(minimal_case):
+    server = make_server(FailingModel(), port=0, forecast_hours=3, max_wait_ms=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            _request(server, "/forecast", {"cases": [minimal_case]})
+        assert excinfo.value.code == 500
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            _request(server, "/forecast", {"not_cases": []})
+        assert excinfo.value.code == 400
+        metrics = _request(server, "/metrics")
+        assert metrics["failed_requests"] == 2 and metrics["server_errors"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
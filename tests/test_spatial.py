@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import spatial
+
+
+def haversine_m(a, b):
+    (lon1, lat1), (lon2, lat2) = np.radians(a), np.radians(b)
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * spatial.EARTH_RADIUS_M * np.arcsin(np.sqrt(h))
+
+
+def station(code, lon, lat, *pm10):
+    history = [{"timestamp": f"2025-01-01T0{i}:00:00", "pm10": value} for i, value in enumerate(pm10)]
+    return {"station_code": code, "longitude": lon, "latitude": lat, "history": history}
+
+
+def test_nearest_matches_haversine_and_stays_in_group():
+    points = [(19.90, 50.00), (19.95, 50.05), (20.00, 50.10), (19.90, 50.00)]
+    indices, distances = spatial.nearest([(19.91, 50.01), (19.91, 50.01)], points, target_groups=[0, 1],
+                                         point_groups=[0, 0, 0, 1], k=2)
+    assert indices.tolist() == [[0, 1], [3, -1]]
+    assert distances[0, 0] == pytest.approx(haversine_m((19.91, 50.01), points[0]), rel=1e-9)
+    assert distances[0, 1] == pytest.approx(haversine_m((19.91, 50.01), points[1]), rel=1e-9)
+    assert distances[1, 1] == np.inf
+
+
+def test_nearest_exclude_and_max_distance():
+    points = [(19.90, 50.00), (19.95, 50.05), (21.00, 51.00)]
+    indices, _ = spatial.nearest([(19.90, 50.00)], points, exclude=[0], k=3, max_distance_m=20_000)
+    assert indices.tolist() == [[1, -1, -1]]
+
+
+def test_neighbor_lags_are_inverse_distance_weighted():
+    target = (19.90, 50.00)
+    near, far = (19.92, 50.00), (19.90, 50.05)
+    case = {
+        "stations": [station("Own", *target, 1.0, 2.0), station("Near", *near, 10.0, 20.0),
+                     station("Far", *far, 30.0, 40.0)],
+        "target": {"longitude": target[0], "latitude": target[1]},
+    }
+    w_near, w_far = haversine_m(target, near) ** -2, haversine_m(target, far) ** -2
+    expected_lag_1 = (w_near * 20.0 + w_far * 40.0) / (w_near + w_far)  # last history value
+    expected_lag_2 = (w_near * 10.0 + w_far * 30.0) / (w_near + w_far)
+    lonely = {"stations": [station("Own", *target, 1.0, 2.0)], "target": {}}
+
+    lags = spatial.neighbor_lags([case, lonely], network={})
+    assert lags[0] == pytest.approx([expected_lag_1, expected_lag_2], rel=1e-9)
+    assert np.isnan(lags[1]).all()
+
+
+def test_neighbor_lags_place_stations_with_the_network():
+    """Stations and targets without coordinates use the fixed network (and the first station)."""
+    case = {"stations": [station("A", None, None, 5.0, 6.0), station("B", None, None, 7.0, 8.0)], "target": {}}
+    lags = spatial.neighbor_lags([case], network={"A": (19.9, 50.0), "B": (19.95, 50.05)})
+    assert lags.tolist() == [[8.0, 7.0]]
+    assert np.isnan(spatial.neighbor_lags([case], network={})).all()
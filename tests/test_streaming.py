@@ -0,0 +1,121 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+from prediction import forecast_batch
+from streaming import StreamingForecaster, iter_events, run
+from tests.test_forecast import LagModel, NeighborModel
+
+
+# Mock model that also uses the weather
+class WeatherLagModel(LagModel):
+    def __init__(self):
+        super().__init__()
+        self.feature_names_ = self.feature_names_ + ["temperature_C"]
+
+    def predict(self, X):
+        return super().predict(X) + X["temperature_C"].fillna(0).to_numpy()
+
+
+weather_lag_model = WeatherLagModel()
+
+
+def pm10(code, hour, value):
+    return {"type": "pm10", "station_code": code, "timestamp": f"2025-01-01T{hour:02d}:00:00", "pm10": value}
+
+
+def weather(hour, temperature, station_code=None):
+    event = {"type": "weather", "date": f"2025-01-01T{hour:02d}:00:00", "tmp": f"+{temperature:04d},1",
+             "wnd": "260,1,N,0030,1"}
+    if station_code:
+        event["station_code"] = station_code
+    return event
+
+
+def test_updates_match_batch_forecast_of_the_equivalent_case():
+    forecaster = StreamingForecaster(weather_lag_model, horizon=6, weather_records=3)
+    events = [weather(0, 50), pm10("A", 0, 10.0), pm10("B", 0, 20.0), pm10("A", 1, 12.0), weather(1, 60),
+              pm10("B", 1, 22.0), weather(2, 70), weather(3, 80), pm10("A", 2, None), weather(3, 10, "B"),
+              pm10("B", 2, 25.0)]
+    for event in events:
+        for update in forecaster.process(event):
+            expected = forecast_batch([forecaster.case(update["station_code"])], weather_lag_model, horizon=6)[0]
+            pd.testing.assert_frame_equal(pd.DataFrame(update["forecast"]), pd.DataFrame(expected["forecast"]))
+
+    # Only the last 3 weather records are kept; B has a weather feed of its own
+    assert [record["date"] for record in forecaster.case("A")["weather"]] == [
+        "2025-01-01T01:00:00", "2025-01-01T02:00:00", "2025-01-01T03:00:00"]
+    assert forecaster.case("B")["weather"] == [{key: value for key, value in weather(3, 10).items() if key != "type"}]
+    assert forecaster.case("B")["target"]["prediction_start_time"] == "2025-01-01T03:00:00"
+
+
+def test_events_affect_the_right_stations():
+    forecaster = StreamingForecaster(weather_lag_model, horizon=3)
+    assert forecaster.process(pm10("A", 0, 10.0)) == []  # a single observation is not enough
+    assert [u["station_code"] for u in forecaster.process(pm10("A", 1, 12.0))] == ["A"]
+    forecaster.process(pm10("B", 0, 20.0))
+    forecaster.process(pm10("B", 1, 21.0))
+    assert [u["station_code"] for u in forecaster.process(weather(1, 50))] == ["A", "B"]
+    assert [u["station_code"] for u in forecaster.process(weather(1, 50, "B"))] == ["B"]
+    assert [u["station_code"] for u in forecaster.process(weather(2, 50))] == ["A"]
+    # Many events update every station once
+    assert [u["station_code"] for u in forecaster.update([pm10("A", 2, 1.0), pm10("A", 3, 2.0),
+                                                          pm10("B", 2, 3.0)])] == ["A", "B"]
+
+
+def test_corrections_stale_and_invalid_events():
+    forecaster = StreamingForecaster(weather_lag_model, horizon=1)
+    forecaster.update([pm10("A", 0, 10.0), pm10("A", 1, 12.0)])
+    corrected = forecaster.process(pm10("A", 1, 14.0))[0]["forecast"][0]
+    assert corrected == {"timestamp": "2025-01-01T02:00Z", "pm10_pred": 0.5 * 14.0 + 0.25 * 10.0 + 2}
+    assert forecaster.process(pm10("A", 0, 99.0)) == []  # older than the last observation
+    assert forecaster.process({"type": "pm10", "station_code": "A"}) == []
+    assert forecaster.process({"type": "unknown"}) == []
+    assert forecaster.process(pm10("A", 2, 16.0))[0]["forecast"][0]["pm10_pred"] == 0.5 * 16.0 + 0.25 * 14.0 + 3
+
+
+def test_state_does_not_grow_with_the_stream():
+    forecaster = StreamingForecaster(weather_lag_model, horizon=1, weather_records=4)
+    times = pd.date_range("2025-01-01", periods=100, freq="h").strftime("%Y-%m-%dT%H:%M:%S")
+    for i, ts in enumerate(times):
+        forecaster.update([{"type": "weather", "date": ts, "tmp": "+0050,1"},
+                           {"type": "pm10", "station_code": "A", "timestamp": ts, "pm10": float(i)}])
+    assert len(forecaster.stations["A"].observations) == 2
+    assert len(forecaster.weather_windows[None].records) == 4
+    assert forecaster.case("A")["target"]["prediction_start_time"] == "2025-01-05T04:00:00"
+
+
+def test_run_reads_jsonl_events_and_writes_forecasts():
+    events = io.StringIO("\n".join([json.dumps(pm10("A", 0, 10.0)), "not json", "",
+                                    json.dumps(pm10("A", 1, 12.0))]) + "\n")
+    out = io.StringIO()
+    run(StreamingForecaster(weather_lag_model, horizon=2), iter_events(events), out)
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [line["station_code"] for line in lines] == ["A"]
+    np.testing.assert_allclose([row["pm10_pred"] for row in lines[0]["forecast"]],
+                               [0.5 * 12.0 + 0.25 * 10.0 + 2, 0.5 * 10.5 + 0.25 * 12.0 + 3])
+
+
+def test_observations_update_the_neighbors_that_use_them():
+    model = NeighborModel(direct=False)
+    forecaster = StreamingForecaster(model, horizon=2)
+    located = {"A": (19.90, 50.00), "B": (19.95, 50.00), "C": (21.00, 50.00)}  # C is ~80 km away
+    for hour in (0, 1):
+        for code, (lon, lat) in located.items():
+            forecaster.process({**pm10(code, hour, 10.0 * hour), "longitude": lon, "latitude": lat})
+
+    updates = forecaster.process(pm10("A", 2, 55.0))
+    assert [u["station_code"] for u in updates] == ["A", "B"]
+    for update in updates:
+        expected = forecast_batch([forecaster.case(update["station_code"])], model, horizon=2)[0]
+        assert update["forecast"] == expected["forecast"]
+    assert updates[1]["forecast"][0]["pm10_pred"] == 55.0  # B's neighbor lag is A's new value
+
+    # Without neighbor features only the observed station changes
+    forecaster = StreamingForecaster(weather_lag_model, horizon=2)
+    for hour in (0, 1):
+        for code, (lon, lat) in located.items():
+            forecaster.process({**pm10(code, hour, 10.0), "longitude": lon, "latitude": lat})
+    assert [u["station_code"] for u in forecaster.process(pm10("A", 2, 55.0))] == ["A"]
@@ -0,0 +1,84 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostRegressor
+
+import train
+from feature_store import FeatureStore
+
+
+def make_store(root, periods=400, seed=0):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2021-01-01", periods=periods, freq="h")
+    wide = pd.DataFrame({"DateTime": times, "StationA": rng.uniform(5, 80, periods),
+                         "StationB": rng.uniform(5, 80, periods)})
+    weather = pd.DataFrame({"DATE": times, "temperature_C": rng.normal(5, 3, periods)})
+    FeatureStore(root).append(wide, weather)
+    return root
+
+
+def test_sample_params_are_distinct_and_reproducible():
+    trials = train.sample_params(10, seed=1)
+    assert len({tuple(p.values()) for p in trials}) == 10
+    assert trials == train.sample_params(10, seed=1)
+    assert all(p[name] in train.PARAM_DIST[name] for p in trials for name in p)
+
+
+def test_train_stations_caches_pools(tmp_path):
+    store = make_store(str(tmp_path / "store"))
+    out, pools = str(tmp_path / "models"), str(tmp_path / "pools")
+    summaries = train.train_stations(store, trials=2, folds=2, cores=1, output_dir=out,
+                                     cache_dir=pools, iterations=5)
+
+    assert [s["station"] for s in summaries] == ["StationA", "StationB"]
+    with open(os.path.join(out, "training_summary.json")) as f:
+        assert [s["station"] for s in json.load(f)] == ["StationA", "StationB"]
+    model = CatBoostRegressor()
+    model.load_model(os.path.join(out, "StationA.cbm"))
+    assert model.feature_names_[:2] == ["year", "month"] and "pm10" not in model.feature_names_
+
+    cached = sorted(os.listdir(pools))
+    assert cached and all(name.startswith(("StationA-", "StationB-")) for name in cached)
+    mtimes = {name: os.path.getmtime(os.path.join(pools, name)) for name in cached}
+    train.train_station(store, "StationA", trials=2, folds=2, output_dir=out, cache_dir=pools, iterations=5)
+    assert {name: os.path.getmtime(os.path.join(pools, name)) for name in sorted(os.listdir(pools))} == mtimes
+
+
+def test_direct_frame_pairs_hours_with_earlier_lags(tmp_path):
+    store = FeatureStore(make_store(str(tmp_path / "store"), periods=50))
+    frame = train.direct_frame(store, stations=["StationA"], horizon=3)
+    pm10 = store.read(stations=["StationA"], dropna=False)["pm10"].to_numpy()
+
+    assert len(frame) == 3 * 50
+    for h in (1, 2, 3):
+        rows = frame[frame["horizon"] == h]
+        np.testing.assert_array_equal(rows["pm10_lag_1"].to_numpy()[h:], pm10[:-h])
+        np.testing.assert_array_equal(rows["pm10_lag_2"].to_numpy()[h + 1:], pm10[:-h - 1])
+    h1 = frame[frame["horizon"] == 1].drop(columns="horizon").reset_index(drop=True)
+    pd.testing.assert_frame_equal(h1, store.training_frame(stations=["StationA"]))
+
+
+def test_direct_frame_neighbor_lags(tmp_path):
+    """With two stations, a station's neighbor PM10 is the other station's PM10."""
+    store = FeatureStore(make_store(str(tmp_path / "store"), periods=50))
+    network = {"StationA": (19.90, 50.00), "StationB": (19.95, 50.05)}
+    frame = train.direct_frame(store, stations=["StationA"], horizon=2, neighbors=True, network=network)
+    other = store.read(stations=["StationB"], dropna=False)["pm10"].to_numpy()
+
+    for h in (1, 2):
+        rows = frame[frame["horizon"] == h]
+        np.testing.assert_allclose(rows["neighbor_pm10_lag_1"].to_numpy()[h:], other[:-h])
+        np.testing.assert_allclose(rows["neighbor_pm10_lag_2"].to_numpy()[h + 1:], other[:-h - 1])
+
+
+def test_cv_folds_are_time_ordered(tmp_path, monkeypatch):
+    store = make_store(str(tmp_path / "store"))
+    calls = []
+    original = train.cv
+    monkeypatch.setattr(train, "cv", lambda *args, **kwargs: calls.append(kwargs) or original(*args, **kwargs))
+    train.train_station(store, "StationA", trials=2, folds=3, output_dir=str(tmp_path / "models"),
+                        cache_dir=str(tmp_path / "pools"), iterations=5)
+    assert len(calls) == 2
+    assert all(kwargs["type"] == "TimeSeries" and kwargs["shuffle"] is False for kwargs in calls)
@@ -0,0 +1,108 @@
+import copy
+import os
+
+import pandas as pd
+import pytest
+
+import weather_cache
+from weather_cache import WeatherCache, weather_key
+
+WEATHER = [
+    {"date": "2025-01-01T00:00:00", "tmp": "+0050,1", "wnd": "260,1,N,0030,1"},
+    {"date": "2025-01-01T01:00:00", "tmp": "+0040,1", "wnd": "180,1,N,0025,1"},
+]
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    """Counts the preprocess_weather calls of the cache."""
+    calls = []
+    original = weather_cache.preprocess_weather
+    monkeypatch.setattr(weather_cache, "preprocess_weather", lambda df: calls.append(1) or original(df))
+    return calls
+
+
+def test_identical_payloads_are_preprocessed_once(counted):
+    cache = WeatherCache()
+    first = cache.index(WEATHER)
+    assert cache.index(copy.deepcopy(WEATHER)) is first
+    other = copy.deepcopy(WEATHER)
+    other[1]["tmp"] = "+0041,1"
+    assert cache.index(other) is not first
+    assert len(counted) == 2
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_lru_eviction_within_budget():
+    cache = WeatherCache()
+    size = cache.index(WEATHER).nbytes
+    cache = WeatherCache(memory_mb=2.5 * size / (1024 * 1024))
+    payloads = [[{**WEATHER[0], "tmp": f"+00{i}0,1"}] + WEATHER[1:] for i in range(3)]
+    for payload in payloads:
+        cache.index(payload)
+    cache.index(payloads[1])  # most recently used: kept
+    cache.index(payloads[0])  # evicted before, evicts payloads[2]
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 2
+    assert stats["bytes"] <= 2.5 * size
+
+
+def test_disk_cache_is_shared_across_instances(counted, tmp_path):
+    index = WeatherCache(cache_dir=str(tmp_path)).index(WEATHER)
+    cache = WeatherCache(cache_dir=str(tmp_path))
+    reloaded = cache.index(WEATHER)
+    assert len(counted) == 1 and cache.stats()["disk_hits"] == 1
+    timestamps = ["2025-01-01T00:00:00", "2025-01-01T05:00:00"]
+    pd.testing.assert_frame_equal(pd.DataFrame(reloaded.lookup_many(timestamps)),
+                                  pd.DataFrame(index.lookup_many(timestamps)))
+
+
+def test_no_memory_cache(counted):
+    cache = WeatherCache(memory_mb=0)
+    cache.index(WEATHER)
+    cache.index(WEATHER)
+    assert len(counted) == 2 and cache.stats()["entries"] == 0
+
+
+def test_failing_payload_is_not_cached(monkeypatch):
+    monkeypatch.setattr(weather_cache, "preprocess_weather", lambda df: 1 / 0)
+    cache = WeatherCache()
+    for _ in range(2):
+        with pytest.raises(ZeroDivisionError):
+            cache.index(WEATHER)
+    assert cache.stats()["entries"] == 0 and cache.stats()["misses"] == 0
+
+
+def test_disk_cache_prunes_least_recently_used(tmp_path):
+    payloads = [[{**WEATHER[0], "tmp": f"+00{i}0,1"}] + WEATHER[1:] for i in range(4)]
+    cache = WeatherCache(memory_mb=0, cache_dir=str(tmp_path))
+    cache.index(payloads[0])
+    size = sum(f.stat().st_size for f in tmp_path.rglob("*.pkl"))
+
+    cache = WeatherCache(memory_mb=0, cache_dir=str(tmp_path), disk_mb=3.5 * size / (1024 * 1024))
+    for payload in payloads[1:3]:
+        cache.index(payload)
+    for i, path in enumerate(sorted(tmp_path.rglob("*.pkl"), key=lambda f: f.stat().st_mtime)):
+        os.utime(path, (i, i))
+    cache.index(payloads[0])  # disk hit: now the most recently used
+    cache.index(payloads[3])  # over budget: the two least recently used files are deleted
+    assert cache.stats()["disk_evictions"] == 2
+    assert sorted(f.stem for f in tmp_path.rglob("*.pkl")) == sorted(weather_key(p) for p in [payloads[0], payloads[3]])
+
+
+def test_key_is_only_hashed_for_an_enabled_cache(monkeypatch):
+    from prediction import forecast_batch
+    from tests.test_forecast import lag_model
+    hashed = []
+    original = weather_cache.weather_key
+    monkeypatch.setattr(weather_cache, "weather_key", lambda data: hashed.append(1) or original(data))
+    case = {"case_id": "a", "stations": [{"station_code": "X", "history": [
+        {"timestamp": "2025-01-01T00:00:00", "pm10": 1.0}, {"timestamp": "2025-01-01T01:00:00", "pm10": 2.0}]}],
+        "target": {"prediction_start_time": "2025-01-01T02:00:00"}, "weather": WEATHER}
+
+    monkeypatch.setattr(weather_cache._default, "cache", WeatherCache(memory_mb=0))
+    disabled = forecast_batch([case], lag_model, horizon=2)  # lag_model has no fingerprint: no forecast cache
+    assert hashed == [] and weather_cache.default_cache().stats()["misses"] == 1
+    monkeypatch.setattr(weather_cache._default, "cache", WeatherCache())
+    assert forecast_batch([case], lag_model, horizon=2) == disabled
+    assert len(hashed) == 1
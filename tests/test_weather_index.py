@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from weather_index import WeatherIndex
+
+
+@pytest.fixture
+def weather_df():
+    """Preprocessed-like weather with a same-hour tie and a missing hour."""
+    return pd.DataFrame({
+        "DATE": ["2025-01-01T10:00:00", "2025-01-03T10:00:00", "2025-01-02T12:00:00",
+                 "2025-01-02T12:30:00", "2025-01-05T18:00:00"],
+        "temperature_C": [1.0, 3.0, 10.0, np.nan, 20.0],
+        "wind_speed_raw": [10.0, 30.0, 5.0, 7.0, 50.0],
+    })
+
+
+def test_same_hour_nearest_day_is_preferred(weather_df):
+    """Same hour from a different day wins over a closer timestamp."""
+    result = WeatherIndex(weather_df).lookup("2025-01-04T10:00:00")
+    assert result == {"temperature_C": 3.0, "wind_speed_raw": 30.0}
+
+
+def test_same_hour_tie_is_averaged(weather_df):
+    """Equally near days, and several reports in the same hour, are averaged."""
+    index = WeatherIndex(weather_df)
+    assert index.lookup("2025-01-02T10:00:00") == {"temperature_C": 2.0, "wind_speed_raw": 20.0}
+    # NaN is skipped when averaging
+    assert index.lookup("2025-01-02T12:00:00") == {"temperature_C": 10.0, "wind_speed_raw": 6.0}
+
+
+def test_nearest_timestamp_fallback(weather_df):
+    """Without any report at the target hour the nearest timestamp is used."""
+    result = WeatherIndex(weather_df).lookup("2025-01-05T20:00:00")
+    assert result == {"temperature_C": 20.0, "wind_speed_raw": 50.0}
+
+
+def test_lookup_many_matches_lookup(weather_df):
+    """A batch lookup equals looking up every timestamp on its own."""
+    index = WeatherIndex(weather_df)
+    timestamps = pd.date_range("2024-12-30", "2025-01-08", freq="7h")
+    assert index.lookup_many(timestamps) == [index.lookup(ts) for ts in timestamps]
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from weather_preprocessing import ISDGroup, preprocess_weather
+
+
+def test_isd_group_parts():
+    """Groups are split into exactly n_parts, dropping extras and padding with NaN."""
+    group = ISDGroup(pd.Series(["260,1,N,0030,1,X", "180,1", None]), 5)
+    assert list(group.rows(group.text(0).to_numpy())) == ["260", "180", ""]
+    assert pd.isna(group.rows(group.text(2).to_numpy())[1])
+    np.testing.assert_array_equal(group.rows(group.numeric(3)), [30.0, np.nan, np.nan])
+
+
+def test_sentinels_and_quality_flags():
+    """Sentinel codes and non-'1' quality flags become NaN before interpolation."""
+    weather = pd.DataFrame({
+        "date": ["2025-01-01T00:00:00", "2025-01-01T01:00:00", "2025-01-01T02:00:00"],
+        "wnd": ["999,9,C,0000,1", "090,1,N,0020,1", "180,1,N,9999,1"],
+        "tmp": ["+0050,1", "+0100,5", "+0150,1"],
+        "vis": ["099999,1,N,1", "005000,1,N,1", "004000,9,N,1"],
+    })
+    processed = preprocess_weather(weather)
+
+    assert list(processed.columns)[0] == "DATE"
+    # calm wind has speed 0, missing speed is interpolated between neighbours
+    np.testing.assert_allclose(processed["wind_speed_raw"], [0.0, 20.0, 20.0])
+    # bad quality temperature is interpolated between its neighbours
+    np.testing.assert_allclose(processed["temperature_C"], [5.0, 10.0, 15.0])
+    # 99999 and bad variability flag are filled from the one valid value
+    np.testing.assert_allclose(processed["visibility_m"], [5000.0, 5000.0, 5000.0])
+    assert processed["GA1_type"].tolist() == [0, 0, 0]
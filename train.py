@@ -0,0 +1,316 @@
+"""
+Per-station CatBoost training on the feature store.
+
+Replaces the per-station loop and RandomizedSearchCV of
+notebooks/07_tree_based_modelling.ipynb:
+- each station's feature matrix is quantized once per border_count into a
+  CatBoost Pool saved on disk ($PM10_CACHE_DIR/pools, default
+  ~/.cache/pm10/pools), keyed by the station's data in the store, and reused
+  by every hyperparameter trial and CV fold (and by later runs)
+- hyperparameter trials are scored with catboost.cv on that pool, with
+  time-ordered folds: the station's hours are split into consecutive parts
+  and each part is predicted by a model trained on the parts before it
+  (shuffled folds would train on the hours around every test hour, whose lags
+  overlap it, and give optimistic scores)
+- stations are trained concurrently in worker processes, sharing a core budget
+
+The best model of every station is saved as <output-dir>/<station_code>.cbm,
+with training_summary.json next to them.
+
+With --direct, one direct multi-horizon model is trained instead: every hour
+of the store is paired with the lags known 1..horizon hours earlier and the
+horizon as a feature, so that forecasts need no recursion (see
+prediction.forecast_direct). It is saved as <output-dir>/catboost_direct.cbm.
+--neighbors adds the distance-weighted PM10 lags of the nearby stations of
+the store (spatial.NEIGHBOR_FEATURES, placed with data/processed/stations.csv)
+to its features.
+
+Usage:
+    python train.py --store data/feature_store [--stations MpKrakAlKras MpKrakBujaka]
+                    [--trials 20] [--folds 5] [--cores 8] [--workers 4] [--output-dir models/stations]
+    python train.py --store data/feature_store --direct [--horizon 24] [--sample 0.1] [--neighbors]
+                    [--output-dir models]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import catboost
+import numpy as np
+import pandas as pd
+from catboost import CatBoostRegressor, Pool, cv
+
+from feature_store import FeatureStore
+from model_registry import MODELS_DIR, STATIONS_DIR
+from prediction import HORIZON_FEATURE
+from spatial import NEIGHBOR_FEATURES, idw_weights, nearest, station_network, weighted_mean
+
+TARGET = "pm10"
+CAT_FEATURES = ["month", "station_code"]
+POOL_VERSION = 1  # bump when the pool layout (features, target) changes
+
+# Search space of the notebook's RandomizedSearchCV
+PARAM_DIST = {
+    "iterations": [200, 500, 1000],
+    "learning_rate": [0.01, 0.05, 0.1, 0.2],
+    "depth": [4, 6, 8, 10],
+    "l2_leaf_reg": [1, 3, 5, 7, 9],
+    "bagging_temperature": [0, 0.5, 1, 2],
+    "border_count": [32, 64, 128],
+}
+
+# Best parameters of the notebook's search, used for the direct model
+DIRECT_PARAMS = {"iterations": 500, "learning_rate": 0.05, "depth": 10, "l2_leaf_reg": 7,
+                 "bagging_temperature": 2, "border_count": 128}
+DIRECT_MODEL_NAME = "catboost_direct.cbm"
+
+
+def default_pool_cache_dir():
+    """$PM10_CACHE_DIR/pools, or ~/.cache/pm10/pools."""
+    root = os.environ.get("PM10_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "pm10")
+    return os.path.join(root, "pools")
+
+
+def sample_params(n_trials, seed=42):
+    """n_trials distinct parameter sets drawn from PARAM_DIST (all of them if there are fewer)."""
+    rng = random.Random(seed)
+    n_combinations = 1
+    for values in PARAM_DIST.values():
+        n_combinations *= len(values)
+    trials, seen = [], set()
+    while len(trials) < min(n_trials, n_combinations):
+        params = {name: rng.choice(values) for name, values in PARAM_DIST.items()}
+        key = tuple(params.values())
+        if key not in seen:
+            seen.add(key)
+            trials.append(params)
+    return trials
+
+
+def quantized_pool_path(store, station, border_count, cache_dir=None):
+    """
+    Path of the station's quantized training pool, written on first use.
+    The cache key covers the station's partitions in the store, the feature
+    columns, border_count and the CatBoost version.
+    """
+    cache_dir = cache_dir or default_pool_cache_dir()
+    info = store.manifest["stations"][station]
+    key = json.dumps({"version": POOL_VERSION, "station": info, "columns": store.columns,
+                      "border_count": border_count, "catboost": catboost.__version__}, sort_keys=True)
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"{station}-{border_count}-{digest}.bin")
+    if os.path.exists(path):
+        return path
+
+    frame = store.training_frame(stations=[station])
+    pool = Pool(frame.drop(columns=[TARGET]), frame[TARGET], cat_features=CAT_FEATURES)
+    pool.quantize(border_count=border_count)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    pool.save(tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def train_station(store_root, station, trials=20, folds=5, thread_count=None, seed=42,
+                  output_dir=STATIONS_DIR, cache_dir=None, iterations=None):
+    """
+    Random search over PARAM_DIST scored by catboost.cv (rolling-origin folds
+    over the station's hours, in time order) on the station's cached
+    quantized pools, then a final fit with the best parameters on all data.
+    iterations overrides the sampled iteration counts (for quick runs).
+    Returns a summary dict.
+    """
+    start = time.perf_counter()
+    store = FeatureStore(store_root)
+    common = {"loss_function": "RMSE", "random_seed": seed, "thread_count": thread_count or os.cpu_count() or 1}
+    pools = {}  # border_count -> Pool, loaded once for all trials and folds
+    results = []
+    for params in sample_params(trials, seed):
+        if iterations:
+            params = {**params, "iterations": iterations}
+        border_count = params["border_count"]
+        if border_count not in pools:
+            path = quantized_pool_path(store, station, border_count, cache_dir)
+            pools[border_count] = Pool("quantized://" + path)
+        fit_params = {name: value for name, value in params.items() if name != "border_count"}
+        # The store yields a station's hours in time order
+        scores = cv(pools[border_count], {**fit_params, **common}, fold_count=folds, type="TimeSeries",
+                    shuffle=False, seed=seed, logging_level="Silent")
+        results.append((float(scores["test-RMSE-mean"].iloc[-1]), params))
+
+    cv_rmse, best = min(results, key=lambda result: result[0])
+    model = CatBoostRegressor(**{name: value for name, value in best.items() if name != "border_count"},
+                              **common, logging_level="Silent")
+    model.fit(pools[best["border_count"]])
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, f"{station}.cbm")
+    model.save_model(model_path)
+    return {"station": station, "cv_rmse": cv_rmse, "best_params": best, "trials": len(results),
+            "model_path": model_path, "seconds": time.perf_counter() - start}
+
+
+def train_stations(store_root, stations=None, trials=20, folds=5, cores=None, workers=None, seed=42,
+                   output_dir=STATIONS_DIR, cache_dir=None, iterations=None):
+    """
+    Trains all (or the given) stations, `workers` at a time, each worker using
+    cores // workers CatBoost threads. Returns the summaries in station order.
+    """
+    stations = stations or FeatureStore(store_root).stations
+    cores = cores or os.cpu_count() or 1
+    workers = max(min(workers or cores, len(stations), cores), 1)
+    thread_count = max(cores // workers, 1)
+    print(f"[INFO] Training {len(stations)} stations: {workers} workers x {thread_count} threads")
+
+    kwargs = dict(trials=trials, folds=folds, thread_count=thread_count, seed=seed,
+                  output_dir=output_dir, cache_dir=cache_dir, iterations=iterations)
+    summaries = {}
+    if workers == 1:
+        for station in stations:
+            summaries[station] = train_station(store_root, station, **kwargs)
+            _report(summaries[station])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(train_station, store_root, station, **kwargs): station
+                       for station in stations}
+            for future in as_completed(futures):
+                summaries[futures[future]] = future.result()
+                _report(summaries[futures[future]])
+
+    summaries = [summaries[station] for station in stations]
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "training_summary.json"), "w") as f:
+        json.dump(summaries, f, indent=2)
+    return summaries
+
+
+def neighbor_pm10(store, years=None, network=None):
+    """
+    Hourly neighbor PM10 of every station of the store: the inverse-distance
+    weighted PM10 of its nearest other stations (see spatial.py), as a frame
+    indexed by DATE with one column per station.
+    """
+    network = station_network() if network is None else network
+    wide = pd.concat({station: store.read(stations=[station], years=years, columns=["DATE", TARGET],
+                                          dropna=False).set_index("DATE")[TARGET]
+                      for station in store.stations}, axis=1)
+    coordinates = np.array([network.get(station, (np.nan, np.nan)) for station in wide.columns], dtype=float)
+    indices, distances = nearest(coordinates, coordinates, exclude=np.arange(len(wide.columns)))
+    values = wide.to_numpy()
+    neighbors = {}
+    for j, station in enumerate(wide.columns):
+        found = indices[j] >= 0
+        neighbors[station] = weighted_mean(values[:, indices[j][found]], idw_weights(distances[j][found]))
+    return pd.DataFrame(neighbors, index=wide.index)
+
+
+def _shifted(values, h):
+    """values h rows later (NaN for the first h)."""
+    return np.concatenate([np.full(h, np.nan), values[:-h]])[:len(values)]
+
+
+def direct_frame(store, stations=None, years=None, horizon=24, sample=None, seed=42, columns=None,
+                 neighbors=False, network=None):
+    """
+    Training rows of a direct multi-horizon model: for every horizon h in
+    1..horizon, each hour with a PM10 value is paired with the PM10 of h and
+    h+1 hours earlier as pm10_lag_1/pm10_lag_2 and h as HORIZON_FEATURE.
+    sample keeps a random fraction of the rows of each horizon; columns
+    restricts the features (default: all of the store). years should be
+    consecutive, as the lags are taken across the selected partitions.
+    With neighbors, the neighbor PM10 (see neighbor_pm10) of h and h+1 hours
+    earlier is added as NEIGHBOR_FEATURES.
+    """
+    columns = [col for col in (columns or store.columns) if col not in ("DATE", TARGET)]
+    neighbor_frame = neighbor_pm10(store, years, network) if neighbors else None
+    rng = np.random.default_rng(seed)
+    parts = []
+    for station in stations or store.stations:
+        # Partitions hold every hour of a station, so shifting by h rows is h hours
+        frame = store.read(stations=[station], years=years, columns=columns + [TARGET], dropna=False)
+        pm10 = frame[TARGET].to_numpy()
+        if neighbors:
+            dates = store.read(stations=[station], years=years, columns=["DATE"], dropna=False)["DATE"]
+            neighbor = neighbor_frame[station].reindex(dates).to_numpy()
+        for h in range(1, horizon + 1):
+            rows = frame.copy()
+            rows["pm10_lag_1"] = _shifted(pm10, h)
+            rows["pm10_lag_2"] = _shifted(pm10, h + 1)
+            rows.insert(rows.columns.get_loc("pm10_lag_2") + 1, HORIZON_FEATURE, np.int8(h))
+            if neighbors:
+                rows[NEIGHBOR_FEATURES[0]] = _shifted(neighbor, h)
+                rows[NEIGHBOR_FEATURES[1]] = _shifted(neighbor, h + 1)
+            keep = ~np.isnan(pm10)
+            if sample is not None:
+                keep &= rng.random(len(pm10)) < sample
+            parts.append(rows[keep])
+    return pd.concat(parts, ignore_index=True)
+
+
+def train_direct(store_root, stations=None, horizon=24, sample=0.1, thread_count=None, seed=42,
+                 output_dir=MODELS_DIR, iterations=None, params=None, neighbors=False):
+    """
+    Trains one direct multi-horizon model on the stations of the store (see
+    direct_frame) with the notebook's best parameters. Returns a summary dict.
+    """
+    start = time.perf_counter()
+    frame = direct_frame(FeatureStore(store_root), stations, horizon=horizon, sample=sample, seed=seed,
+                         neighbors=neighbors)
+    params = {**(params or DIRECT_PARAMS), **({"iterations": iterations} if iterations else {})}
+    print(f"[INFO] Training the direct model on {len(frame)} rows (horizon 1..{horizon})")
+
+    model = CatBoostRegressor(**params, loss_function="RMSE", random_seed=seed,
+                              thread_count=thread_count or os.cpu_count() or 1, logging_level="Silent")
+    model.fit(Pool(frame.drop(columns=[TARGET]), frame[TARGET], cat_features=CAT_FEATURES))
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, DIRECT_MODEL_NAME)
+    model.save_model(model_path)
+    print(f"[INFO] Direct model trained in {time.perf_counter() - start:.0f} s -> {model_path}")
+    return {"rows": len(frame), "params": params, "model_path": model_path,
+            "seconds": time.perf_counter() - start}
+
+
+def _report(summary):
+    print(f"[INFO] {summary['station']}: CV RMSE {summary['cv_rmse']:.2f} after {summary['trials']} trials "
+          f"in {summary['seconds']:.0f} s -> {summary['model_path']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train per-station PM10 CatBoost models.")
+    parser.add_argument("--store", required=True, help="Feature store directory (see feature_store.py)")
+    parser.add_argument("--stations", nargs="*", default=None, help="Stations to train (default: all in the store)")
+    parser.add_argument("--trials", type=int, default=20, help="Random search trials per station (default: 20)")
+    parser.add_argument("--folds", type=int, default=5, help="Consecutive time parts of the CV of every trial (default: 5)")
+    parser.add_argument("--cores", type=int, default=None, help="Total CPU cores to use (default: all)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Stations trained at the same time (default: one per core, at most one per station)")
+    parser.add_argument("--output-dir", default=None,
+                        help="Directory for the models (default: models/stations, or models with --direct)")
+    parser.add_argument("--pool-cache-dir", default=None,
+                        help="Directory of quantized pools (default: $PM10_CACHE_DIR/pools or ~/.cache/pm10/pools)")
+    parser.add_argument("--iterations", type=int, default=None, help="Override the sampled iterations (quick runs)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--direct", action="store_true",
+                        help="Train one direct multi-horizon model instead of per-station models")
+    parser.add_argument("--horizon", type=int, default=24, help="Forecast hours of the direct model (default: 24)")
+    parser.add_argument("--sample", type=float, default=0.1,
+                        help="Fraction of the rows of each horizon used by the direct model (default: 0.1)")
+    parser.add_argument("--neighbors", action="store_true",
+                        help="Add the distance-weighted PM10 of the nearby stations to the direct model's features")
+    args = parser.parse_args()
+
+    if args.direct:
+        train_direct(args.store, args.stations, args.horizon, args.sample, args.cores, args.seed,
+                     args.output_dir or MODELS_DIR, args.iterations, neighbors=args.neighbors)
+    else:
+        train_stations(args.store, args.stations, args.trials, args.folds, args.cores, args.workers, args.seed,
+                       args.output_dir or STATIONS_DIR, args.pool_cache_dir, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
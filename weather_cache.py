@@ -0,0 +1,198 @@
+"""
+Content-addressed cache of preprocessed case weather.
+
+Cases often carry the same weather records (same station, same window), and
+preprocess_weather costs far more than the lookups. The WeatherIndex of a
+case's records is therefore cached under the SHA-256 of the records as JSON,
+so an identical payload is preprocessed once:
+- in memory, in an LRU bounded by memory_mb (approximate WeatherIndex sizes)
+- optionally on disk (cache_dir/<key[:2]>/<key>.pkl), shared across runs and
+  processes, bounded by disk_mb: beyond it the least recently used files (by
+  modification time, refreshed on every disk hit) are deleted
+
+Entries are read back with pickle, so cache_dir must be trusted: anyone who
+can write to it can run code in the forecasting process.
+
+The process-wide cache used by prediction.CaseWeather is configured with
+configure() (main.py --weather-cache-mb / --weather-cache-dir /
+--weather-cache-dir-mb).
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+import pandas as pd
+
+import instrumentation
+from bounded_cache import BoundedLRU, ProcessDefault
+from weather_index import WeatherIndex
+from weather_preprocessing import preprocess_weather
+
+CACHE_VERSION = 1  # bump when preprocess_weather or the WeatherIndex layout changes
+DEFAULT_WEATHER_CACHE_MB = 64
+DEFAULT_WEATHER_DISK_MB = 1024
+_PRUNE_TO = 0.75  # fraction of disk_mb left after pruning, so pruning is not repeated on every write
+
+
+def weather_key(weather_data):
+    """SHA-256 of the raw weather records (record and field order included)."""
+    payload = json.dumps(weather_data, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{CACHE_VERSION}:{payload}".encode()).hexdigest()
+
+
+def build_index(weather_data):
+    """Preprocesses raw weather records and indexes them for timestamp lookups."""
+    weather_df = pd.DataFrame(weather_data)
+    weather_df.rename(columns={"date": "DATE"}, inplace=True)
+    return WeatherIndex(preprocess_weather(weather_df))
+
+
+class WeatherCache:
+    """
+    WeatherIndex per weather payload, in an LRU of at most memory_mb (0: no
+    memory cache) and, with cache_dir, in pickle files of at most disk_mb in
+    total. Thread-safe.
+    """
+
+    def __init__(self, memory_mb=DEFAULT_WEATHER_CACHE_MB, cache_dir=None, disk_mb=DEFAULT_WEATHER_DISK_MB):
+        self.cache_dir = cache_dir
+        self.disk_budget = disk_mb * 1024 * 1024
+        self._disk_bytes = None  # size of the cache files, scanned on the first write
+        self._indexes = BoundedLRU(memory_mb)
+        self._lock = threading.Lock()
+        self._write_failed = False
+        self.hits = self.disk_hits = self.misses = self.disk_evictions = 0
+
+    def settings(self):
+        """Arguments that recreate this cache (see bounded_cache.ProcessDefault)."""
+        return {"memory_mb": self._indexes.budget / (1024 * 1024), "cache_dir": self.cache_dir,
+                "disk_mb": self.disk_budget / (1024 * 1024)}
+
+    @property
+    def enabled(self):
+        return self._indexes.budget > 0 or self.cache_dir is not None
+
+    def index(self, weather_data, key=None):
+        """
+        The WeatherIndex of the records (key: their weather_key, if known; only
+        hashed if the cache is enabled); raises if preprocessing fails.
+        """
+        if not self.enabled:
+            return self._build(weather_data)
+        key = key or weather_key(weather_data)
+        index = self._indexes.get(key)
+        if index is not None:
+            with self._lock:
+                self.hits += 1
+            instrumentation.count("weather_cache_hits")
+            return index
+
+        index = self._read(key) if self.cache_dir else None
+        if index is not None:
+            with self._lock:
+                self.disk_hits += 1
+            instrumentation.count("weather_cache_disk_hits")
+        else:
+            index = self._build(weather_data)
+            if self.cache_dir:
+                self._write(key, index)
+        self._indexes.put(key, index, index.nbytes)
+        return index
+
+    def _build(self, weather_data):
+        with instrumentation.timer("weather_preprocess"):
+            index = build_index(weather_data)
+        with self._lock:
+            self.misses += 1
+        instrumentation.count("weather_cache_misses")
+        return index
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".pkl")
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                index = pickle.load(f)
+            os.utime(path)  # recently used: pruned last
+            return index
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable weather cache entry {self._path(key)}: {e}")
+            return None
+
+    def _write(self, key, index):
+        path = self._path(key)
+        # Written next to the target and renamed, so readers never see a partial entry
+        tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            if not self._write_failed:
+                self._write_failed = True
+                print(f"Warning: Could not write weather cache {self.cache_dir}: {e}")
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(entry[1] for entry in self._disk_entries())
+            else:
+                self._disk_bytes += size
+            if self._disk_bytes > self.disk_budget:
+                self._prune()
+
+    def _disk_entries(self):
+        """(mtime, size, path) of the cache files."""
+        entries = []
+        for directory in os.scandir(self.cache_dir):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.name.endswith(".pkl"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:  # pruned by another process
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _prune(self):
+        # Other processes share the directory, so the sizes are rescanned rather than trusted
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.disk_budget * _PRUNE_TO:
+                break
+            try:
+                os.remove(path)
+                self.disk_evictions += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Warning: Could not prune weather cache entry {path}: {e}")
+                continue
+            total -= size
+        self._disk_bytes = total
+
+    def clear(self):
+        """Forgets the in-memory entries (the disk cache is kept)."""
+        self._indexes.clear()
+
+    def stats(self):
+        """Cache counters: cached payloads, their approximate bytes, hits, disk hits, misses and evictions."""
+        with self._lock:
+            return {**self._indexes.stats(), "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "disk_evictions": self.disk_evictions}
+
+
+_default = ProcessDefault(WeatherCache)
+# configure(memory_mb, cache_dir, disk_mb), settings() and default_cache(): the cache used by prediction.CaseWeather
+configure, settings, default_cache = _default.configure, _default.settings, _default.default_cache
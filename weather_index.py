@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+
+class WeatherIndex:
+    """
+    Prebuilt lookup structure over a preprocessed weather frame.
+
+    Matching rules are the same as find_weather_for_timestamp:
+    1. Same hour from nearest days (priority)
+    2. Nearest timestamp if no same hour available
+    3. Average if multiple measurements tie (first value for non-numeric columns)
+
+    Rows are sorted once by (hour of day, date), so every hour of day is a
+    contiguous sorted date array, and once more by timestamp. Both lookups are
+    then binary searches, done for a whole batch of target timestamps at once.
+    """
+    def __init__(self, weather_df):
+        dates = pd.to_datetime(weather_df["DATE"])
+        valid = dates.notna().to_numpy()
+        frame = weather_df.loc[valid]
+
+        self.columns = [col for col in frame.columns if col != "DATE"]
+        self.numeric_columns = [col for col in frame.select_dtypes(include=[np.number]).columns if col != "DATE"]
+        self.other_columns = [col for col in frame.select_dtypes(exclude=[np.number, 'datetime']).columns
+                              if col != "DATE"]
+        # Values in original row order: native row values, and floats for averaging
+        self._rows = frame[self.columns].to_numpy(dtype=object)
+        self._numeric = frame[self.numeric_columns].to_numpy(dtype=float)
+        self._other = frame[self.other_columns].to_numpy(dtype=object)
+
+        times = dates[valid].to_numpy(dtype="datetime64[ns]")
+        days = times.astype("datetime64[D]").astype(np.int64)
+        hours = (times.astype("datetime64[h]").astype(np.int64) - days * 24)
+        positions = np.arange(len(times))
+
+        # --- Same hour, nearest day: rows sorted by (hour, day, position) ---
+        self._day_min = days.min() if len(days) else 0
+        self._span = (days.max() - self._day_min + 3) if len(days) else 3
+        hour_order = np.lexsort((positions, days, hours))
+        self._hour_day_pos = hour_order
+        self._hour_day_key = hours[hour_order] * self._span + (days[hour_order] - self._day_min + 1)
+        self._hour_day = days[hour_order]
+        self._hour_start = np.searchsorted(hours[hour_order], np.arange(24), side="left")
+        self._hour_end = np.searchsorted(hours[hour_order], np.arange(24), side="right")
+
+        # --- Nearest timestamp: rows sorted by (time, position) ---
+        time_values = times.astype(np.int64)
+        time_order = np.lexsort((positions, time_values))
+        self._time_pos = time_order
+        self._times = time_values[time_order]
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the index (object cells counted as 64 bytes)."""
+        arrays = (self._numeric, self._hour_day_pos, self._hour_day_key, self._hour_day, self._hour_start,
+                  self._hour_end, self._time_pos, self._times)
+        return sum(a.nbytes for a in arrays) + 64 * (self._rows.size + self._other.size)
+
+    def lookup(self, target_timestamp):
+        """Weather features for a single timestamp."""
+        return self.lookup_many([target_timestamp])[0]
+
+    def lookup_many(self, target_timestamps):
+        """Weather feature dicts for a batch of timestamps, in one vectorized pass."""
+        n = len(target_timestamps)
+        if n == 0:
+            return []
+        if len(self) == 0:
+            return [{} for _ in range(n)]
+
+        targets = pd.to_datetime(pd.Series(list(target_timestamps))).to_numpy(dtype="datetime64[ns]")
+        target_days = targets.astype("datetime64[D]").astype(np.int64)
+        target_hours = targets.astype("datetime64[h]").astype(np.int64) - target_days * 24
+
+        # Step 1: same hour from the nearest day(s)
+        lo, hi, lo2, hi2 = self._same_hour_ranges(target_days, target_hours)
+        # Step 2: no same hour available - nearest timestamp(s)
+        no_hour = self._hour_start[target_hours] == self._hour_end[target_hours]
+        if no_hour.any():
+            t_lo, t_hi, t_lo2, t_hi2 = self._nearest_time_ranges(targets[no_hour].astype(np.int64))
+            lo[no_hour], hi[no_hour], lo2[no_hour], hi2[no_hour] = t_lo, t_hi, t_lo2, t_hi2
+
+        counts = (hi - lo) + (hi2 - lo2)
+        results = []
+        for i in range(n):
+            sorted_pos = self._time_pos if no_hour[i] else self._hour_day_pos
+            if counts[i] == 1:
+                start = lo[i] if hi[i] > lo[i] else lo2[i]
+                results.append(dict(zip(self.columns, self._rows[sorted_pos[start]])))
+            else:
+                rows = np.sort(np.concatenate([sorted_pos[lo[i]:hi[i]], sorted_pos[lo2[i]:hi2[i]]]))
+                results.append(self._average(rows))
+        return results
+
+    def _same_hour_ranges(self, target_days, target_hours):
+        """Sorted-row ranges of the nearest earlier-or-same and later day at the target hour."""
+        start, end = self._hour_start[target_hours], self._hour_end[target_hours]
+        base = target_hours * self._span
+        offset = np.clip(target_days - self._day_min + 1, 0, self._span - 1)
+        i = np.searchsorted(self._hour_day_key, base + offset, side="left")
+
+        days = self._hour_day
+        has_prev, has_next = i > start, i < end
+        last = max(len(days) - 1, 0)
+        prev_diff = np.where(has_prev, target_days - days[np.clip(i - 1, 0, last)], np.iinfo(np.int64).max)
+        next_diff = np.where(has_next, days[np.clip(i, 0, last)] - target_days, np.iinfo(np.int64).max)
+        diff = np.minimum(prev_diff, next_diff)
+
+        lo, hi = self._day_range(base, target_days - diff)
+        lo2, hi2 = self._day_range(base, target_days + diff)
+        # diff == 0 matches a single day; do not count it twice
+        same = diff == 0
+        lo2[same], hi2[same] = 0, 0
+        return lo, hi, lo2, hi2
+
+    def _day_range(self, base, days):
+        offset = np.clip(days - self._day_min + 1, 0, self._span - 1)
+        key = base + offset
+        return (np.searchsorted(self._hour_day_key, key, side="left"),
+                np.searchsorted(self._hour_day_key, key, side="right"))
+
+    def _nearest_time_ranges(self, targets):
+        """Sorted-row ranges of the nearest timestamps before/at and after the targets."""
+        times = self._times
+        i = np.searchsorted(times, targets, side="left")
+        last = len(times) - 1
+        has_prev, has_next = i > 0, i <= last
+        prev_diff = np.where(has_prev, targets - times[np.clip(i - 1, 0, last)], np.iinfo(np.int64).max)
+        next_diff = np.where(has_next, times[np.clip(i, 0, last)] - targets, np.iinfo(np.int64).max)
+        diff = np.minimum(prev_diff, next_diff)
+
+        lo = np.searchsorted(times, targets - diff, side="left")
+        hi = np.searchsorted(times, targets - diff, side="right")
+        lo2 = np.searchsorted(times, targets + diff, side="left")
+        hi2 = np.searchsorted(times, targets + diff, side="right")
+        same = diff == 0
+        lo2[same], hi2[same] = 0, 0
+        return lo, hi, lo2, hi2
+
+    def _average(self, rows):
+        """Mean of numeric columns (NaN skipped) and first value of the others."""
+        result = {}
+        values = self._numeric[rows]
+        missing = np.isnan(values)
+        sums = np.ascontiguousarray(np.where(missing, 0.0, values).T)
+        counts = len(rows) - missing.sum(axis=0)
+        for j, col in enumerate(self.numeric_columns):
+            # Summed column by column, in row order, like Series.mean
+            result[col] = sums[j].sum() / counts[j] if counts[j] else np.nan
+        for j, col in enumerate(self.other_columns):
+            result[col] = self._other[rows[0], j]
+        return result
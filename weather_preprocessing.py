@@ -3,13 +3,37 @@ import numpy as np
 import warnings
 warnings.filterwarnings('ignore', category=FutureWarning)
 
-def safe_split(series: pd.Series, n_parts: int):
-    """Safely split a Series of strings into exactly n_parts columns."""
-    return (
-        series.fillna("")
-        .apply(lambda x: (x.split(",") + [None] * n_parts)[:n_parts])
-        .apply(pd.Series)
-    )
+class ISDGroup:
+    """
+    One comma-encoded ISD group column (WND, TMP, CIG, ...) parsed column-wise.
+    ISD groups repeat a lot, so only the distinct strings are split; parts,
+    numeric values and quality masks are computed on those distinct values
+    and gathered back to every row by their factorized codes.
+    Missing values are treated as "" and missing parts as NaN.
+    """
+    def __init__(self, series: pd.Series, n_parts: int):
+        self.codes, uniques = pd.factorize(series.fillna(""))
+        self.parts = (
+            pd.Series(uniques, dtype=object)
+            .str.split(",", n=n_parts, expand=True)
+            .reindex(columns=range(n_parts))
+        )
+
+    def numeric(self, i: int) -> np.ndarray:
+        """Part i of every distinct value as float, with unparsable values as NaN."""
+        return pd.to_numeric(self.parts[i], errors="coerce").to_numpy(dtype=float)
+
+    def text(self, i: int) -> pd.Series:
+        """Part i of every distinct value as string (NaN if missing)."""
+        return self.parts[i]
+
+    def flag_not(self, i: int, value: str) -> np.ndarray:
+        """Mask of distinct values whose quality flag (part i) is not the given string."""
+        return (self.parts[i] != value).to_numpy()
+
+    def rows(self, values: np.ndarray) -> np.ndarray:
+        """Gather per-distinct-value results back to one value per row."""
+        return values[self.codes]
 
 def preprocess_weather(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -19,6 +43,8 @@ def preprocess_weather(df: pd.DataFrame) -> pd.DataFrame:
        'ceiling_coverage', 'visibility_m', 'temperature_C', 'SLP_hpa', 'DEW_C',
        'MA1_main', 'MA1_sec', 'GA1_amt', 'GA1_height', 'GA1_type', 'MD1_m1',
        'MD1_m2']
+        ISD groups are parsed with ISDGroup and the quality-flag and sentinel
+        (99/999/9999/99999) rules are applied as array masks.
     """
 
     df = df.copy()
@@ -26,116 +52,104 @@ def preprocess_weather(df: pd.DataFrame) -> pd.DataFrame:
 
     # --- WND: wind ---
     if "WND" in df.columns:
-        wnd_parts = safe_split(df["WND"], 5)
-        df["wind_dir_deg"] = pd.to_numeric(wnd_parts[0], errors="coerce")
-        df["wind_dir_qc"] = wnd_parts[1]
-        df["wind_type"]   = wnd_parts[2]
-        df["wind_speed_raw"] = pd.to_numeric(wnd_parts[3], errors="coerce")
-        df["wind_speed_qc"] = wnd_parts[4]
-
-        df.loc[df["wind_dir_deg"] == 999, "wind_dir_deg"] = np.nan
-        df.loc[df["wind_speed_raw"] == 9999, "wind_speed_raw"] = np.nan
-        df.loc[df["wind_type"] == "C", "wind_speed_raw"] = 0
-        df.loc[df["wind_type"].isin(["C","V"]), "wind_dir_deg"] = np.nan
-        df.loc[df["wind_dir_qc"] != "1", "wind_dir_deg"] = np.nan
-        df.loc[df["wind_speed_qc"] != "1", "wind_speed_raw"] = np.nan
-
-        df["wind_dir_sin"] = np.sin(np.radians(df["wind_dir_deg"]))
-        df["wind_dir_cos"] = np.cos(np.radians(df["wind_dir_deg"]))
-        df = df.drop(columns=["WND", "wind_dir_qc", "wind_type", "wind_speed_qc", "wind_dir_deg"])
+        wnd = ISDGroup(df["WND"], 5)
+        wind_dir_deg = wnd.numeric(0)
+        wind_type = wnd.text(2)
+        wind_speed_raw = wnd.numeric(3)
+
+        wind_speed_raw[wind_speed_raw == 9999] = np.nan
+        wind_speed_raw[(wind_type == "C").to_numpy()] = 0
+        wind_speed_raw[wnd.flag_not(4, "1")] = np.nan
+        wind_dir_deg[(wind_dir_deg == 999)
+                     | wind_type.isin(["C", "V"]).to_numpy()
+                     | wnd.flag_not(1, "1")] = np.nan
+
+        df["wind_speed_raw"] = wnd.rows(wind_speed_raw)
+        df["wind_dir_sin"] = wnd.rows(np.sin(np.radians(wind_dir_deg)))
+        df["wind_dir_cos"] = wnd.rows(np.cos(np.radians(wind_dir_deg)))
+        df = df.drop(columns=["WND"])
 
     # --- TMP: temperature ---
     if "TMP" in df.columns:
-        tmp_parts = safe_split(df["TMP"], 2)
-        df["temperature_C"] = pd.to_numeric(tmp_parts[0], errors="coerce") / 10.0
-        df["temperature_qlt"] = pd.to_numeric(tmp_parts[1], errors="coerce")
-        df.loc[df["temperature_qlt"] != 1, "temperature_C"] = np.nan
-        df.drop(columns=["TMP", "temperature_qlt"], inplace=True)
+        tmp = ISDGroup(df["TMP"], 2)
+        temperature_C = tmp.numeric(0) / 10.0
+        temperature_C[tmp.numeric(1) != 1] = np.nan
+        df["temperature_C"] = tmp.rows(temperature_C)
+        df = df.drop(columns=["TMP"])
 
-        # --- CIG: ceiling ---
+    # --- CIG: ceiling ---
     if "CIG" in df.columns:
-        cig_parts = safe_split(df["CIG"], 4)
-        df["ceiling_height_ft"] = pd.to_numeric(cig_parts[0], errors="coerce")
-        df["ceiling_method"] = cig_parts[1].replace("9", np.nan)
-        df["ceiling_quality"] = cig_parts[2].replace("9", np.nan)
-        df["ceiling_coverage"] = cig_parts[3].map({"N": 0, "Y": 1, "9": np.nan})
-        df.loc[df["ceiling_height_ft"] == 99999, "ceiling_height_ft"] = np.nan
-        df.loc[df["ceiling_method"].isna() | df["ceiling_quality"].isna(), "ceiling_height_ft"] = np.nan
-        df = df.drop(columns=["CIG", "ceiling_method", "ceiling_quality"])
+        cig = ISDGroup(df["CIG"], 4)
+        # ceiling height is not a model feature; only the coverage is kept
+        coverage = cig.text(3)
+        ceiling_coverage = np.where(coverage == "N", 0.0, np.where(coverage == "Y", 1.0, np.nan))
+        df["ceiling_coverage"] = cig.rows(ceiling_coverage)
+        df = df.drop(columns=["CIG"])
 
     # --- VIS: visibility ---
     if "VIS" in df.columns:
-        vis_parts = safe_split(df["VIS"], 4)
-        df["visibility_m"] = pd.to_numeric(vis_parts[0], errors="coerce")
-        df["visibility_var"] = vis_parts[1]
-        df["visibility_quality"] = vis_parts[2]
-        df["visibility_extra"] = vis_parts[3]
-        df.loc[df["visibility_m"].isin([9999, 99999]), "visibility_m"] = np.nan
-        df.loc[df["visibility_var"] != "1", "visibility_m"] = np.nan
-        df = df.drop(columns=["VIS", "visibility_var", "visibility_quality", "visibility_extra"])
+        vis = ISDGroup(df["VIS"], 4)
+        visibility_m = vis.numeric(0)
+        visibility_m[np.isin(visibility_m, [9999, 99999]) | vis.flag_not(1, "1")] = np.nan
+        df["visibility_m"] = vis.rows(visibility_m)
+        df = df.drop(columns=["VIS"])
 
     # --- SLP ---
     if "SLP" in df.columns:
-        slp_parts = safe_split(df["SLP"], 2)
-        df["SLP_hpa"] = pd.to_numeric(slp_parts[0], errors="coerce") / 10.0
-        df["SLP_qlt"] = pd.to_numeric(slp_parts[1], errors="coerce")
-        df.loc[df["SLP_qlt"] != 1, "SLP_hpa"] = np.nan
-        df.drop(columns=["SLP", "SLP_qlt"], inplace=True)
+        slp = ISDGroup(df["SLP"], 2)
+        SLP_hpa = slp.numeric(0) / 10.0
+        SLP_hpa[slp.numeric(1) != 1] = np.nan
+        df["SLP_hpa"] = slp.rows(SLP_hpa)
+        df = df.drop(columns=["SLP"])
 
     # --- DEW ---
     if "DEW" in df.columns:
-        dew_parts = safe_split(df["DEW"], 2)
-        df["DEW_C"] = pd.to_numeric(dew_parts[0], errors="coerce") / 10.0
-        df["DEW_qlt"] = pd.to_numeric(dew_parts[1], errors="coerce")
-        df.loc[df["DEW_qlt"] != 1, "DEW_C"] = np.nan
-        df.drop(columns=["DEW", "DEW_qlt"], inplace=True)
+        dew = ISDGroup(df["DEW"], 2)
+        DEW_C = dew.numeric(0) / 10.0
+        DEW_C[dew.numeric(1) != 1] = np.nan
+        df["DEW_C"] = dew.rows(DEW_C)
+        df = df.drop(columns=["DEW"])
 
     # --- MA1 ---
     if "MA1" in df.columns:
-        ma1_parts = safe_split(df["MA1"], 4)
-        df["MA1_main"] = pd.to_numeric(ma1_parts[0], errors="coerce").replace(99999, np.nan)
-        df["MA1_q1"] = ma1_parts[1]
-        df["MA1_sec"] = pd.to_numeric(ma1_parts[2], errors="coerce").replace(99999, np.nan)
-        df["MA1_q2"] = ma1_parts[3]
+        ma1 = ISDGroup(df["MA1"], 4)
+        MA1_main = ma1.numeric(0)
+        MA1_sec = ma1.numeric(2)
 
-        df.loc[df["MA1_q1"] != "1", "MA1_main"] = np.nan
-        df.loc[df["MA1_q2"] != "1", "MA1_sec"] = np.nan
-        df = df.drop(columns=["MA1", "MA1_q1", "MA1_q2"])
+        MA1_main[(MA1_main == 99999) | ma1.flag_not(1, "1")] = np.nan
+        MA1_sec[(MA1_sec == 99999) | ma1.flag_not(3, "1")] = np.nan
+        df["MA1_main"] = ma1.rows(MA1_main)
+        df["MA1_sec"] = ma1.rows(MA1_sec)
+        df = df.drop(columns=["MA1"])
 
     # --- GA1 ---
     if "GA1" in df.columns:
-        ga1_parts = safe_split(df["GA1"], 6)
-        df["GA1_amt"] = pd.to_numeric(ga1_parts[0], errors="coerce").replace(99, np.nan)
-        df["GA1_q1"] = ga1_parts[1]
-        df["GA1_height"] = pd.to_numeric(ga1_parts[2], errors="coerce").replace(99999, np.nan)
-        df["GA1_q2"] = ga1_parts[3]
-        df["GA1_type"] = pd.to_numeric(ga1_parts[4], errors="coerce").replace(99, np.nan)
-        df["GA1_q3"] = ga1_parts[5]
+        ga1 = ISDGroup(df["GA1"], 6)
+        GA1_amt = ga1.numeric(0)
+        GA1_height = ga1.numeric(2)
+        GA1_type = ga1.numeric(4)
 
-        df.loc[df["GA1_q1"] != "1", "GA1_amt"] = np.nan
-        df.loc[df["GA1_q2"] != "1", "GA1_height"] = np.nan
-        df.loc[df["GA1_q3"] != "1", "GA1_type"] = np.nan
-        df = df.drop(columns=["GA1", "GA1_q1", "GA1_q2", "GA1_q3"])
+        GA1_amt[(GA1_amt == 99) | ga1.flag_not(1, "1")] = np.nan
+        GA1_height[(GA1_height == 99999) | ga1.flag_not(3, "1")] = np.nan
+        GA1_type[(GA1_type == 99) | ga1.flag_not(5, "1")] = np.nan
+        df["GA1_amt"] = ga1.rows(GA1_amt)
+        df["GA1_height"] = ga1.rows(GA1_height)
+        df["GA1_type"] = ga1.rows(GA1_type)
+        df = df.drop(columns=["GA1"])
 
 
     # --- MD1 (NEW) ---
     if "MD1" in df.columns:
-        md1_parts = safe_split(df["MD1"], 6)
-        df["MD1_m1"] = pd.to_numeric(md1_parts[0], errors="coerce")
-        df["MD1_q1"] = md1_parts[1]
-        df["MD1_m2"] = pd.to_numeric(md1_parts[2], errors="coerce")
-        df["MD1_q2"] = md1_parts[3]
-
-        # Replace placeholder codes
-        df["MD1_m1"] = df["MD1_m1"].replace(999, np.nan)
-        df["MD1_m2"] = df["MD1_m2"].replace(999, np.nan)
+        md1 = ISDGroup(df["MD1"], 6)
+        MD1_m1 = md1.numeric(0)
+        MD1_m2 = md1.numeric(2)
 
-        # Keep only reliable measures
-        df.loc[df["MD1_q1"] != "1", "MD1_m1"] = np.nan
-        df.loc[df["MD1_q2"] != "1", "MD1_m2"] = np.nan
-
-        # Drop original + quality flags
-        df = df.drop(columns=["MD1", "MD1_q1", "MD1_q2"])
+        # Replace placeholder codes and keep only reliable measures
+        MD1_m1[(MD1_m1 == 999) | md1.flag_not(1, "1")] = np.nan
+        MD1_m2[(MD1_m2 == 999) | md1.flag_not(3, "1")] = np.nan
+        df["MD1_m1"] = md1.rows(MD1_m1)
+        df["MD1_m2"] = md1.rows(MD1_m2)
+        df = df.drop(columns=["MD1"])
 
     # make sure all the weather columns exist
     required_cols = [
@@ -165,18 +179,19 @@ def preprocess_weather(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-data = [
-    { "date": "2025-01-01T00:00:00", "tmp": "+0050,1", "wnd": "260,1,N,0030,1", "GA1": "abc,1,def,1,ghi,1"}
-]
+if __name__ == "__main__":
+    data = [
+        { "date": "2025-01-01T00:00:00", "tmp": "+0050,1", "wnd": "260,1,N,0030,1", "GA1": "abc,1,def,1,ghi,1"}
+    ]
 
-weather = pd.DataFrame(data)
-print("Raw input:")
-print(weather)
+    weather = pd.DataFrame(data)
+    print("Raw input:")
+    print(weather)
 
-# Run your preprocessing function
-processed = preprocess_weather(weather)
+    # Run your preprocessing function
+    processed = preprocess_weather(weather)
 
-print("\nProcessed weather:")
-print(processed.head())
+    print("\nProcessed weather:")
+    print(processed.head())
 
-print(processed.columns)
\ No newline at end of file
+    print(processed.columns)